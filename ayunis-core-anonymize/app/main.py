@@ -4,6 +4,7 @@ import os
 import time
 from dataclasses import dataclass
 from functools import partial
+from typing import Callable
 
 import anyio
 import anyio.to_thread
@@ -11,15 +12,21 @@ from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.models import (
+    AnalyzeBatchRequest,
+    AnalyzeBatchResponse,
     AnalyzeRequest,
     AnalyzeResponse,
     HealthResponse,
     RecognizerResult,
+    StatsResponse,
 )
 from app.presidio_service import (
+    PresidioService,
+    analysis_version,
     get_presidio_service,
     is_presidio_service_loaded,
 )
+from app.result_cache import AnalysisCache, cache_key
 
 # How many analyses may run at once. Analysis is synchronous CPU-bound GLiNER
 # inference, so it must not run on the event loop — there it blocks every other
@@ -47,6 +54,24 @@ _analysis_limiter = anyio.CapacityLimiter(MAX_CONCURRENT_ANALYSES)
 # Separate again for /health, so a saturated analysis queue can never delay the
 # container healthcheck past its timeout and get the service declared unhealthy.
 _health_limiter = anyio.CapacityLimiter(1)
+
+# Chat threads are anonymized every turn, so most message texts have been
+# analyzed before. Results are cached by a hash of the text, the entity filter
+# and analysis_version(); ANALYSIS_CACHE_MAX_BYTES=0 disables the in-memory
+# cache. ANALYSIS_CACHE_DIR adds a SQLite cache there that replicas on the
+# same host can share.
+analysis_cache = AnalysisCache(
+    max_bytes=int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    directory=os.getenv("ANALYSIS_CACHE_DIR") or None,
+    disk_max_bytes=int(
+        os.getenv("ANALYSIS_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024))
+    ),
+)
+_analysis_version = analysis_version()
+
+# Lookups may read SQLite, so they run off the event loop, but on their own
+# threads: a cache hit never waits for an analysis slot.
+_cache_limiter = anyio.CapacityLimiter(MAX_CONCURRENT_ANALYSES)
 _analysis_logger = logging.getLogger("uvicorn.error.anonymize.analysis")
 
 
@@ -60,12 +85,33 @@ class AnalysisMetrics:
 
 @dataclass(frozen=True)
 class AnalysisRun:
-    results: list[dict]
+    # One list of entity dicts, or one per text for a batch
+    results: list
     metrics: AnalysisMetrics
 
 
 def _analyze(text: str, entities, enqueued_at: float) -> AnalysisRun:
     """Runs on a worker thread, outside the event loop."""
+    return _timed_analysis(
+        lambda service: service.analyze(text=text, entities=entities),
+        {"text_length": len(text)},
+        enqueued_at,
+    )
+
+
+def _analyze_batch(texts: list[str], entities, enqueued_at: float) -> AnalysisRun:
+    """Runs on a worker thread, outside the event loop."""
+    return _timed_analysis(
+        lambda service: service.analyze_batch(texts=texts, entities=entities),
+        {"text_count": len(texts), "text_length": sum(len(text) for text in texts)},
+        enqueued_at,
+    )
+
+
+def _timed_analysis(
+    run: Callable[[PresidioService], list], log_fields: dict, enqueued_at: float
+) -> AnalysisRun:
+    """Run an analysis, timing and logging it (sizes only, never the text)."""
     worker_started_at = time.perf_counter()
     cold_start = not is_presidio_service_loaded()
     model_load_started_at = time.perf_counter()
@@ -74,7 +120,7 @@ def _analyze(text: str, entities, enqueued_at: float) -> AnalysisRun:
     outcome = "success"
 
     try:
-        results = service.analyze(text=text, entities=entities)
+        results = run(service)
     except Exception:
         outcome = "error"
         raise
@@ -93,7 +139,7 @@ def _analyze(text: str, entities, enqueued_at: float) -> AnalysisRun:
                 {
                     "event": "anonymize_analysis",
                     "outcome": outcome,
-                    "text_length": len(text),
+                    **log_fields,
                     "queue_duration_ms": round(metrics.queue_duration_ms, 2),
                     "model_load_duration_ms": round(metrics.model_load_duration_ms, 2),
                     "processing_duration_ms": round(metrics.processing_duration_ms, 2),
@@ -105,6 +151,34 @@ def _analyze(text: str, entities, enqueued_at: float) -> AnalysisRun:
     return AnalysisRun(results=results, metrics=metrics)
 
 
+def _set_timing_headers(response: Response, metrics: AnalysisMetrics) -> None:
+    response.headers["Server-Timing"] = (
+        f"queue;dur={metrics.queue_duration_ms:.2f}, "
+        f"model_load;dur={metrics.model_load_duration_ms:.2f}, "
+        f"processing;dur={metrics.processing_duration_ms:.2f}"
+    )
+    response.headers["X-Anonymize-Cold-Start"] = str(metrics.cold_start).lower()
+
+
+async def _cached_results(keys: list[str]) -> list[list[dict] | None]:
+    if not analysis_cache.enabled:
+        return [None] * len(keys)
+    return await anyio.to_thread.run_sync(
+        lambda: [analysis_cache.get(key) for key in keys], limiter=_cache_limiter
+    )
+
+
+async def _cache_results(keys: list[str], results: list[list[dict]]) -> None:
+    if not analysis_cache.enabled:
+        return
+
+    def put_all() -> None:
+        for key, text_results in zip(keys, results):
+            analysis_cache.put(key, text_results)
+
+    await anyio.to_thread.run_sync(put_all, limiter=_cache_limiter)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="MS Presidio PII Detection API",
@@ -154,23 +228,23 @@ async def analyze_text(request: AnalyzeRequest, response: Response):
         HTTPException: If analysis fails
     """
     try:
-        enqueued_at = time.perf_counter()
-        analysis_run = await anyio.to_thread.run_sync(
-            partial(_analyze, request.text, request.entities, enqueued_at),
-            limiter=_analysis_limiter,
-        )
-        metrics = analysis_run.metrics
-        response.headers["Server-Timing"] = (
-            f"queue;dur={metrics.queue_duration_ms:.2f}, "
-            f"model_load;dur={metrics.model_load_duration_ms:.2f}, "
-            f"processing;dur={metrics.processing_duration_ms:.2f}"
-        )
-        response.headers["X-Anonymize-Cold-Start"] = str(metrics.cold_start).lower()
+        key = cache_key(request.text, request.entities, _analysis_version)
+        (results,) = await _cached_results([key])
+        if results is not None:
+            response.headers["X-Anonymize-Cache"] = "hit"
+        else:
+            enqueued_at = time.perf_counter()
+            analysis_run = await anyio.to_thread.run_sync(
+                partial(_analyze, request.text, request.entities, enqueued_at),
+                limiter=_analysis_limiter,
+            )
+            _set_timing_headers(response, analysis_run.metrics)
+            response.headers["X-Anonymize-Cache"] = "miss"
+            results = analysis_run.results
+            await _cache_results([key], [results])
 
         # Convert to response model
-        recognizer_results = [
-            RecognizerResult(**result) for result in analysis_run.results
-        ]
+        recognizer_results = [RecognizerResult(**result) for result in results]
 
         return AnalyzeResponse(results=recognizer_results)
 
@@ -178,6 +252,78 @@ async def analyze_text(request: AnalyzeRequest, response: Response):
         raise HTTPException(status_code=500, detail=f"Analysis failed: {e!s}")
 
 
+@app.post("/analyze/batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(request: AnalyzeBatchRequest, response: Response):
+    """
+    Analyze several texts for PII entities in one call
+
+    Cheaper than one /analyze call per text: the texts share a single analysis
+    slot and the GLiNER model runs over all of them in batched forward passes.
+    Texts with cached results are not analyzed again.
+
+    Args:
+        request: AnalyzeBatchRequest containing the texts and optional entity filters
+
+    Returns:
+        AnalyzeBatchResponse with the detected PII entities of each text, in order
+
+    Raises:
+        HTTPException: If analysis fails
+    """
+    try:
+        keys = [
+            cache_key(text, request.entities, _analysis_version)
+            for text in request.texts
+        ]
+        results = await _cached_results(keys)
+        response.headers["X-Anonymize-Cache-Hits"] = str(
+            sum(text_results is not None for text_results in results)
+        )
+
+        missing = {
+            key: text
+            for key, text, text_results in zip(keys, request.texts, results)
+            if text_results is None
+        }
+        if missing:
+            enqueued_at = time.perf_counter()
+            analysis_run = await anyio.to_thread.run_sync(
+                partial(
+                    _analyze_batch,
+                    list(missing.values()),
+                    request.entities,
+                    enqueued_at,
+                ),
+                limiter=_analysis_limiter,
+            )
+            _set_timing_headers(response, analysis_run.metrics)
+            analyzed = dict(zip(missing, analysis_run.results))
+            results = [analyzed.get(key, hit) for key, hit in zip(keys, results)]
+            await _cache_results(list(analyzed), list(analyzed.values()))
+
+        return AnalyzeBatchResponse(
+            results=[
+                AnalyzeResponse(
+                    results=[RecognizerResult(**result) for result in text_results]
+                )
+                for text_results in results
+            ]
+        )
+
+    except Exception as e:  # noqa: BLE001
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {e!s}")
+
+
+@app.get("/stats", response_model=StatsResponse)
+async def stats():
+    """
+    Service statistics
+
+    Returns hit/miss counters and the size of the analysis result cache
+    """
+    return StatsResponse(cache=analysis_cache.stats())
+
+
 if __name__ == "__main__":
     import uvicorn
 
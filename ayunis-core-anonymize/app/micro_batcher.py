@@ -0,0 +1,181 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass, field
+
+_logger = logging.getLogger("uvicorn.error.anonymize.micro_batcher")
+
+
+@dataclass
+class _Request:
+    texts: list[str]
+    labels: tuple[str, ...]
+    future: Future
+    predictions: list = field(default_factory=list)
+    # Consecutive passes this request waited through without being served.
+    skipped: int = 0
+
+    @property
+    def remaining(self) -> list[str]:
+        return self.texts[len(self.predictions) :]
+
+
+class MicroBatcher:
+    """Coalesces model calls from concurrent analysis threads into one call.
+
+    Each /analyze request runs on its own worker thread and would otherwise do
+    its own small GLiNER forward pass, competing with the others for the same
+    CPUs. Here those threads hand their chunks to a single inference thread
+    and block until the predictions are back.
+
+    From idle, the inference thread waits `window` seconds for more work, so
+    the added latency of an uncontended request is bounded by the window.
+    Under load it does not wait at all: whatever arrived during the previous
+    pass forms the next one. A pass holds at most `max_chars` characters;
+    requests with the fewest remaining chunks go first, so a short message is
+    not stuck behind a long document, which proceeds over several passes.
+    Only requests asking for the same labels can share a pass. So that a long
+    document or a rare label set is not starved by a stream of short
+    requests, the oldest request that has been passed over `max_skipped`
+    times in a row leads the next pass, labels included.
+
+    A failing pass fails the requests it was serving and the thread carries
+    on; a caller waits at most `timeout` seconds for its predictions.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[list[str], list[str]], list],
+        window: float,
+        max_chars: int,
+        max_skipped: int = 4,
+        timeout: float | None = None,
+    ):
+        self._predict = predict
+        self._window = window
+        self._max_chars = max_chars
+        self._max_skipped = max_skipped
+        self._timeout = timeout
+        self._queue: queue.SimpleQueue[_Request] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="gliner-micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, texts: list[str], labels: list[str]) -> list:
+        """Predictions for `texts`, computed in a shared pass; blocks until done.
+
+        Raises:
+            TimeoutError: the predictions took longer than `timeout`
+        """
+        if not texts:
+            return []
+        request = _Request(texts=texts, labels=tuple(labels), future=Future())
+        self._queue.put(request)
+        try:
+            return request.future.result(timeout=self._timeout)
+        except TimeoutError:
+            # Nobody is waiting any more; the inference thread drops it.
+            request.future.cancel()
+            raise
+
+    def _run(self) -> None:
+        pending: list[_Request] = []
+        while True:
+            try:
+                if not pending:
+                    pending.append(self._queue.get())
+                    self._collect(pending, deadline=time.monotonic() + self._window)
+                else:
+                    self._collect(pending, deadline=0)
+                self._run_pass(pending)
+            except Exception as e:  # noqa: BLE001
+                # Bookkeeping went wrong mid-pass: fail what was pending rather
+                # than leave its callers blocked, and keep serving new work.
+                _logger.exception("micro-batch pass failed")
+                for request in pending:
+                    _fail(request, e)
+            pending = [request for request in pending if not request.future.done()]
+
+    def _collect(self, pending: list[_Request], deadline: float) -> None:
+        """Add queued requests until `deadline` or a full pass is waiting."""
+        while _chars(pending) < self._max_chars:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    pending.append(self._queue.get(timeout=timeout))
+                else:
+                    pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _run_pass(self, pending: list[_Request]) -> None:
+        # `pending` is in arrival order, so the first starved request is the
+        # oldest one.
+        order = sorted(pending, key=lambda request: len(request.remaining))
+        starved = [r for r in pending if r.skipped >= self._max_skipped]
+        if starved:
+            order.remove(starved[0])
+            order.insert(0, starved[0])
+        labels = order[0].labels
+        batch: list[tuple[_Request, int]] = []
+        budget = self._max_chars
+        for request in order:
+            if request.labels != labels:
+                continue
+            count = 0
+            for text in request.remaining:
+                # The first text always fits, so every pass makes progress.
+                if budget < len(text) and (batch or count):
+                    break
+                budget -= len(text)
+                count += 1
+            if count:
+                batch.append((request, count))
+            if budget <= 0:
+                break
+
+        served = {id(request) for request, _ in batch}
+        for request in pending:
+            request.skipped = 0 if id(request) in served else request.skipped + 1
+
+        texts = [
+            text for request, count in batch for text in request.remaining[:count]
+        ]
+        started_at = time.perf_counter()
+        try:
+            predictions = self._predict(texts, list(labels))
+        except Exception as e:  # noqa: BLE001
+            for request, _ in batch:
+                _fail(request, e)
+            return
+        _logger.debug(
+            "micro-batch of %d texts from %d requests in %.1f ms",
+            len(texts),
+            len(batch),
+            (time.perf_counter() - started_at) * 1000,
+        )
+
+        position = 0
+        for request, count in batch:
+            request.predictions.extend(predictions[position : position + count])
+            position += count
+            if not request.remaining:
+                try:
+                    request.future.set_result(request.predictions)
+                except InvalidStateError:
+                    pass  # cancelled by a caller that timed out
+
+
+def _fail(request: _Request, error: Exception) -> None:
+    try:
+        request.future.set_exception(error)
+    except InvalidStateError:
+        pass  # already resolved, or cancelled by a caller that timed out
+
+
+def _chars(requests: list[_Request]) -> int:
+    return sum(len(text) for request in requests for text in request.remaining)
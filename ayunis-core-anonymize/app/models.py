@@ -1,5 +1,6 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+import os
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, Field, model_validator
 
 
 # Analysis cost is linear in input length: presidio splits the text into
@@ -13,8 +14,22 @@ from pydantic import BaseModel, Field
 # of the two analysis slots for its full duration and makes everyone else queue
 # behind work whose result nobody will read (AYC-561).
 #
+# Texts of at least SEGMENT_MIN_TEXT_LENGTH characters are analyzed as windows
+# spread over WINDOW_WORKERS threads (see presidio_service.py), which divides
+# the wall time by up to that many: with the default 4 threads, 100k characters
+# cost about what 30k do single-threaded, if the host has the cores and no
+# other request is using the threads. The default stays at the single-threaded
+# bound; MAX_TEXT_LENGTH raises it where that speed-up has been measured (the
+# backend enforces its own cap as well).
+#
 # 30k characters is ~7,500 words — far beyond any realistic message.
-MAX_TEXT_LENGTH = 30_000
+MAX_TEXT_LENGTH = int(os.getenv("MAX_TEXT_LENGTH", "30000"))
+
+# A batch runs as one analysis on one slot, so it gets the same time budget as
+# a single text: batching makes each character cheaper, but the combined length
+# is bounded the same way until the speed-up has been measured in production.
+MAX_BATCH_TEXT_LENGTH = MAX_TEXT_LENGTH
+MAX_BATCH_TEXTS = 256
 
 
 class AnalyzeRequest(BaseModel):
@@ -41,6 +56,42 @@ class AnalyzeRequest(BaseModel):
     }
 
 
+class AnalyzeBatchRequest(BaseModel):
+    """Request model for PII analysis of several texts at once"""
+    texts: List[Annotated[str, Field(max_length=MAX_TEXT_LENGTH)]] = Field(
+        ...,
+        max_length=MAX_BATCH_TEXTS,
+        description="Texts to analyze, e.g. every message of a thread",
+    )
+    entities: Optional[List[str]] = Field(
+        None,
+        description="Optional list of specific entity types to detect in every text"
+    )
+
+    @model_validator(mode="after")
+    def check_total_length(self):
+        total = sum(len(text) for text in self.texts)
+        if total > MAX_BATCH_TEXT_LENGTH:
+            raise ValueError(
+                f"texts have {total} characters in total; at most {MAX_BATCH_TEXT_LENGTH} are allowed"
+            )
+        return self
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "texts": [
+                        "Mein Name ist Hans Mueller",
+                        "Meine E-Mail ist hans@mueller.de",
+                    ],
+                    "entities": ["PERSON", "EMAIL_ADDRESS"]
+                }
+            ]
+        }
+    }
+
+
 class RecognizerResult(BaseModel):
     """Individual PII detection result"""
     entity_type: str = Field(..., description="Type of PII entity detected")
@@ -90,6 +141,28 @@ class AnalyzeResponse(BaseModel):
     }
 
 
+class AnalyzeBatchResponse(BaseModel):
+    """Response model for batch PII analysis"""
+    results: List[AnalyzeResponse] = Field(
+        ..., description="Detected PII entities per text, in the order of the request"
+    )
+
+
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
+
+
+class CacheStats(BaseModel):
+    """Hit/miss counters and size of the analysis result cache"""
+    hits: int = Field(..., description="Lookups answered from memory")
+    disk_hits: int = Field(..., description="Lookups answered from the shared on-disk cache")
+    misses: int = Field(..., description="Lookups that needed an analysis")
+    entries: int = Field(..., description="Results held in memory")
+    bytes: int = Field(..., description="Approximate bytes held in memory")
+    max_bytes: int = Field(..., description="Memory bound; 0 when the in-memory cache is disabled")
+
+
+class StatsResponse(BaseModel):
+    """Service statistics"""
+    cache: CacheStats
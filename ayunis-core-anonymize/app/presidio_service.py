@@ -1,9 +1,24 @@
+import hashlib
+import importlib.metadata
+import json
+import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
 
-from presidio_analyzer import AnalyzerEngine
-from presidio_analyzer.nlp_engine import NlpEngineProvider
+from presidio_analyzer import AnalysisExplanation, AnalyzerEngine, RecognizerResult
+from presidio_analyzer.chunkers import TextChunk
+from presidio_analyzer.nlp_engine import NlpArtifacts, NlpEngineProvider
 from presidio_analyzer.predefined_recognizers import GLiNERRecognizer
 
+from app.micro_batcher import MicroBatcher
+from app.result_cache import AnalysisCache, cache_key
+from app.segments import split_segments, window
+
+GLINER_MODEL_NAME = "urchade/gliner_multi_pii-v1"
+LANGUAGES_CONFIG_PATH = "config/languages-config.yml"
+
 GLINER_ENTITY_MAPPING = {
     "person": "PERSON",
     "organization": "ORGANIZATION",
@@ -23,11 +38,218 @@ GLINER_ENTITY_MAPPING = {
     "medical record number": "MEDICAL_LICENSE",
 }
 
+# Chunks per GLiNER forward pass in batch analysis. Presidio cuts text into
+# ~250-character chunks, so a pass holds at most this many of them; larger
+# batches amortise more per-call overhead but raise peak working memory.
+GLINER_BATCH_SIZE = int(os.getenv("GLINER_BATCH_SIZE", "16"))
+
+# Concurrent /analyze requests hand their model work to one inference thread,
+# which waits up to this long from idle for more to share the forward pass
+# (0 disables micro-batching: every request runs the model on its own thread).
+# A pass holds at most MICRO_BATCH_MAX_CHARS characters of chunks; a request
+# gives up after MICRO_BATCH_TIMEOUT_S seconds instead of blocking its worker
+# thread for good behind a wedged inference thread.
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "5"))
+MICRO_BATCH_MAX_CHARS = int(os.getenv("MICRO_BATCH_MAX_CHARS", "4000"))
+MICRO_BATCH_TIMEOUT_S = float(os.getenv("MICRO_BATCH_TIMEOUT_S", "60"))
+
+# Texts of at least SEGMENT_MIN_TEXT_LENGTH characters are analyzed in windows:
+# paragraphs (pieces of at most SEGMENT_MAX_CHARS), each with up to
+# SEGMENT_MARGIN characters of its neighbours as context. Windows are analyzed
+# in parallel, so a long document no longer takes one thread for its whole
+# length, and the detections of every window are cached (up to
+# SEGMENT_CACHE_MAX_BYTES; 0 disables the cache), so when a long document or
+# conversation changes only the windows around the change are analyzed again.
+SEGMENT_CACHE_MAX_BYTES = int(
+    os.getenv("SEGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+SEGMENT_MIN_TEXT_LENGTH = int(os.getenv("SEGMENT_MIN_TEXT_LENGTH", "2000"))
+SEGMENT_MAX_CHARS = int(os.getenv("SEGMENT_MAX_CHARS", "2000"))
+SEGMENT_MARGIN = int(os.getenv("SEGMENT_MARGIN", "100"))
+
+# Threads that analyze the windows of long texts, shared by all requests so
+# the total stays bounded however many long texts arrive at once. The model
+# releases the GIL during inference, so they run the model themselves instead
+# of through the micro-batcher, whose single inference thread would take
+# their work one pass at a time. Threads rather than processes: every process
+# would load its own 1.9 GB copy of the model.
+WINDOW_WORKERS = int(os.getenv("WINDOW_WORKERS", "4"))
+_window_pool = ThreadPoolExecutor(
+    max_workers=WINDOW_WORKERS, thread_name_prefix="anonymize-window"
+)
+
+
+class BatchedGLiNERRecognizer(GLiNERRecognizer):
+    """GLiNERRecognizer that can run the model over many texts at once.
+
+    `predict_batch` packs the chunks of every text into shared forward passes.
+    Inside `prepared()`, `analyze` hands those predictions to the analyzer
+    instead of running the model again, so context enhancement, thresholds and
+    de-duplication still happen in `AnalyzerEngine.analyze` exactly as for a
+    single text. The predictions are thread-local: concurrent single-text
+    requests on other threads share this recognizer and still run the model.
+
+    With a `micro_batch_window`, model work from `analyze` and
+    `predict_batch` alike goes through a MicroBatcher, so concurrent requests
+    share forward passes too; inside `unbatched()` this thread runs the model
+    itself.
+    """
+
+    def __init__(
+        self,
+        *args,
+        batch_size: int = GLINER_BATCH_SIZE,
+        micro_batch_window: float = 0,
+        micro_batch_max_chars: int = MICRO_BATCH_MAX_CHARS,
+        micro_batch_timeout: float = MICRO_BATCH_TIMEOUT_S,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self._prepared = threading.local()
+        self._unbatched = threading.local()
+        self.micro_batcher = (
+            MicroBatcher(
+                self._run_model,
+                micro_batch_window,
+                micro_batch_max_chars,
+                timeout=micro_batch_timeout,
+            )
+            if micro_batch_window > 0
+            else None
+        )
+
+    def predict_batch(
+        self, texts: list[str], entities: list[str]
+    ) -> list[list[RecognizerResult]]:
+        """GLiNER predictions for each text, as `analyze` would return them."""
+        chunked = [self._chunk(text) for text in texts]
+        flat = [chunk for chunks in chunked for chunk in chunks]
+        labels = self._input_labels(entities)
+        chunk_texts = [chunk.text for chunk in flat]
+        if self._micro_batched():
+            assert self.micro_batcher is not None
+            predictions = self.micro_batcher.submit(chunk_texts, labels)
+        else:
+            predictions = self._run_model(chunk_texts, labels)
+
+        results = []
+        position = 0
+        for chunks in chunked:
+            text_results = []
+            for chunk in chunks:
+                text_results.extend(
+                    self._to_results(predictions[position], entities, chunk.start)
+                )
+                position += 1
+            if len(chunks) > 1:
+                text_results = self.text_chunker.deduplicate_overlapping_entities(
+                    text_results
+                )
+            results.append(text_results)
+        return results
+
+    @contextmanager
+    def prepared(self, texts: list[str], predictions: list[list[RecognizerResult]]):
+        """Serve `predictions` from `analyze` on this thread for these texts."""
+        self._prepared.predictions = dict(zip(texts, predictions))
+        try:
+            yield
+        finally:
+            self._prepared.predictions = None
+
+    @contextmanager
+    def unbatched(self):
+        """Run the model on this thread, bypassing the micro-batcher."""
+        self._unbatched.active = True
+        try:
+            yield
+        finally:
+            self._unbatched.active = False
+
+    def analyze(
+        self,
+        text: str,
+        entities: list[str],
+        nlp_artifacts: NlpArtifacts | None = None,
+    ) -> list[RecognizerResult]:
+        prepared = getattr(self._prepared, "predictions", None)
+        if prepared is not None and text in prepared:
+            return prepared[text]
+        if self._micro_batched():
+            return self.predict_batch([text], entities)[0]
+        return super().analyze(text, entities, nlp_artifacts)
+
+    def _micro_batched(self) -> bool:
+        return self.micro_batcher is not None and not getattr(
+            self._unbatched, "active", False
+        )
+
+    def _run_model(self, texts: list[str], labels: list[str]) -> list[list[dict]]:
+        # The base class loads the model in __init__; it is only None before.
+        assert self.gliner is not None
+        predictions = []
+        for start in range(0, len(texts), self.batch_size):
+            predictions.extend(
+                self.gliner.batch_predict_entities(
+                    texts[start : start + self.batch_size],
+                    labels,
+                    flat_ner=self.flat_ner,
+                    threshold=self.threshold,
+                    multi_label=self.multi_label,
+                )
+            )
+        return predictions
+
+    def _chunk(self, text: str) -> list[TextChunk]:
+        # Mirrors predict_with_chunking: one chunk is the whole text.
+        chunks = self.text_chunker.chunk(text)
+        if len(chunks) == 1:
+            return [TextChunk(text=text, start=0, end=len(text))]
+        return chunks
+
+    def _input_labels(self, entities: list[str]) -> list[str]:
+        # Requested entities GLiNER has no mapping for become ad-hoc labels,
+        # as in GLiNERRecognizer.analyze.
+        labels = list(self.gliner_labels)
+        for entity in entities:
+            if (
+                entity not in self.model_to_presidio_entity_mapping.values()
+                and entity not in labels
+            ):
+                labels.append(entity)
+        return labels
+
+    def _to_results(
+        self, predictions: list[dict], entities: list[str], offset: int
+    ) -> list[RecognizerResult]:
+        results = []
+        for prediction in predictions:
+            entity_type = self.model_to_presidio_entity_mapping.get(
+                prediction["label"], prediction["label"]
+            )
+            if entities and entity_type not in entities:
+                continue
+            results.append(
+                RecognizerResult(
+                    entity_type=entity_type,
+                    start=prediction["start"] + offset,
+                    end=prediction["end"] + offset,
+                    score=prediction["score"],
+                    analysis_explanation=AnalysisExplanation(
+                        recognizer=self.name,
+                        original_score=prediction["score"],
+                        textual_explanation=f"Identified as {entity_type} by GLiNER",
+                    ),
+                )
+            )
+        return results
+
 
 class PresidioService:
     """Service for PII detection using Microsoft Presidio with GLiNER"""
 
-    def __init__(self, config_path: str = "config/languages-config.yml"):
+    def __init__(self, config_path: str = LANGUAGES_CONFIG_PATH):
         """
         Initialize Presidio analyzer with GLiNER-based NER and multi-language support.
 
@@ -45,15 +267,16 @@ class PresidioService:
 
         # GLiNER for NER (replaces spaCy NER). The model is multilingual,
         # so German-only registration still detects PII in any language.
-        gliner_recognizer = GLiNERRecognizer(
-            model_name="urchade/gliner_multi_pii-v1",
+        self.gliner_recognizer = BatchedGLiNERRecognizer(
+            model_name=GLINER_MODEL_NAME,
             supported_language="de",
             entity_mapping=GLINER_ENTITY_MAPPING,
             flat_ner=False,
             multi_label=True,
             map_location="cpu",
+            micro_batch_window=MICRO_BATCH_WINDOW_MS / 1000,
         )
-        self.analyzer.registry.add_recognizer(gliner_recognizer)
+        self.analyzer.registry.add_recognizer(self.gliner_recognizer)
 
         # Remove spaCy NER if registered (GLiNER replaces it)
         try:
@@ -61,6 +284,9 @@ class PresidioService:
         except ValueError:
             pass
 
+        self.version = analysis_version(config_path)
+        self.segment_cache = AnalysisCache(SEGMENT_CACHE_MAX_BYTES)
+
     def analyze(
         self,
         text: str,
@@ -76,21 +302,205 @@ class PresidioService:
         Returns:
             List of detected PII entities with type, position, and confidence score
         """
+        if len(text) >= SEGMENT_MIN_TEXT_LENGTH:
+            return self._analyze_segments(text, entities)
+
         results = self.analyzer.analyze(
             text=text,
             language="de",
             entities=entities,
         )
 
-        return [
-            {
-                "entity_type": result.entity_type,
-                "start": result.start,
-                "end": result.end,
-                "score": result.score,
-            }
-            for result in results
+        return _to_dicts(results)
+
+    def analyze_batch(
+        self,
+        texts: list[str],
+        entities: list[str] | None = None,
+    ) -> list[list[dict]]:
+        """
+        Analyze many texts, running GLiNER over all of them in batched passes.
+
+        spaCy tokenization and the pattern recognizers still run per text;
+        only the model inference, which dominates the cost, is batched.
+
+        Args:
+            texts: Texts to analyze
+            entities: Optional list of specific entity types to detect
+
+        Returns:
+            One list of detected PII entities per text, in input order
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        # The entities every recognizer is handed, as AnalyzerEngine.analyze
+        # derives them, so the batched predictions match a per-text run.
+        requested = entities or self.analyzer.get_supported_entities(language="de")
+        recognizers = self.analyzer.registry.get_recognizers(
+            language="de", entities=entities, all_fields=not entities
+        )
+        predictions = (
+            self.gliner_recognizer.predict_batch(unique_texts, requested)
+            if self.gliner_recognizer in recognizers
+            else []
+        )
+
+        by_text = {}
+        with self.gliner_recognizer.prepared(unique_texts, predictions):
+            artifacts = self.analyzer.nlp_engine.process_batch(
+                unique_texts, language="de"
+            )
+            for text, (_, nlp_artifacts) in zip(unique_texts, artifacts):
+                by_text[text] = _to_dicts(
+                    self.analyzer.analyze(
+                        text=text,
+                        language="de",
+                        entities=entities,
+                        nlp_artifacts=nlp_artifacts,
+                    )
+                )
+        return [by_text[text] for text in texts]
+
+    def _analyze_segments(
+        self,
+        text: str,
+        entities: list[str] | None,
+    ) -> list[dict]:
+        """
+        Analyze text window by window, reusing cached windows.
+
+        A window is one segment plus margins of context. Each detection belongs
+        to the segment it starts in, so an entity found in a margin is taken
+        from the neighbouring window instead. An entity that crosses a segment
+        boundary is found whole by the window it starts in; if the next window
+        also reports the part in its own segment, the overlapping detections
+        are merged. Windows that missed the cache are split across
+        WINDOW_WORKERS threads, each analyzing its share as one batch.
+        """
+        segments = split_segments(text, SEGMENT_MAX_CHARS)
+        windows = [window(text, start, end, SEGMENT_MARGIN) for start, end in segments]
+        keys = [
+            cache_key(text[left:right], entities, self.version)
+            for left, right in windows
         ]
+        cached = [self.segment_cache.get(key) for key in keys]
+
+        missing = {
+            key: text[left:right]
+            for key, (left, right), window_results in zip(keys, windows, cached)
+            if window_results is None
+        }
+        analyzed: dict[str, list[dict]] = {}
+        if missing:
+            analyzed = dict(
+                zip(missing, self._analyze_windows(list(missing.values()), entities))
+            )
+            for key, window_results in analyzed.items():
+                self.segment_cache.put(key, window_results)
+        results = [
+            found if found is not None else analyzed[key]
+            for key, found in zip(keys, cached)
+        ]
+
+        detections = []
+        for (start, end), (left, _), window_results in zip(
+            segments, windows, results
+        ):
+            for result in window_results:
+                if start <= left + result["start"] < end:
+                    detections.append(
+                        dict(
+                            result,
+                            start=left + result["start"],
+                            end=left + result["end"],
+                        )
+                    )
+        return _merge_overlapping(detections)
+
+    def _analyze_windows(
+        self,
+        windows: list[str],
+        entities: list[str] | None,
+    ) -> list[list[dict]]:
+        shares = [
+            windows[i::WINDOW_WORKERS] for i in range(min(WINDOW_WORKERS, len(windows)))
+        ]
+        if len(shares) == 1:
+            return self.analyze_batch(windows, entities)
+        futures = [
+            _window_pool.submit(self._analyze_share, share, entities)
+            for share in shares
+        ]
+        by_window: dict[str, list[dict]] = {}
+        for share, future in zip(shares, futures):
+            by_window.update(zip(share, future.result()))
+        return [by_window[text] for text in windows]
+
+    def _analyze_share(
+        self,
+        windows: list[str],
+        entities: list[str] | None,
+    ) -> list[list[dict]]:
+        with self.gliner_recognizer.unbatched():
+            return self.analyze_batch(windows, entities)
+
+
+def _merge_overlapping(detections: list[dict]) -> list[dict]:
+    """Merge overlapping detections of the same type into one span.
+
+    Within a window the analyzer has already removed duplicates; overlaps
+    left are the two halves of an entity cut by a window boundary.
+    """
+    merged: list[dict] = []
+    last_of_type: dict[str, dict] = {}
+    for detection in sorted(detections, key=lambda d: (d["start"], -d["end"])):
+        previous = last_of_type.get(detection["entity_type"])
+        if previous is not None and detection["start"] < previous["end"]:
+            previous["end"] = max(previous["end"], detection["end"])
+            previous["score"] = max(previous["score"], detection["score"])
+            continue
+        detection = dict(detection)
+        merged.append(detection)
+        last_of_type[detection["entity_type"]] = detection
+    return merged
+
+
+def _to_dicts(results: list[RecognizerResult]) -> list[dict]:
+    return [
+        {
+            "entity_type": result.entity_type,
+            "start": result.start,
+            "end": result.end,
+            "score": result.score,
+        }
+        for result in results
+    ]
+
+
+def analysis_version(config_path: str = LANGUAGES_CONFIG_PATH) -> str:
+    """
+    Fingerprint of everything besides the input that decides analysis results.
+
+    Cached results are keyed by it, so upgrading presidio or GLiNER, switching
+    the model or changing the entity mapping or NLP config invalidates them.
+    """
+    config = Path(config_path)
+    fingerprint = {
+        "presidio": importlib.metadata.version("presidio-analyzer"),
+        "gliner": _package_version("gliner"),
+        "model": GLINER_MODEL_NAME,
+        "mapping": GLINER_ENTITY_MAPPING,
+        "nlp_config": config.read_text() if config.exists() else None,
+    }
+    return hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+
+def _package_version(name: str) -> str | None:
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
 
 
 presidio_service: PresidioService | None = None
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from app.models import CacheStats
+
+
+def cache_key(text: str, entities: list[str] | None, version: str) -> str:
+    """Content hash of one analysis: the text, the entity filter and the
+    analysis version. An empty filter means all entities, like None."""
+    payload = json.dumps(
+        {
+            "text": text,
+            "entities": sorted(set(entities)) if entities else None,
+            "version": version,
+        },
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AnalysisCache:
+    """LRU cache of analysis results, bounded by the bytes it holds.
+
+    Only the key (a SHA-256 hash) and the detected entities (types, offsets,
+    scores) are stored, never the text itself. With a `directory`, entries
+    are also written to a SQLite file there, so replicas sharing the volume
+    reuse each other's results; it is bounded by `disk_max_bytes` and evicts
+    the least recently used entries first.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        directory: str | None = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[list[dict], int]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._disk = (
+            _DiskCache(Path(directory) / "analysis-cache.sqlite3", disk_max_bytes)
+            if directory
+            else None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self._disk is not None
+
+    def get(self, key: str) -> list[dict] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+
+        results = self._disk.get(key) if self._disk is not None else None
+        with self._lock:
+            if results is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+        self._remember(key, results, json.dumps(results))
+        return results
+
+    def put(self, key: str, results: list[dict]) -> None:
+        value = json.dumps(results)
+        self._remember(key, results, value)
+        if self._disk is not None:
+            self._disk.put(key, value)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                disk_hits=self._disk_hits,
+                misses=self._misses,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+            )
+
+    def _remember(self, key: str, results: list[dict], value: str) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (results, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+
+class _DiskCache:
+    """SQLite-backed LRU store; WAL mode lets several processes share it."""
+
+    def __init__(self, path: Path, max_bytes: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_used ON entries (used)"
+            )
+
+    def get(self, key: str) -> list[dict] | None:
+        try:
+            with self._lock, self._db:
+                row = self._db.execute(
+                    "SELECT value FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._db.execute(
+                    "UPDATE entries SET used = ? WHERE key = ?", (time.time(), key)
+                )
+        except sqlite3.Error:
+            # A busy or damaged shared cache only costs a re-analysis.
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: str) -> None:
+        size = len(key) + len(value)
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                (total,) = self._db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+                while total > self.max_bytes:
+                    row = self._db.execute(
+                        "SELECT key, size FROM entries ORDER BY used LIMIT 1"
+                    ).fetchone()
+                    if row is None:
+                        break
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+                    total -= row[1]
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,75 @@
+import re
+
+# A blank line, with whatever whitespace surrounds it, ends a paragraph.
+_PARAGRAPH_BREAK = re.compile(r"\n[^\S\n]*\n\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def split_segments(text: str, max_chars: int) -> list[tuple[int, int]]:
+    """
+    Split text into stable segments that tile it without gaps.
+
+    Segments are paragraphs, so a boundary depends only on the text around it:
+    editing one paragraph leaves every other segment byte-for-byte the same.
+    Paragraphs longer than `max_chars` are cut after sentence ends (or, failing
+    that, at whitespace), packing as much as fits into each piece.
+
+    Returns:
+        (start, end) offsets; the separator after a segment belongs to it
+    """
+    segments = []
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        segments.extend(_split_long(text, start, match.end(), max_chars))
+        start = match.end()
+    if start < len(text):
+        segments.extend(_split_long(text, start, len(text), max_chars))
+    return segments
+
+
+def _split_long(
+    text: str, start: int, end: int, max_chars: int
+) -> list[tuple[int, int]]:
+    pieces = []
+    while end - start > max_chars:
+        cut = _last_break(text, start, start + max_chars, _SENTENCE_END)
+        if cut is None:
+            cut = _last_break(text, start, start + max_chars, _WHITESPACE)
+        if cut is None:
+            cut = start + max_chars
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def _last_break(
+    text: str, start: int, limit: int, pattern: re.Pattern
+) -> int | None:
+    """End of the last `pattern` match that ends within (start, limit]."""
+    cut = None
+    for match in pattern.finditer(text, start, limit):
+        if match.end() > start:
+            cut = match.end()
+    return cut
+
+
+def window(text: str, start: int, end: int, margin: int) -> tuple[int, int]:
+    """
+    Widen a segment by up to `margin` characters of context on either side.
+
+    The margins are trimmed to whitespace so they never begin or end inside a
+    word: a cut-off word would read to the model as a different token.
+    """
+    left = max(0, start - margin)
+    if left > 0:
+        match = _WHITESPACE.search(text, left, start)
+        left = match.end() if match else start
+    right = min(len(text), end + margin)
+    if right < len(text):
+        space = text[end:right].rfind(" ")
+        newline = text[end:right].rfind("\n")
+        last = max(space, newline)
+        right = end + last if last >= 0 else end
+    return left, right
@@ -8,6 +8,8 @@ import anyio
 import httpx
 
 from app import main
+from app.models import MAX_BATCH_TEXT_LENGTH, MAX_TEXT_LENGTH
+from app.result_cache import AnalysisCache
 
 
 class AnalyzeSchedulingTests(unittest.TestCase):
@@ -126,5 +128,158 @@ class AnalyzeMetricsTests(unittest.TestCase):
         self.assertNotIn("Anna", captured.records[0].getMessage())
 
 
+class AnalyzeBatchTests(unittest.TestCase):
+    def _post(self, body):
+        async def exercise_endpoint():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url="http://anonymize.test",
+            ) as client:
+                return await client.post("/analyze/batch", json=body)
+
+        return asyncio.run(exercise_endpoint())
+
+    def test_returns_results_per_text_in_request_order(self):
+        person = {"entity_type": "PERSON", "start": 0, "end": 4, "score": 0.9}
+        run = main.AnalysisRun(
+            results=[[person], []],
+            metrics=main.AnalysisMetrics(
+                queue_duration_ms=1,
+                model_load_duration_ms=0,
+                processing_duration_ms=20,
+                cold_start=False,
+            ),
+        )
+
+        with patch.object(main, "_analyze_batch", return_value=run) as analyze:
+            response = self._post(
+                {"texts": ["Anna ruft an", "Kein Name"], "entities": ["PERSON"]}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"results": [{"results": [person]}, {"results": []}]}
+        )
+        self.assertEqual(
+            analyze.call_args.args[:2], (["Anna ruft an", "Kein Name"], ["PERSON"])
+        )
+        self.assertIn("processing;dur=20.00", response.headers["server-timing"])
+
+    def test_accepts_texts_of_up_to_max_text_length(self):
+        async def exercise_endpoint(text):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url="http://anonymize.test",
+            ) as client:
+                return await client.post("/analyze", json={"text": text})
+
+        run = main.AnalysisRun(
+            results=[],
+            metrics=main.AnalysisMetrics(
+                queue_duration_ms=0,
+                model_load_duration_ms=0,
+                processing_duration_ms=1,
+                cold_start=False,
+            ),
+        )
+        with (
+            patch.object(main, "analysis_cache", AnalysisCache(0)),
+            patch.object(main, "_analyze", return_value=run),
+        ):
+            accepted = asyncio.run(exercise_endpoint("a" * MAX_TEXT_LENGTH))
+            rejected = asyncio.run(exercise_endpoint("a" * (MAX_TEXT_LENGTH + 1)))
+
+        self.assertEqual(accepted.status_code, 200)
+        self.assertEqual(rejected.status_code, 422)
+
+    def test_rejects_batches_over_the_total_length_cap(self):
+        text = "a" * MAX_BATCH_TEXT_LENGTH
+
+        with patch.object(main, "_analyze_batch") as analyze:
+            response = self._post({"texts": [text, "b"]})
+
+        self.assertEqual(response.status_code, 422)
+        analyze.assert_not_called()
+
+
+class AnalysisCacheTests(unittest.TestCase):
+    person = {"entity_type": "PERSON", "start": 0, "end": 4, "score": 0.9}
+
+    def _run(self, results):
+        return main.AnalysisRun(
+            results=results,
+            metrics=main.AnalysisMetrics(
+                queue_duration_ms=0,
+                model_load_duration_ms=0,
+                processing_duration_ms=1,
+                cold_start=False,
+            ),
+        )
+
+    def _exchange(self, *calls, hold_analysis_slot_after_first=False):
+        async def exercise_endpoint():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url="http://anonymize.test",
+            ) as client:
+                responses = []
+                for method, url, kwargs in calls:
+                    responses.append(
+                        await asyncio.wait_for(
+                            client.request(method, url, **kwargs), timeout=2
+                        )
+                    )
+                    if hold_analysis_slot_after_first and len(responses) == 1:
+                        # Only a cache hit can answer while every slot is taken.
+                        await main._analysis_limiter.acquire()
+                return responses
+
+        return asyncio.run(exercise_endpoint())
+
+    def test_repeated_text_is_answered_without_an_analysis_slot(self):
+        with (
+            patch.object(main, "analysis_cache", AnalysisCache(1024 * 1024)),
+            patch.object(
+                main, "_analyze", return_value=self._run([self.person])
+            ) as analyze,
+            patch.object(main, "_analysis_limiter", anyio.CapacityLimiter(1)),
+        ):
+            first, second, stats = self._exchange(
+                ("POST", "/analyze", {"json": {"text": "Anna"}}),
+                ("POST", "/analyze", {"json": {"text": "Anna", "entities": []}}),
+                ("GET", "/stats", {}),
+                hold_analysis_slot_after_first=True,
+            )
+
+        self.assertEqual(analyze.call_count, 1)
+        self.assertEqual(first.headers["x-anonymize-cache"], "miss")
+        self.assertEqual(second.headers["x-anonymize-cache"], "hit")
+        self.assertEqual(second.json(), {"results": [self.person]})
+        self.assertEqual(stats.json()["cache"]["hits"], 1)
+        self.assertEqual(stats.json()["cache"]["misses"], 1)
+
+    def test_batch_analyzes_only_uncached_texts(self):
+        with (
+            patch.object(main, "analysis_cache", AnalysisCache(1024 * 1024)),
+            patch.object(main, "_analyze", return_value=self._run([self.person])),
+            patch.object(
+                main, "_analyze_batch", return_value=self._run([[]])
+            ) as analyze_batch,
+        ):
+            _, batch = self._exchange(
+                ("POST", "/analyze", {"json": {"text": "Anna"}}),
+                ("POST", "/analyze/batch", {"json": {"texts": ["Anna", "Kein Name"]}}),
+            )
+
+        self.assertEqual(analyze_batch.call_args.args[0], ["Kein Name"])
+        self.assertEqual(batch.headers["x-anonymize-cache-hits"], "1")
+        self.assertEqual(
+            batch.json(), {"results": [{"results": [self.person]}, {"results": []}]}
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
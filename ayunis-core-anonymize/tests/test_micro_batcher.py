@@ -0,0 +1,134 @@
+import threading
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.micro_batcher import MicroBatcher, _Request
+
+
+class RecordingModel:
+    """Fake model: the prediction for a text is the text upper-cased."""
+
+    def __init__(self, fail: bool = False):
+        self.calls: list[tuple[list[str], list[str]]] = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self, texts, labels):
+        with self.lock:
+            self.calls.append((list(texts), list(labels)))
+        if self.fail:
+            raise RuntimeError("inference failed")
+        return [text.upper() for text in texts]
+
+
+class MicroBatcherTests(unittest.TestCase):
+    def test_concurrent_requests_share_one_forward_pass(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, window=0.2, max_chars=1000)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [
+                pool.submit(batcher.submit, [f"text {i}", f"more {i}"], ["person"])
+                for i in range(4)
+            ]
+            results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(len(model.calls), 1)
+        self.assertEqual(len(model.calls[0][0]), 8)
+        self.assertEqual(results[2], ["TEXT 2", "MORE 2"])
+
+    def test_passes_are_bounded_by_max_chars(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, window=0, max_chars=10)
+
+        result = batcher.submit(["aaaaa", "bbbbb", "ccccc", "ddddddddddddd"], ["x"])
+
+        self.assertEqual(result, ["AAAAA", "BBBBB", "CCCCC", "DDDDDDDDDDDDD"])
+        # An oversized text still runs, alone.
+        self.assertEqual(
+            [texts for texts, _ in model.calls],
+            [["aaaaa", "bbbbb"], ["ccccc"], ["ddddddddddddd"]],
+        )
+
+    def test_requests_with_different_labels_do_not_share_a_pass(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, window=0.2, max_chars=1000)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            person = pool.submit(batcher.submit, ["a"], ["person"])
+            custom = pool.submit(batcher.submit, ["b"], ["person", "pet name"])
+            self.assertEqual(person.result(timeout=5), ["A"])
+            self.assertEqual(custom.result(timeout=5), ["B"])
+
+        self.assertEqual(
+            sorted(labels for _, labels in model.calls),
+            [["person"], ["person", "pet name"]],
+        )
+
+    def test_model_errors_reach_every_waiting_request(self):
+        batcher = MicroBatcher(RecordingModel(fail=True), window=0.1, max_chars=1000)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(batcher.submit, ["a"], ["x"]) for _ in range(2)]
+            for future in futures:
+                with self.assertRaisesRegex(RuntimeError, "inference failed"):
+                    future.result(timeout=5)
+
+        # The inference thread survives and serves the next request.
+        batcher._predict = RecordingModel()
+        self.assertEqual(batcher.submit(["ok"], ["x"]), ["OK"])
+
+    def test_a_request_passed_over_repeatedly_leads_the_next_pass(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, window=0, max_chars=3, max_skipped=2)
+        document = _Request(["ddd"] * 3, ("person",), Future())
+        pending = [document]
+
+        # Each pass a new one-chunk message arrives with other labels; being
+        # shorter, it would always go first and fill the pass on its own.
+        for i in range(6):
+            pending.append(_Request([f"m{i}"], ("pet name",), Future()))
+            batcher._run_pass(pending)
+            pending = [r for r in pending if not r.future.done()]
+
+        self.assertEqual(
+            [labels for _, labels in model.calls],
+            [["pet name"], ["pet name"], ["person"]] * 2,
+        )
+        self.assertEqual(document.predictions, ["DDD", "DDD"])
+
+    def test_a_failing_pass_fails_its_requests_and_the_thread_carries_on(self):
+        batcher = MicroBatcher(RecordingModel(), window=0, max_chars=1000)
+        run_pass = batcher._run_pass
+        calls = []
+
+        def broken_once(pending):
+            calls.append(len(pending))
+            if len(calls) == 1:
+                raise KeyError("bookkeeping")
+            run_pass(pending)
+
+        batcher._run_pass = broken_once
+
+        with self.assertRaises(KeyError):
+            batcher.submit(["a"], ["x"])
+        self.assertEqual(batcher.submit(["b"], ["x"]), ["B"])
+
+    def test_submit_gives_up_after_the_timeout(self):
+        release = threading.Event()
+        model = RecordingModel()
+
+        def slow(texts, labels):
+            release.wait(timeout=5)
+            return model(texts, labels)
+
+        batcher = MicroBatcher(slow, window=0, max_chars=1000, timeout=0.1)
+
+        with self.assertRaises(TimeoutError):
+            batcher.submit(["stuck"], ["x"])
+        release.set()
+        self.assertEqual(batcher.submit(["next"], ["x"]), ["NEXT"])
+
+
+if __name__ == "__main__":
+    unittest.main()
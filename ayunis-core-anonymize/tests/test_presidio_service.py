@@ -0,0 +1,232 @@
+import re
+import threading
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from app import presidio_service
+from app.presidio_service import (
+    GLINER_ENTITY_MAPPING,
+    BatchedGLiNERRecognizer,
+    PresidioService,
+    _merge_overlapping,
+)
+from app.result_cache import AnalysisCache
+
+
+def _recognizer(
+    batch_size: int, micro_batch_window: float = 0
+) -> BatchedGLiNERRecognizer:
+    with patch.object(BatchedGLiNERRecognizer, "load"):
+        recognizer = BatchedGLiNERRecognizer(
+            supported_language="de",
+            entity_mapping=GLINER_ENTITY_MAPPING,
+            flat_ner=False,
+            multi_label=True,
+            map_location="cpu",
+            batch_size=batch_size,
+            micro_batch_window=micro_batch_window,
+        )
+    recognizer.gliner = Mock()
+    return recognizer
+
+
+def _person_at_start(texts, labels, **kwargs):
+    """Fake GLiNER: every chunk starts with a four-letter name."""
+    return [
+        [{"label": "person", "start": 0, "end": 4, "score": 0.9}] for _ in texts
+    ]
+
+
+class BatchedGLiNERRecognizerTests(unittest.TestCase):
+    def test_chunks_of_all_texts_share_forward_passes(self):
+        recognizer = _recognizer(batch_size=4)
+        recognizer.gliner.batch_predict_entities.side_effect = _person_at_start
+        long_text = " ".join(["Anna"] * 150)  # several 250-character chunks
+        chunk_starts = [c.start for c in recognizer.text_chunker.chunk(long_text)]
+
+        results = recognizer.predict_batch(
+            ["Hans wohnt in Berlin", long_text], ["PERSON"]
+        )
+
+        chunk_count = 1 + len(chunk_starts)
+        calls = recognizer.gliner.batch_predict_entities.call_args_list
+        self.assertEqual(len(calls), -(-chunk_count // 4))
+        self.assertEqual(sum(len(call.args[0]) for call in calls), chunk_count)
+        self.assertEqual([(r.start, r.end) for r in results[0]], [(0, 4)])
+        self.assertEqual(
+            [r.start for r in results[1]], sorted(set(chunk_starts))
+        )
+        self.assertTrue(all(r.entity_type == "PERSON" for r in results[1]))
+
+    def test_requested_entities_filter_predictions(self):
+        recognizer = _recognizer(batch_size=8)
+        recognizer.gliner.batch_predict_entities.side_effect = _person_at_start
+
+        results = recognizer.predict_batch(["Hans wohnt in Berlin"], ["LOCATION"])
+
+        self.assertEqual(results, [[]])
+
+    def test_analyze_serves_prepared_predictions_on_this_thread_only(self):
+        recognizer = _recognizer(batch_size=8)
+        recognizer.gliner.batch_predict_entities.side_effect = _person_at_start
+        recognizer.gliner.predict_entities.return_value = []
+        text = "Hans wohnt in Berlin"
+        predictions = recognizer.predict_batch([text], ["PERSON"])
+
+        with recognizer.prepared([text], predictions):
+            prepared = recognizer.analyze(text, ["PERSON"])
+            other = recognizer.analyze("Ein anderer Text", ["PERSON"])
+        after = recognizer.analyze(text, ["PERSON"])
+
+        self.assertIs(prepared, predictions[0])
+        self.assertEqual(other, [])
+        self.assertEqual(after, [])
+        self.assertEqual(recognizer.gliner.predict_entities.call_count, 2)
+
+    def test_analyze_runs_through_the_micro_batcher_when_enabled(self):
+        recognizer = _recognizer(batch_size=8, micro_batch_window=0.001)
+        recognizer.gliner.batch_predict_entities.side_effect = _person_at_start
+
+        results = recognizer.analyze("Hans wohnt in Berlin", ["PERSON"])
+
+        self.assertEqual(
+            [(r.entity_type, r.start, r.end) for r in results], [("PERSON", 0, 4)]
+        )
+        recognizer.gliner.predict_entities.assert_not_called()
+
+    def test_unbatched_runs_the_model_on_this_thread(self):
+        recognizer = _recognizer(batch_size=8, micro_batch_window=1)
+        recognizer.gliner.batch_predict_entities.side_effect = _person_at_start
+        recognizer.micro_batcher = Mock()
+
+        with recognizer.unbatched():
+            results = recognizer.predict_batch(["Hans wohnt in Berlin"], ["PERSON"])
+        recognizer.micro_batcher.submit.side_effect = lambda texts, labels: [[]]
+        outside = recognizer.predict_batch(["Hans wohnt in Berlin"], ["PERSON"])
+
+        self.assertEqual([(r.start, r.end) for r in results[0]], [(0, 4)])
+        self.assertEqual(outside, [[]])
+        recognizer.micro_batcher.submit.assert_called_once()
+
+
+def _find_names(texts, entities=None):
+    """Fake analysis: every "Anna" is a PERSON."""
+    return [
+        [
+            {"entity_type": "PERSON", "start": m.start(), "end": m.end(), "score": 0.9}
+            for m in re.finditer("Anna", text)
+        ]
+        for text in texts
+    ]
+
+
+class SegmentedAnalysisTests(unittest.TestCase):
+    def _service(self) -> PresidioService:
+        # Skips __init__: the model is not needed, analyze_batch is faked.
+        service = PresidioService.__new__(PresidioService)
+        service.version = "test"
+        service.segment_cache = AnalysisCache(1024 * 1024)
+        service.gliner_recognizer = MagicMock()
+        service.analyze_batch = Mock(side_effect=_find_names)
+        return service
+
+    def _document(self, paragraphs: int) -> list[str]:
+        filler = "Text ohne Namen. " * 10
+        return [
+            f"{filler}Anna schreibt Absatz {i}. {filler}" for i in range(paragraphs)
+        ]
+
+    def test_offsets_are_mapped_back_without_duplicates(self):
+        service = self._service()
+        text = "\n\n".join(self._document(12))
+
+        results = service.analyze(text)
+
+        self.assertEqual(
+            [r["start"] for r in results],
+            [m.start() for m in re.finditer("Anna", text)],
+        )
+        self.assertTrue(all(text[r["start"] : r["end"]] == "Anna" for r in results))
+
+    def test_an_edit_only_reanalyzes_the_windows_around_it(self):
+        service = self._service()
+        paragraphs = self._document(12)
+        service.analyze("\n\n".join(paragraphs))
+        paragraphs[5] = "Ein neuer Absatz, in dem Anna wieder vorkommt."
+        service.analyze_batch.reset_mock()
+
+        text = "\n\n".join(paragraphs)
+        results = service.analyze(text)
+
+        reanalyzed = service.analyze_batch.call_args.args[0]
+        self.assertLessEqual(len(reanalyzed), 3)
+        self.assertTrue(any("neuer Absatz" in window for window in reanalyzed))
+        self.assertEqual(len(results), 12)
+        self.assertEqual(text[results[5]["start"] : results[5]["end"]], "Anna")
+
+    def test_short_texts_are_analyzed_whole(self):
+        service = self._service()
+        service.analyzer = Mock()
+        service.analyzer.analyze.return_value = []
+
+        service.analyze("Anna wohnt in Berlin")
+
+        service.analyze_batch.assert_not_called()
+        service.analyzer.analyze.assert_called_once()
+
+
+class WindowedAnalysisTests(unittest.TestCase):
+    def test_long_text_windows_are_analyzed_on_several_threads(self):
+        threads = set()
+        # Passes only once four shares are being analyzed at the same time.
+        all_running = threading.Barrier(4, timeout=5)
+
+        micro_batched = []
+
+        def record_thread(texts, entities=None):
+            threads.add(threading.current_thread().name)
+            micro_batched.append(service.gliner_recognizer._micro_batched())
+            all_running.wait()
+            return _find_names(texts, entities)
+
+        service = PresidioService.__new__(PresidioService)
+        service.version = "test"
+        service.segment_cache = AnalysisCache(0)
+        service.gliner_recognizer = _recognizer(batch_size=8, micro_batch_window=1)
+        service.analyze_batch = Mock(side_effect=record_thread)
+        filler = "Text ohne Namen. " * 30
+        text = "\n\n".join(f"{filler}Anna {i}. {filler}" for i in range(100))
+
+        with patch.object(presidio_service, "WINDOW_WORKERS", 4):
+            results = service.analyze(text)
+
+        self.assertGreater(len(text), 100_000)
+        self.assertEqual(service.analyze_batch.call_count, 4)
+        self.assertEqual(len(threads), 4)
+        # The window threads run the model themselves, in parallel.
+        self.assertEqual(micro_batched, [False] * 4)
+        self.assertEqual(
+            [r["start"] for r in results],
+            [m.start() for m in re.finditer("Anna", text)],
+        )
+
+    def test_halves_of_an_entity_cut_by_a_window_boundary_are_merged(self):
+        detections = [
+            {"entity_type": "PERSON", "start": 10, "end": 22, "score": 0.8},
+            {"entity_type": "PERSON", "start": 15, "end": 25, "score": 0.9},
+            {"entity_type": "LOCATION", "start": 16, "end": 22, "score": 0.7},
+            {"entity_type": "PERSON", "start": 30, "end": 34, "score": 0.6},
+        ]
+
+        self.assertEqual(
+            _merge_overlapping(detections),
+            [
+                {"entity_type": "PERSON", "start": 10, "end": 25, "score": 0.9},
+                {"entity_type": "LOCATION", "start": 16, "end": 22, "score": 0.7},
+                {"entity_type": "PERSON", "start": 30, "end": 34, "score": 0.6},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
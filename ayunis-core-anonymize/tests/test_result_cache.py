@@ -0,0 +1,67 @@
+import json
+import tempfile
+import unittest
+
+from app.result_cache import AnalysisCache, cache_key
+
+PERSON = {"entity_type": "PERSON", "start": 0, "end": 4, "score": 0.9}
+
+
+class CacheKeyTests(unittest.TestCase):
+    def test_entity_order_and_empty_filter_do_not_change_the_key(self):
+        self.assertEqual(
+            cache_key("Anna", ["PERSON", "EMAIL_ADDRESS"], "v1"),
+            cache_key("Anna", ["EMAIL_ADDRESS", "PERSON"], "v1"),
+        )
+        self.assertEqual(cache_key("Anna", [], "v1"), cache_key("Anna", None, "v1"))
+
+    def test_text_filter_and_version_change_the_key(self):
+        key = cache_key("Anna", None, "v1")
+        self.assertNotEqual(key, cache_key("Anne", None, "v1"))
+        self.assertNotEqual(key, cache_key("Anna", ["PERSON"], "v1"))
+        self.assertNotEqual(key, cache_key("Anna", None, "v2"))
+
+
+class AnalysisCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used_entries_beyond_max_bytes(self):
+        entry_size = len(cache_key("a", None, "v")) + len(json.dumps([PERSON]))
+        cache = AnalysisCache(max_bytes=2 * entry_size)
+        first, second, third = (cache_key(t, None, "v") for t in "abc")
+
+        cache.put(first, [PERSON])
+        cache.put(second, [PERSON])
+        self.assertEqual(cache.get(first), [PERSON])  # second is now oldest
+        cache.put(third, [PERSON])
+
+        self.assertIsNone(cache.get(second))
+        self.assertEqual(cache.get(third), [PERSON])
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 2))
+        self.assertLessEqual(stats.bytes, stats.max_bytes)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = AnalysisCache(max_bytes=0)
+        cache.put("key", [PERSON])
+
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.get("key"))
+
+    def test_disk_cache_is_shared_between_instances_and_bounded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = AnalysisCache(0, directory, disk_max_bytes=10_000)
+            reader = AnalysisCache(1_000_000, directory, disk_max_bytes=10_000)
+            writer.put("shared", [PERSON])
+
+            self.assertEqual(reader.get("shared"), [PERSON])
+            self.assertEqual(reader.get("shared"), [PERSON])
+            stats = reader.stats()
+            self.assertEqual((stats.disk_hits, stats.hits), (1, 1))
+
+            for i in range(200):
+                writer.put(f"key-{i}", [PERSON] * 2)
+            self.assertIsNone(AnalysisCache(0, directory, 10_000).get("key-0"))
+            self.assertIsNotNone(AnalysisCache(0, directory, 10_000).get("key-199"))
+
+
+if __name__ == "__main__":
+    unittest.main()
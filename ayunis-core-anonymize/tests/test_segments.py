@@ -0,0 +1,57 @@
+import unittest
+
+from app.segments import split_segments, window
+
+
+def _paragraphs(count: int, length: int = 300) -> list[str]:
+    return [f"Absatz {i}: " + "wort " * (length // 5) for i in range(count)]
+
+
+class SplitSegmentsTests(unittest.TestCase):
+    def test_segments_tile_the_text_at_paragraph_breaks(self):
+        text = "\n\n".join(_paragraphs(5))
+
+        segments = split_segments(text, max_chars=2000)
+
+        self.assertEqual(len(segments), 5)
+        self.assertEqual(segments[0][0], 0)
+        self.assertEqual(segments[-1][1], len(text))
+        for (_, end), (start, _) in zip(segments, segments[1:]):
+            self.assertEqual(end, start)
+        self.assertTrue(text[slice(*segments[1])].startswith("Absatz 1"))
+
+    def test_editing_a_paragraph_leaves_the_other_segments_unchanged(self):
+        paragraphs = _paragraphs(6)
+        before = "\n\n".join(paragraphs)
+        paragraphs[2] = "Ganz neuer Absatz mit Anna Schmidt."
+        after = "\n\n".join(paragraphs)
+
+        old = {before[s:e] for s, e in split_segments(before, max_chars=2000)}
+        new = [after[s:e] for s, e in split_segments(after, max_chars=2000)]
+
+        self.assertEqual([segment in old for segment in new].count(False), 1)
+
+    def test_long_paragraphs_are_cut_after_sentences(self):
+        text = "Das ist ein Satz. " * 200
+
+        segments = split_segments(text, max_chars=500)
+
+        self.assertTrue(all(end - start <= 500 for start, end in segments))
+        self.assertEqual(segments[-1][1], len(text))
+        for start, end in segments[:-1]:
+            self.assertTrue(text[start:end].endswith("Satz. "))
+
+
+class WindowTests(unittest.TestCase):
+    def test_margins_end_at_whitespace(self):
+        text = "eins zwei drei vier fünf sechs sieben acht"
+        start, end = text.index("vier"), text.index("vier") + 5
+
+        left, right = window(text, start, end, margin=8)
+
+        self.assertEqual(text[left:right], "drei vier fünf")
+        self.assertEqual(window(text, 0, len(text), margin=8), (0, len(text)))
+
+
+if __name__ == "__main__":
+    unittest.main()
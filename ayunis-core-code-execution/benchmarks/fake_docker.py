@@ -0,0 +1,230 @@
+"""In-process stand-in for the parts of the Docker API the executor uses.
+
+Every call sleeps for a configurable latency instead of talking to a daemon,
+so the executor's own overhead (base64, tar building, threads, admission)
+can be measured and compared without Docker. Sandboxes do not run the code:
+a started container emits as many stdout bytes as the `# stdout-bytes: N`
+comment in its main.py asks for (0 without one) after `run` seconds, and
+exits 0. The workspace tar is read to the end, so staging costs what
+producing it costs.
+"""
+
+import io
+import re
+import tarfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import docker
+
+# Seconds per call, roughly what a local daemon takes for a small sandbox.
+DEFAULT_LATENCY = {
+    "volume_create": 0.010,
+    "volume_remove": 0.010,
+    "container_create": 0.040,
+    "put_archive": 0.010,
+    "start": 0.050,
+    "run": 0.010,
+    "get_archive": 0.005,
+    "kill": 0.005,
+    "remove": 0.030,
+}
+
+_STDOUT_DIRECTIVE = re.compile(rb"^# stdout-bytes: (\d+)$", re.MULTILINE)
+_CHUNK = 64 * 1024
+
+
+class _Latency:
+    def __init__(self, latency: Dict[str, float], scale: float):
+        self._latency = {k: v * scale for k, v in latency.items()}
+
+    def __call__(self, call: str) -> None:
+        seconds = self._latency.get(call, 0.0)
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class FakeImage:
+    id = "sha256:" + "0" * 64
+
+
+class FakeImages:
+    def get(self, name: str) -> FakeImage:
+        return FakeImage()
+
+    def pull(self, name: str) -> FakeImage:
+        return FakeImage()
+
+
+class FakeVolume:
+    def __init__(
+        self, client: "FakeDockerClient", name: str, labels: Dict[str, str]
+    ):
+        self._client = client
+        self.name = name
+        self.attrs = {"Labels": labels}
+
+    def remove(self, force: bool = False) -> None:
+        self._client.latency("volume_remove")
+        self._client.volumes.forget(self.name)
+
+
+class FakeVolumes:
+    def __init__(self, client: "FakeDockerClient"):
+        self._client = client
+        self._volumes: Dict[str, FakeVolume] = {}
+        self._lock = threading.Lock()
+
+    def create(
+        self, name: str, labels: Optional[Dict[str, str]] = None, **_: Any
+    ) -> FakeVolume:
+        self._client.latency("volume_create")
+        volume = FakeVolume(self._client, name, labels or {})
+        with self._lock:
+            self._volumes[name] = volume
+        return volume
+
+    def get(self, name: str) -> FakeVolume:
+        with self._lock:
+            if name not in self._volumes:
+                raise docker.errors.NotFound(name)
+            return self._volumes[name]
+
+    def list(self, filters: Optional[Dict[str, Any]] = None) -> List[FakeVolume]:
+        with self._lock:
+            return list(self._volumes.values())
+
+    def forget(self, name: str) -> None:
+        with self._lock:
+            self._volumes.pop(name, None)
+
+
+class FakeContainer:
+    def __init__(
+        self, client: "FakeDockerClient", name: str, labels: Dict[str, str]
+    ):
+        self._client = client
+        self.name = name
+        self.labels = labels
+        self._stdout_bytes = 0
+        self._killed = threading.Event()
+
+    def put_archive(self, path: str, data: Any) -> bool:
+        self._client.latency("put_archive")
+        with tarfile.open(fileobj=data, mode="r|") as tar:
+            for member in tar:
+                f = tar.extractfile(member)
+                if f is None:
+                    continue
+                content = f.read()
+                if member.name == "main.py":
+                    match = _STDOUT_DIRECTIVE.search(content)
+                    self._stdout_bytes = int(match.group(1)) if match else 0
+        return True
+
+    def start(self) -> None:
+        self._client.latency("start")
+
+    def attach(
+        self, **_: Any
+    ) -> Iterator[Tuple[Optional[bytes], Optional[bytes]]]:
+        if self._killed.wait(self._client.run_seconds):
+            return
+        remaining = self._stdout_bytes
+        chunk = b"x" * _CHUNK
+        while remaining > 0 and not self._killed.is_set():
+            size = min(remaining, _CHUNK)
+            yield chunk[:size], None
+            remaining -= size
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, int]:
+        return {"StatusCode": 137 if self._killed.is_set() else 0}
+
+    def get_archive(self, path: str) -> Tuple[List[bytes], Dict[str, Any]]:
+        self._client.latency("get_archive")
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode="w") as tar:
+            directory = tarfile.TarInfo("output")
+            directory.type = tarfile.DIRTYPE
+            tar.addfile(directory)
+        return [data.getvalue()], {}
+
+    def kill(self) -> None:
+        self._client.latency("kill")
+        self._killed.set()
+
+    def remove(self, force: bool = False) -> None:
+        self._client.latency("remove")
+        self._client.containers.forget(self.name)
+
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient"):
+        self._client = client
+        self._containers: Dict[str, FakeContainer] = {}
+        self._lock = threading.Lock()
+
+    def create(
+        self,
+        image: str,
+        name: Optional[str] = None,
+        labels: Optional[Dict[str, str]] = None,
+        **_: Any,
+    ) -> FakeContainer:
+        self._client.latency("container_create")
+        container = FakeContainer(self._client, name or "", labels or {})
+        with self._lock:
+            self._containers[container.name] = container
+        return container
+
+    def list(self, all: bool = False, filters: Any = None) -> List[FakeContainer]:
+        with self._lock:
+            return list(self._containers.values())
+
+    def forget(self, name: str) -> None:
+        with self._lock:
+            self._containers.pop(name, None)
+
+
+class _EventStream:
+    """An events stream that stays open, without events, until closed."""
+
+    def __init__(self) -> None:
+        self._closed = threading.Event()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self._closed.wait()
+        return iter(())
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class FakeDockerClient:
+    """docker.DockerClient look-alike with `latency` seconds per API call.
+
+    `scale` multiplies every latency (0 measures the executor alone);
+    `run_seconds` is how long each sandbox's code appears to run.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[Dict[str, float]] = None,
+        scale: float = 1.0,
+        run_seconds: Optional[float] = None,
+    ):
+        merged = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.latency = _Latency(merged, scale)
+        self.run_seconds = (
+            merged["run"] * scale if run_seconds is None else run_seconds
+        )
+        self.images = FakeImages()
+        self.volumes = FakeVolumes(self)
+        self.containers = FakeContainers(self)
+
+    def events(self, **_: Any) -> _EventStream:
+        return _EventStream()
+
+    def ping(self) -> bool:
+        return True
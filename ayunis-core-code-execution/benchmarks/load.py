@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Throughput and latency of PythonExecutor.execute() under concurrent load.
+
+Sweeps concurrency (that many clients sending one execution after another,
+with MAX_CONCURRENT_EXECUTIONS set to match) over a set of payloads and
+reports end-to-end latency percentiles, executions per second and the
+median of each execution phase:
+
+  code        a one-line snippet
+  files-10mb  a snippet with a 10 MiB input file (base64 in the request)
+  stdout-5mb  a snippet printing 5 MiB, beyond the default output cap
+
+Two modes:
+  fake    a stand-in Docker API (benchmarks/fake_docker.py) that sleeps a
+          configurable latency per call and never runs the code, so the
+          numbers are the executor's own overhead plus the injected latency
+  docker  a real local daemon and sandbox image
+
+    python benchmarks/load.py --mode fake --latency-scale 0
+    python benchmarks/load.py --mode docker --concurrency 1,4 --requests 20
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import docker  # noqa: E402
+
+from executor import PythonExecutor  # noqa: E402
+from fake_docker import FakeDockerClient  # noqa: E402
+from models import ExecutionRequest, ExecutorConfig  # noqa: E402
+
+_FILE_BYTES = 10 * 1024 * 1024
+_STDOUT_BYTES = 5 * 1024 * 1024
+
+
+def payloads() -> Dict[str, ExecutionRequest]:
+    data = base64.b64encode(os.urandom(_FILE_BYTES)).decode("ascii")
+    return {
+        "code": ExecutionRequest(code="print('ok')"),
+        "files-10mb": ExecutionRequest(
+            code="print(len(open('/execution/files/data.bin', 'rb').read()))",
+            files={"data.bin": data},
+        ),
+        # The comment tells the fake daemon how much output to produce.
+        "stdout-5mb": ExecutionRequest(
+            code=(
+                f"# stdout-bytes: {_STDOUT_BYTES}\n"
+                f"import sys\nsys.stdout.write('x' * {_STDOUT_BYTES})\n"
+            )
+        ),
+    }
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_executor(
+    mode: str, concurrency: int, config: Dict[str, Any], fake: Any
+) -> PythonExecutor:
+    executor_config = ExecutorConfig(
+        max_concurrent_executions=concurrency,
+        max_queued_executions=concurrency,
+        reaper_interval=0,
+        max_sessions=0,
+        **config,
+    )
+    if mode == "docker":
+        return PythonExecutor(executor_config)
+    with patch("docker.from_env", return_value=fake):
+        return PythonExecutor(executor_config)
+
+
+async def run_level(
+    executor: PythonExecutor,
+    request: ExecutionRequest,
+    requests: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """`concurrency` clients in a closed loop until `requests` executions ran."""
+    latencies: List[float] = []
+    phases: Dict[str, List[float]] = {}
+    failures = 0
+    remaining = requests
+
+    async def client() -> None:
+        nonlocal failures, remaining
+        while remaining > 0:
+            remaining -= 1
+            started_at = time.perf_counter()
+            response = await executor.execute(request)
+            latencies.append(time.perf_counter() - started_at)
+            if not response.success:
+                failures += 1
+            if response.metrics is not None:
+                for phase, ms in response.metrics.phases_ms.items():
+                    phases.setdefault(phase, []).append(ms)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "per_second": requests / elapsed,
+        "failures": failures,
+        "phases_ms": {k: statistics.median(v) for k, v in phases.items()},
+    }
+
+
+async def sweep(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    fake = FakeDockerClient(scale=args.latency_scale, run_seconds=args.run_seconds)
+    config: Dict[str, Any] = {"collect_resource_stats": args.mode == "docker"}
+    if args.image:
+        config["docker_image"] = args.image
+    selected = payloads()
+    if args.payloads:
+        selected = {k: v for k, v in selected.items() if k in args.payloads}
+
+    rows = []
+    for concurrency in args.concurrency:
+        executor = make_executor(args.mode, concurrency, config, fake)
+        try:
+            for name, request in selected.items():
+                # One unmeasured round so thread pools and caches are warm.
+                await run_level(executor, request, concurrency, concurrency)
+                row = await run_level(executor, request, args.requests, concurrency)
+                row.update(payload=name, concurrency=concurrency)
+                rows.append(row)
+                print_row(row)
+        finally:
+            executor.close()
+    return rows
+
+
+def print_row(row: Dict[str, Any]) -> None:
+    phases = " ".join(f"{k}={v:.1f}" for k, v in row["phases_ms"].items())
+    print(
+        f"{row['payload']:<12}{row['concurrency']:>6}{row['p50_ms']:>10.1f}"
+        f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['per_second']:>10.1f}"
+        f"{row['failures']:>6}  {phases}",
+        flush=True,
+    )
+
+
+def docker_available() -> bool:
+    try:
+        return bool(docker.from_env().ping())
+    except Exception:
+        return False
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--mode",
+        choices=["auto", "fake", "docker"],
+        default="auto",
+        help="auto uses the local daemon when one answers, the fake otherwise",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda v: [int(c) for c in v.split(",")],
+        default=[1, 4, 16],
+        help="comma-separated concurrency levels",
+    )
+    parser.add_argument("--requests", type=int, default=64, help="per level")
+    parser.add_argument(
+        "--payloads",
+        type=lambda v: v.split(","),
+        default=None,
+        help="comma-separated subset of: code, files-10mb, stdout-5mb",
+    )
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="fake mode: multiplier for the injected Docker API latency",
+    )
+    parser.add_argument(
+        "--run-seconds",
+        type=float,
+        default=None,
+        help="fake mode: how long the sandboxed code appears to run",
+    )
+    parser.add_argument("--image", default=None, help="docker mode: sandbox image")
+    parser.add_argument("--json", default=None, help="also write results here")
+    args = parser.parse_args(argv)
+    if args.mode == "auto":
+        args.mode = "docker" if docker_available() else "fake"
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    args = parse_args(argv)
+    print(f"mode: {args.mode}")
+    print(
+        f"{'payload':<12}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'exec/s':>10}{'fail':>6}  median phase ms"
+    )
+    rows = asyncio.run(sweep(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+    return rows
+
+
+if __name__ == "__main__":
+    main()
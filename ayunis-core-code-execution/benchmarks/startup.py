@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Time-to-first-line of user code per sandbox runtime, against a real daemon.
+
+Compares
+  exec               python /execution/main.py (the default runtime)
+  forkserver-cold    the preloading launcher, container started per request
+  forkserver-warm    the launcher in a pre-started (pooled) container
+
+Each sample measures from the moment the request would take over (workspace
+staged / container started) to the first byte of stdout. The user code
+imports the scientific stack and prints one line, so the difference is the
+interpreter and import time the forkserver takes off the request path.
+
+Needs Docker and a sandbox image that contains /opt/ayunis/forkserver.py:
+
+    docker build -t python-sandbox:latest sandbox/
+    python benchmarks/startup.py --runs 10
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Literal, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from executor import PythonExecutor  # noqa: E402
+from models import ExecutorConfig  # noqa: E402
+
+CODE = (
+    "import numpy, pandas\n"
+    "import matplotlib.pyplot as plt\n"
+    "print('first line', flush=True)\n"
+)
+
+
+def sample(executor: PythonExecutor, warm: bool, warmup: float) -> float:
+    """Seconds from handing over the workspace to the first stdout chunk."""
+    if warm:
+        sandbox = executor._create_pooled_sandbox()
+        time.sleep(warmup)  # a pooled sandbox has been preloading meanwhile
+    else:
+        sandbox = executor._create_sandbox()
+    workspace_tar = executor._build_workspace_tar(CODE, [])
+    try:
+        output = sandbox.container.attach(
+            stdout=True, stderr=True, stream=True, logs=True, demux=True
+        )
+        started_at = time.perf_counter()
+        executor._stage_workspace(sandbox, workspace_tar)
+        if not sandbox.started:
+            sandbox.container.start()
+        for stdout_chunk, _ in output:
+            if stdout_chunk:
+                return time.perf_counter() - started_at
+        raise RuntimeError("sandbox exited without output")
+    finally:
+        workspace_tar.close()
+        executor._destroy_sandbox(sandbox)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", default="python-sandbox:latest")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=5.0,
+        help="seconds a warm sandbox gets to preload before it is used",
+    )
+    args = parser.parse_args()
+
+    modes: Dict[str, Tuple[Literal["exec", "forkserver"], bool]] = {
+        "exec": ("exec", False),
+        "forkserver-cold": ("forkserver", False),
+        "forkserver-warm": ("forkserver", True),
+    }
+    results: Dict[str, List[float]] = {}
+    for label, (runtime, warm) in modes.items():
+        executor = PythonExecutor(
+            ExecutorConfig(docker_image=args.image, sandbox_runtime=runtime)
+        )
+        try:
+            results[label] = [
+                sample(executor, warm, args.warmup) for _ in range(args.runs)
+            ]
+        finally:
+            executor.close()
+
+    print(f"{'runtime':<18}{'median ms':>12}{'p95 ms':>10}{'min ms':>10}")
+    for label, samples in results.items():
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(
+            f"{label:<18}{statistics.median(ordered) * 1000:>12.0f}"
+            f"{p95 * 1000:>10.0f}{ordered[0] * 1000:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
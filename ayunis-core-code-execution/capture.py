@@ -0,0 +1,110 @@
+"""Capture of a sandbox container's stdout/stderr while it runs."""
+
+import codecs
+from typing import Callable, Dict, Optional
+
+OutputCallback = Callable[[str, str], None]
+
+STREAMS = ("stdout", "stderr")
+
+
+class HeadTailBuffer:
+    """Keeps the first and last `limit / 2` bytes of an unbounded byte stream.
+
+    The beginning of a log usually says what ran and the end says how it
+    failed; the middle of a print loop is what gets dropped. Memory stays at
+    `limit` bytes however much is written.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(limit, 0)
+        self._head_limit = self.limit // 2
+        self._tail_limit = self.limit - self._head_limit
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.total = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.limit
+
+    def write(self, chunk: bytes) -> None:
+        self.total += len(chunk)
+        room = self._head_limit - len(self._head)
+        if room > 0:
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk or self._tail_limit == 0:
+            return
+        if len(chunk) >= self._tail_limit:
+            self._tail[:] = chunk[-self._tail_limit :]
+        else:
+            self._tail += chunk
+            overflow = len(self._tail) - self._tail_limit
+            if overflow > 0:
+                del self._tail[:overflow]
+
+    def text(self) -> str:
+        if not self.truncated:
+            return bytes(self._head + self._tail).decode("utf-8", errors="replace")
+        # A cut can land inside a multi-byte character; the half left on
+        # either side of the marker is dropped rather than replaced.
+        head = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(
+            bytes(self._head)
+        )
+        start = 0
+        while start < len(self._tail) and self._tail[start] & 0xC0 == 0x80:
+            start += 1
+        tail = self._tail[start:].decode("utf-8", errors="replace")
+        dropped = self.total - len(self._head) - len(self._tail)
+        return f"{head}\n[... {dropped} bytes truncated ...]\n{tail}"
+
+
+class OutputCapture:
+    """Receives demultiplexed output chunks as the container produces them.
+
+    Kept output is bounded to `limit` bytes per stream (head and tail, see
+    HeadTailBuffer). When `on_output` is given (streaming), chunks are also
+    decoded incrementally, since a multi-byte UTF-8 character can be split
+    across two reads, and handed over as they arrive; a streaming caller passes
+    keep=False so the service holds none of the log.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        on_output: Optional[OutputCallback] = None,
+        keep: bool = True,
+    ):
+        self._on_output = on_output
+        self._keep = keep
+        self._decoders = {
+            name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for name in STREAMS
+        }
+        self._buffers: Dict[str, HeadTailBuffer] = {
+            name: HeadTailBuffer(limit) for name in STREAMS
+        }
+
+    def feed(self, stream: str, chunk: bytes) -> None:
+        if self._keep:
+            self._buffers[stream].write(chunk)
+        if self._on_output is not None:
+            self._emit(stream, self._decoders[stream].decode(chunk))
+
+    def close(self) -> None:
+        """Flush any incomplete trailing character to the callback."""
+        if self._on_output is None:
+            return
+        for name in STREAMS:
+            self._emit(name, self._decoders[name].decode(b"", final=True))
+
+    def text(self, stream: str) -> str:
+        return self._buffers[stream].text()
+
+    def truncated(self, stream: str) -> bool:
+        return self._buffers[stream].truncated
+
+    def _emit(self, stream: str, text: str) -> None:
+        if text and self._on_output is not None:
+            self._on_output(stream, text)
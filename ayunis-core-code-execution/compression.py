@@ -0,0 +1,274 @@
+"""Negotiated gzip/zstd content encoding for the execution endpoints.
+
+Request bodies sent with `Content-Encoding: gzip` or `zstd` are decompressed
+chunk by chunk as they arrive, so a multipart upload is inflated straight into
+its spooled upload file (and from there into the staging tar) without the
+whole body being held twice. Responses are compressed with the best encoding
+the client's `Accept-Encoding` allows once they reach `compression_min_bytes`;
+streamed responses are flushed per chunk so events are not held back.
+
+zstd needs the optional `zstandard` package; without it only gzip is offered
+and zstd request bodies are answered with 415.
+"""
+
+import json
+import zlib
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Optional (the `prod` extra). The ignores cover both environments: without
+# the package the import is unresolved, with it the fallback is a retype.
+try:
+    import zstandard  # type: ignore[import-not-found, unused-ignore]
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None  # type: ignore[assignment, unused-ignore]
+
+# Output produced per decompression step, so a compression bomb is noticed
+# before it has been inflated in full.
+_CHUNK = 64 * 1024
+# zstd's decompressobj cannot bound its output; feeding it small slices keeps
+# one step's output within a few MiB (a 1 KiB RLE frame expands to ~32 MiB).
+_ZSTD_SLICE = 1024
+
+
+def supported_encodings() -> List[str]:
+    """Encodings this process can decode and produce, most preferred first."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The preferred supported encoding an Accept-Encoding header allows."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = [
+        (qualities.get(encoding, qualities.get("*", 0.0)), -rank, encoding)
+        for rank, encoding in enumerate(supported_encodings())
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class _Decoder:
+    """Streaming decompressor with a cap on the total decompressed size."""
+
+    def __init__(self, encoding: str, max_bytes: int):
+        self.encoding = encoding
+        self._max_bytes = max_bytes
+        self._produced = 0
+        if encoding == "gzip":
+            self._gzip = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        else:
+            self._zstd = zstandard.ZstdDecompressor().decompressobj()
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        try:
+            for chunk in self._inflate(data):
+                self._produced += len(chunk)
+                if self._produced > self._max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=(
+                            "Decompressed request body exceeds "
+                            f"{self._max_bytes} bytes"
+                        ),
+                    )
+                yield chunk
+        except (zlib.error, getattr(zstandard, "ZstdError", zlib.error)) as e:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid {self.encoding} request body: {e}"
+            )
+
+    def finish(self) -> None:
+        """Reject a body that ended before its compressed stream did."""
+        if self.encoding == "gzip" and not self._gzip.eof:
+            raise HTTPException(
+                status_code=400, detail="Truncated gzip request body"
+            )
+
+    def _inflate(self, data: bytes) -> Iterator[bytes]:
+        if self.encoding == "gzip":
+            while data:
+                chunk = self._gzip.decompress(data, _CHUNK)
+                data = self._gzip.unconsumed_tail
+                if chunk:
+                    yield chunk
+                if self._gzip.eof:
+                    return
+            return
+        for start in range(0, len(data), _ZSTD_SLICE):
+            chunk = self._zstd.decompress(data[start:start + _ZSTD_SLICE])
+            if chunk:
+                yield chunk
+
+
+class _Encoder:
+    """Streaming compressor for one response body."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._gzip = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        else:
+            self._zstd = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def encode(self, data: bytes, flush: bool) -> bytes:
+        """Compress `data`; with `flush` everything so far is made decodable."""
+        if self.encoding == "gzip":
+            out = self._gzip.compress(data)
+            return out + self._gzip.flush(zlib.Z_SYNC_FLUSH) if flush else out
+        compressed: bytes = self._zstd.compress(data)
+        if flush:
+            compressed += self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return compressed
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._gzip.flush()
+        tail: bytes = self._zstd.flush()
+        return tail
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing request and response bodies under `paths`.
+
+    `settings` is called per request and returns `(min_bytes,
+    max_decompressed_bytes)`, so the limits follow the executor's config.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Tuple[str, ...],
+        settings: Callable[[], Tuple[int, int]],
+    ):
+        self.app = app
+        self.paths = paths
+        self.settings = settings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        min_bytes, max_bytes = self.settings()
+        content_encoding = headers.get("content-encoding", "identity").lower()
+        if content_encoding != "identity":
+            if content_encoding not in supported_encodings():
+                await _send_error(
+                    send,
+                    415,
+                    f"Unsupported Content-Encoding {content_encoding!r}; "
+                    f"supported: {', '.join(supported_encodings())}",
+                )
+                return
+            scope = _without_body_headers(scope)
+            receive = _decoding_receive(
+                receive, _Decoder(content_encoding, max_bytes)
+            )
+
+        encoding = negotiate(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _encoding_send(send, encoding, min_bytes))
+
+
+def _without_body_headers(scope: Scope) -> Scope:
+    """The scope with Content-Encoding and Content-Length dropped.
+
+    Both describe the compressed body, not the one the app will read.
+    """
+    headers = [
+        (name, value)
+        for name, value in scope["headers"]
+        if name not in (b"content-encoding", b"content-length")
+    ]
+    return dict(scope, headers=headers)
+
+
+def _decoding_receive(receive: Receive, decoder: _Decoder) -> Receive:
+    async def decoding_receive() -> Message:
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            more_body = message.get("more_body", False)
+            body = b"".join(decoder.decode(message.get("body", b"")))
+            if not more_body:
+                decoder.finish()
+            # An empty chunk mid-stream would read as nothing; wait for data.
+            if body or not more_body:
+                return {"type": "http.request", "body": body, "more_body": more_body}
+
+    return decoding_receive
+
+
+def _encoding_send(send: Send, encoding: str, min_bytes: int) -> Send:
+    start: Optional[Message] = None
+    encoder: Optional[_Encoder] = None
+    passthrough = False
+
+    async def encoding_send(message: Message) -> None:
+        nonlocal start, encoder, passthrough
+        if message["type"] == "http.response.start":
+            start = message
+            return
+        if message["type"] != "http.response.body" or passthrough:
+            await send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if encoder is None:
+            assert start is not None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if "content-encoding" in headers or (
+                not more_body and len(body) < min_bytes
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            encoder = _Encoder(encoding)
+            headers["Content-Encoding"] = encoding
+            del headers["Content-Length"]
+            await send(start)
+
+        data = encoder.encode(body, flush=more_body)
+        if not more_body:
+            data += encoder.finish()
+        await send(
+            {"type": "http.response.body", "body": data, "more_body": more_body}
+        )
+
+    return encoding_send
+
+
+async def _send_error(send: Send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
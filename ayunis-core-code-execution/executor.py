@@ -2,14 +2,259 @@
 
 import asyncio
 import base64
+import concurrent.futures
 import docker
+import functools
 import io
+import logging
 import tarfile
+import tempfile
+import threading
 import time
 import uuid
-from typing import Optional, Iterable, cast
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncGenerator,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 import os
-from models import ExecutionRequest, ExecutionResponse, ExecutorConfig
+from capture import OutputCapture
+from file_cache import (
+    CachedFile,
+    InputFileCache,
+    UnknownFileReferenceError,
+    file_digest,
+)
+from hosts import DockerHost, HostScheduler
+from images import SandboxImageManager
+from jobs import JobRecord, JobStore
+from models import (
+    ExecutionEvent,
+    ExecutionMetrics,
+    ExecutionRequest,
+    ExecutionResponse,
+    ExecutionStatus,
+    ExecutorConfig,
+    ExecutorStats,
+    FileCacheStats,
+    PoolStats,
+    SessionCreateRequest,
+    SessionExecuteRequest,
+    SessionInfo,
+)
+import metrics
+from metrics import ContainerStatsSampler
+from pool import Sandbox, SandboxPool
+from process_sandbox import ProcessSandbox
+from reaper import OrphanReaper, resource_labels
+from result_cache import ResultCache, cache_limits, result_key
+from scheduling import (
+    ExecutionLimiter,
+    ExecutorBusyError,
+    FairShareLimiter,
+    Waiter,
+)
+from sessions import SessionLimitError, SessionManager, SessionNotFoundError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Output events buffered between the worker thread and a streaming response.
+_STREAM_QUEUE_SIZE = 64
+
+# The attach stream ends when the container exits, so this wait only collects
+# the exit status and should return immediately.
+_WAIT_AFTER_EXIT_TIMEOUT = 10
+
+# The workspace tar is spooled to disk beyond this size, so large inputs are
+# streamed to the docker daemon rather than held in memory a second time.
+_TAR_SPOOL_BYTES = 8 * 1024 * 1024
+
+# Container commands per SANDBOX_RUNTIME. The forkserver launcher is part of
+# the sandbox image (sandbox/forkserver.py); it runs main.py once the workspace
+# tar's last entry, the sentinel, has been extracted.
+_SANDBOX_COMMANDS = {
+    "exec": "python /execution/main.py",
+    "forkserver": "python /opt/ayunis/forkserver.py",
+}
+_FORKSERVER_SENTINEL = ".start"
+
+# Minimum age before an untracked resource of this instance counts as
+# orphaned; covers helper and cache writer containers mid-use.
+_REAPER_GRACE = 300
+
+# How long a batch snippet waits before retrying admission when the wait queue
+# is full of other requests' work.
+_BATCH_RETRY_INTERVAL = 0.5
+
+# Staged as main.py into session sandboxes; see session_driver.py.
+_SESSION_DRIVER_PATH = Path(__file__).with_name("session_driver.py")
+
+
+class PhaseTimer:
+    """Accumulates wall-clock durations of the named phases of one execution.
+
+    `started_at` (a perf_counter value) is when the request arrived; the time
+    until the first phase begins is recorded as "queue".
+    """
+
+    def __init__(self, started_at: Optional[float] = None) -> None:
+        self.durations_ms: Dict[str, float] = {}
+        now = time.perf_counter()
+        self.started_at = now if started_at is None else started_at
+        if started_at is not None:
+            self.durations_ms["queue"] = (now - started_at) * 1000
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            self.durations_ms[name] = self.durations_ms.get(name, 0.0) + elapsed_ms
+
+    def summary(self) -> str:
+        return ", ".join(f"{k}={v:.1f}ms" for k, v in self.durations_ms.items())
+
+    def metrics(
+        self,
+        peak_memory_bytes: Optional[int] = None,
+        cpu_time_ms: Optional[float] = None,
+    ) -> ExecutionMetrics:
+        return ExecutionMetrics(
+            phases_ms={k: round(v, 3) for k, v in self.durations_ms.items()},
+            total_ms=round((time.perf_counter() - self.started_at) * 1000, 3),
+            peak_memory_bytes=peak_memory_bytes,
+            cpu_time_ms=cpu_time_ms,
+        )
+
+
+class BatchTooLargeError(Exception):
+    """A batch holds more snippets than MAX_BATCH_SIZE."""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Batch of {size} executions exceeds the limit of {limit}")
+        self.size = size
+        self.limit = limit
+
+
+@dataclass
+class InputFile:
+    """A file staged into files/, read from `fileobj` while the tar is built."""
+
+    name: str
+    size: int
+    fileobj: BinaryIO
+    # SHA-256 of the content when already known, so the file cache need not
+    # hash it again (files shared by a batch).
+    digest: Optional[str] = None
+
+
+@dataclass
+class ExecutionResult:
+    """Outcome of one execution, with output files as raw bytes.
+
+    `response.output_files` is left unset; the JSON API base64-encodes the CSV
+    artifacts into it, the multipart API streams all of them as binary parts.
+    """
+
+    response: ExecutionResponse
+    artifacts: Dict[str, bytes] = field(default_factory=dict)
+
+
+@dataclass
+class _ExecutionJob:
+    execution_id: str
+    code: str
+    inputs: Iterable[InputFile]
+    capture: OutputCapture
+    # filename -> SHA-256 of an already cached input file
+    file_refs: Dict[str, str] = field(default_factory=dict)
+    # Collect every file in output/ rather than only .csv (multipart API).
+    all_outputs: bool = False
+    # When the request arrived (perf_counter), so queueing is accounted for.
+    submitted_at: float = field(default_factory=time.perf_counter)
+    # Who the slot is accounted to under fair scheduling.
+    tenant_id: Optional[str] = None
+
+
+def _decode_b64(content_b64: str) -> bytes:
+    try:
+        return base64.b64decode(content_b64)
+    except Exception:
+        return b""
+
+
+def decode_input_files(files: Optional[Dict[str, str]]) -> Iterator[InputFile]:
+    """Lazily base64-decode request files, one at a time, as they are staged."""
+    for filename, content_b64 in (files or {}).items():
+        content = _decode_b64(content_b64)
+        yield InputFile(name=filename, size=len(content), fileobj=io.BytesIO(content))
+
+
+def encode_output_files(artifacts: Dict[str, bytes]) -> Optional[Dict[str, str]]:
+    """CSV artifacts as the base64 mapping of ExecutionResponse.output_files."""
+    encoded = {
+        name: base64.b64encode(content).decode("utf-8")
+        for name, content in artifacts.items()
+        if name.endswith(".csv")
+    }
+    return encoded or None
+
+
+def _total_pool_stats(pools: List[PoolStats]) -> Optional[PoolStats]:
+    """Pool statistics summed over hosts; latencies are of the slowest host."""
+    if not pools:
+        return None
+    refills = sum(p.refills for p in pools)
+    refill_ms = sum((p.avg_refill_ms or 0) * p.refills for p in pools)
+    last = [p.last_refill_ms for p in pools if p.last_refill_ms is not None]
+    return PoolStats(
+        min_size=sum(p.min_size for p in pools),
+        max_size=sum(p.max_size for p in pools),
+        target_size=sum(p.target_size for p in pools),
+        idle=sum(p.idle for p in pools),
+        hits=sum(p.hits for p in pools),
+        misses=sum(p.misses for p in pools),
+        refills=refills,
+        refill_failures=sum(p.refill_failures for p in pools),
+        last_refill_ms=max(last) if last else None,
+        avg_refill_ms=refill_ms / refills if refills else None,
+    )
+
+
+def _total_file_cache_stats(
+    caches: List[FileCacheStats],
+) -> Optional[FileCacheStats]:
+    """File cache statistics summed over hosts."""
+    if not caches:
+        return None
+    return FileCacheStats(
+        entries=sum(c.entries for c in caches),
+        bytes=sum(c.bytes for c in caches),
+        max_entries=sum(c.max_entries for c in caches),
+        max_bytes=sum(c.max_bytes for c in caches),
+        hits=sum(c.hits for c in caches),
+        misses=sum(c.misses for c in caches),
+        evictions=sum(c.evictions for c in caches),
+    )
 
 
 class PythonExecutor:
@@ -22,15 +267,179 @@ class PythonExecutor:
             max_memory=os.getenv("MAX_MEMORY", "512m"),
             max_cpu=float(os.getenv("MAX_CPU", "1.0")),
         )
-        self.docker_client = docker.from_env()
+        # The process backend runs sandboxes without any Docker daemon; pool,
+        # hosts, input file cache and sessions are features of Docker sandboxes.
+        self._process: Optional[ProcessSandbox] = None
+        self._host_scheduler: Optional[HostScheduler] = None
+        if self.config.sandbox_backend == "process":
+            self._process = ProcessSandbox(
+                python=self.config.process_python,
+                workdir=self.config.process_workdir,
+                timeout=self.config.execution_timeout,
+                max_memory=self.config.max_memory,
+                max_cpu=self.config.max_cpu,
+                binds=self.config.process_binds,
+                cgroup_root=self.config.process_cgroup,
+            )
+            self._process.check()
+            logger.info(f"Process sandbox ready: {self._process.version}")
+        else:
+            self._host_scheduler = self._connect_hosts()
+
+        # docker-py is blocking, so every execution runs on this pool instead of
+        # the event loop; one thread per slot, as the limiter caps concurrency.
+        self._limiter: Union[ExecutionLimiter, FairShareLimiter]
+        if self.config.fair_scheduling:
+            self._limiter = FairShareLimiter(
+                max_concurrent=self.config.max_concurrent_executions,
+                max_queued=self.config.max_queued_executions,
+                initial_duration=float(self.config.execution_timeout),
+                cpu_per_slot=self.config.max_cpu,
+                tenant_max_running=self.config.tenant_max_concurrent,
+                tenant_max_queued=self.config.tenant_max_queued,
+                cpu_budget=self.config.tenant_cpu_budget,
+                budget_window=self.config.tenant_budget_window,
+                weights=self.config.tenant_weights,
+            )
+        else:
+            self._limiter = ExecutionLimiter(
+                max_concurrent=self.config.max_concurrent_executions,
+                max_queued=self.config.max_queued_executions,
+                initial_duration=float(self.config.execution_timeout),
+            )
+        self._io_threads = ThreadPoolExecutor(
+            max_workers=self._limiter.max_concurrent,
+            thread_name_prefix="docker-io",
+        )
+
+        # Containers of in-flight executions, so they can be killed early.
+        self._running: Dict[str, Any] = {}
+        # Executions cancelled through the job API, checked again at start.
+        self._cancelled: Set[str] = set()
+        self._jobs = JobStore(retention=self.config.job_retention_seconds)
+
+        # Sandboxes created and not yet destroyed, by id; the reaper leaves
+        # their labelled containers and volumes alone.
+        self._live_sandboxes: Set[str] = set()
+        self._reaper: Optional[OrphanReaper] = None
+        if self._host_scheduler is not None and self.config.reaper_interval > 0:
+            self._reaper = OrphanReaper(
+                instance_id=self.config.instance_id,
+                grace=max(_REAPER_GRACE, 2 * self.config.execution_timeout),
+                max_age=self.config.reaper_max_age,
+                in_use=self._live_sandboxes.__contains__,
+            )
+
+        # Cached input files are volumes on one daemon: one cache per host.
+        if self._host_scheduler is not None and self.config.file_cache_max_bytes > 0:
+            for host in self._hosts.hosts:
+                host.file_cache = InputFileCache(
+                    host.client,
+                    image=self.config.docker_image,
+                    max_bytes=self.config.file_cache_max_bytes,
+                    max_entries=self.config.file_cache_max_entries,
+                    writer_labels=lambda: resource_labels(self.config.instance_id),
+                )
+                try:
+                    host.file_cache.load()
+                except Exception as e:
+                    logger.warning(
+                        f"Could not load input file cache index on {host.name}: {e}"
+                    )
+
+        self._results: Optional[ResultCache] = None
+        if self.config.result_cache_max_bytes > 0:
+            self._results = ResultCache(
+                max_entries=self.config.result_cache_max_entries,
+                max_bytes=self.config.result_cache_max_bytes,
+                ttl=self.config.result_cache_ttl,
+            )
+
+        if self._host_scheduler is not None and self.config.pool_min_size > 0:
+            for host in self._hosts.hosts:
+                host.pool = SandboxPool(
+                    factory=functools.partial(self._create_pooled_sandbox, host),
+                    destroy=self._destroy_sandbox,
+                    min_size=self.config.pool_min_size,
+                    max_size=self.config.pool_max_size,
+                    # Recycled long before other instances' reapers may
+                    # consider them abandoned.
+                    max_age=self.config.reaper_max_age / 2,
+                )
+                host.pool.start()
+                logger.info(
+                    f"Sandbox pool started on {host.name} "
+                    f"(min={host.pool.min_size}, max={host.pool.max_size})"
+                )
+
+        self._sessions: Optional[SessionManager] = None
+        # Cache entries mounted by a session sandbox, pinned for its lifetime.
+        self._session_pins: Dict[str, List[str]] = {}
+        if self._host_scheduler is not None and self.config.max_sessions > 0:
+            self._session_driver = _SESSION_DRIVER_PATH.read_text(encoding="utf-8")
+            self._sessions = SessionManager(
+                destroy=self._destroy_session_sandbox,
+                max_sessions=self.config.max_sessions,
+                idle_timeout=self.config.session_idle_timeout,
+            )
+            self._sessions.start()
+
+    @property
+    def _hosts(self) -> HostScheduler:
+        """The Docker hosts; only used on paths of the Docker backend."""
+        if self._host_scheduler is None:
+            raise RuntimeError("Not available with the process sandbox backend")
+        return self._host_scheduler
+
+    def _connect_hosts(self) -> HostScheduler:
+        """Connect to the Docker daemons and make sure each has the image."""
+        # One client per Docker daemon; without DOCKER_HOSTS, the one the
+        # environment points at (DOCKER_HOST etc.), as before.
+        if self.config.docker_hosts:
+            clients = [
+                (url, docker.DockerClient(base_url=url))
+                for url in self.config.docker_hosts
+            ]
+        else:
+            clients = [("local", docker.from_env())]
 
         # Fail fast at startup on a genuinely unavailable image (main.py exits
-        # on this). The execution path re-checks per request to self-heal a tag
-        # that gets deleted while the service is running.
-        self._ensure_sandbox_image()
-        print(f"Sandbox image ready: {self.config.docker_image}")
+        # on this). Afterwards presence is cached and dropped by image events,
+        # so a tag deleted while the service is running still self-heals. With
+        # several hosts, one that is not ready only starts out of rotation.
+        hosts: List[DockerHost] = []
+        unready: List[DockerHost] = []
+        startup_error: Optional[Exception] = None
+        for name, client in clients:
+            images = SandboxImageManager(client, self.config.docker_image)
+            host = DockerHost(name=name, client=client, images=images)
+            hosts.append(host)
+            try:
+                images.ensure()
+                logger.info(
+                    f"Sandbox image ready on {name}: {self.config.docker_image}"
+                )
+            except Exception as e:
+                if len(clients) == 1:
+                    raise
+                logger.warning(f"Docker host {name} is not ready: {e}")
+                unready.append(host)
+                startup_error = e
+            images.start()
+        if len(unready) == len(hosts) and startup_error is not None:
+            for host in hosts:
+                host.images.close()
+            raise startup_error
+        scheduler = HostScheduler(
+            hosts,
+            failure_threshold=self.config.host_failure_threshold,
+            cooldown=self.config.host_cooldown_seconds,
+        )
+        for host in unready:
+            scheduler.take_out(host)
+        return scheduler
 
-    def _ensure_sandbox_image(self) -> None:
+    def _ensure_sandbox_image(self, host: Optional[DockerHost] = None) -> None:
         """Ensure the sandbox image exists locally, pulling it if missing.
 
         The image is defined in sandbox/Dockerfile and published to GHCR; it
@@ -40,221 +449,1470 @@ class PythonExecutor:
         Called both at startup (fail-fast) and before every execution: the tag
         is runtime-mutable, so anything from `docker image prune -a` to a deploy
         image reclaim can delete it out from under a running service, and the
-        execution path (containers.create) has no implicit pull. images.get is
-        a local lookup, so re-checking on the hot path is cheap when present.
+        execution path (containers.create) has no implicit pull. Presence is
+        cached by SandboxImageManager and dropped on image delete/untag
+        events, so the hot path makes no API call while the image is there.
+        Defaults to the first Docker host.
         """
-        image = self.config.docker_image
+        (host or self._hosts.primary).images.ensure()
+
+    def _create_sandbox(
+        self,
+        sandbox_id: Optional[str] = None,
+        cached_files: Iterable[CachedFile] = (),
+        host: Optional[DockerHost] = None,
+    ) -> Sandbox:
+        """Create the workspace volume and a not-yet-started sandbox container.
+
+        Both the warm pool and the on-demand path go through here, so a pooled
+        sandbox is isolated exactly like a freshly created one. Cached input
+        files are mounted read-only at their own paths; mounts are fixed at
+        create time, so executions using them cannot take a pooled sandbox.
+        The sandbox is created on `host`, by default the first Docker host.
+        """
+        host = host or self._hosts.primary
+        sandbox_id = sandbox_id or str(uuid.uuid4())[:8]
+        vol_name = f"exec-vol-{sandbox_id}"
+        volumes = {vol_name: {"bind": "/execution", "mode": "rw"}}
+        for cached in cached_files:
+            volumes[cached.volume_name] = {"bind": cached.mount_path, "mode": "ro"}
+        # Pooled sandboxes can become sessions once claimed, so with sessions
+        # enabled every sandbox carries the idle TTL the reaper checks.
+        labels = resource_labels(
+            self.config.instance_id,
+            sandbox_id,
+            idle_ttl=(
+                self.config.session_idle_timeout
+                if self.config.max_sessions > 0
+                else None
+            ),
+        )
+        self._live_sandboxes.add(sandbox_id)
         try:
-            self.docker_client.images.get(image)
-            return
-        except docker.errors.ImageNotFound:
-            print(f"Sandbox image {image} not found locally, pulling...")
+            volume = host.client.volumes.create(name=vol_name, labels=labels)
+        except Exception:
+            self._live_sandboxes.discard(sandbox_id)
+            raise
+
+        def create() -> Any:
+            return host.client.containers.create(
+                self.config.docker_image,
+                command=_SANDBOX_COMMANDS[self.config.sandbox_runtime],
+                name=f"exec-{sandbox_id}",
+                volumes=volumes,
+                working_dir="/",
+                network_disabled=True,
+                mem_limit=self.config.max_memory,
+                nano_cpus=int(self.config.max_cpu * 1e9),
+                read_only=True,
+                tmpfs={"/tmp": "size=100M"},
+                environment={
+                    "HOME": "/execution",
+                    "XDG_CACHE_HOME": "/execution/.cache",
+                    "XDG_CONFIG_HOME": "/execution/.config",
+                    "MPLCONFIGDIR": "/execution/.config/matplotlib",
+                    "PYTHONPYCACHEPREFIX": "/execution/__pycache__",
+                    "MPLBACKEND": "Agg",
+                },
+                security_opt=["no-new-privileges"],
+                cap_drop=["ALL"],
+                pids_limit=50,
+                auto_remove=False,
+                labels=labels,
+            )
 
         try:
-            self.docker_client.images.pull(image)
-            print(f"Pulled sandbox image: {image}")
+            try:
+                container = create()
+            except docker.errors.ImageNotFound:
+                # Deleted since presence was last confirmed (no event yet).
+                host.images.invalidate()
+                host.images.ensure()
+                container = create()
+        except Exception:
+            try:
+                volume.remove(force=True)  # type: ignore
+            except Exception as e:
+                logger.warning(f"Could not remove volume {vol_name}: {e}")
+            self._live_sandboxes.discard(sandbox_id)
+            raise
+        return Sandbox(
+            sandbox_id=sandbox_id,
+            volume_name=vol_name,
+            volume=volume,
+            container=container,
+            host=host,
+        )
+
+    def _create_pooled_sandbox(self, host: Optional[DockerHost] = None) -> Sandbox:
+        """Pool factory: with the forkserver runtime, also start the container,
+        so the stack is already imported when an execution claims it."""
+        sandbox = self._create_sandbox(host=host)
+        if self.config.sandbox_runtime == "forkserver":
+            try:
+                sandbox.container.start()  # type: ignore
+            except Exception:
+                self._destroy_sandbox(sandbox)
+                raise
+            sandbox.started = True
+        return sandbox
+
+    def _destroy_sandbox(self, sandbox: Sandbox) -> None:
+        """Remove a sandbox container and then its volume (single use).
+
+        Failures are logged and left to the reaper, which removes the
+        labelled leftovers once the sandbox is no longer tracked as live.
+        """
+        try:
+            sandbox.container.remove(force=True)  # type: ignore
+        except docker.errors.NotFound:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not remove container exec-{sandbox.sandbox_id}: {e}")
+        try:
+            sandbox.volume.remove(force=True)  # type: ignore
+        except docker.errors.NotFound:
+            pass
         except Exception as e:
-            raise RuntimeError(
-                f"Sandbox image '{image}' is not available locally and could "
-                f"not be pulled: {e}. "
-                f"Dev: run ./dev up (builds it) or `docker build -t "
-                f"python-sandbox:latest ayunis-core-code-execution/sandbox`. "
-                f"Prod: point DOCKER_IMAGE at a published GHCR sandbox tag."
-            ) from e
+            logger.warning(f"Could not remove volume {sandbox.volume_name}: {e}")
+        self._live_sandboxes.discard(sandbox.sandbox_id)
+
+    def _stage_workspace(self, sandbox: Sandbox, data: BinaryIO) -> None:
+        """Copy the workspace tar into the sandbox's /execution volume.
+
+        In "direct" mode the archive goes straight into the created (not yet
+        started) sandbox: docker extracts into the volume mount even though the
+        rootfs is read-only, and ownership comes from the tar headers (uid/gid
+        1000), so no chown pass is needed. "helper" mode keeps the previous
+        root helper container for daemons where that does not hold.
+        """
+        if self.config.staging_mode == "direct":
+            sandbox.container.put_archive(path="/execution", data=data)  # type: ignore
+            return
+        self._stage_workspace_via_helper(sandbox, data)
+
+    def _stage_workspace_via_helper(self, sandbox: Sandbox, data: BinaryIO) -> None:
+        """Populate the sandbox volume using a short-lived helper container."""
+        helper = sandbox.host.client.containers.create(
+            self.config.docker_image,
+            command="sleep infinity",
+            name=f"exec-prep-{sandbox.sandbox_id}",
+            user="root",
+            volumes={sandbox.volume_name: {"bind": "/mnt", "mode": "rw"}},
+            network_disabled=True,
+            mem_limit="128m",
+            nano_cpus=int(self.config.max_cpu * 1e8),
+            read_only=False,
+            tmpfs={"/tmp": "size=50M"},
+            security_opt=["no-new-privileges"],
+            cap_drop=["ALL"],
+            pids_limit=30,
+            auto_remove=False,
+            labels=resource_labels(self.config.instance_id, sandbox.sandbox_id),
+        )
+        try:
+            helper.start()  # type: ignore
+            helper.exec_run(  # type: ignore
+                [
+                    "sh",
+                    "-lc",
+                    "mkdir -p /mnt/files /mnt/output && chown -R 1000:1000 /mnt",
+                ]
+            )
+            # Upload prepared tar into the volume root
+            helper.put_archive(path="/mnt", data=data)  # type: ignore
+            helper.exec_run(["sh", "-lc", "chown -R 1000:1000 /mnt"])  # type: ignore
+        finally:
+            try:
+                helper.remove(force=True)  # type: ignore
+            except Exception as e:
+                logger.warning(
+                    f"Could not remove helper exec-prep-{sandbox.sandbox_id}: {e}"
+                )
+
+    def stats(self) -> ExecutorStats:
+        """Runtime statistics for capacity sizing."""
+        if self._host_scheduler is None:
+            return ExecutorStats(
+                queue=self._limiter.stats(),
+                result_cache=self._results.stats() if self._results else None,
+            )
+        hosts = self._hosts.stats()
+        return ExecutorStats(
+            queue=self._limiter.stats(),
+            pool=_total_pool_stats([h.pool for h in hosts if h.pool]),
+            file_cache=_total_file_cache_stats(
+                [h.file_cache for h in hosts if h.file_cache]
+            ),
+            result_cache=self._results.stats() if self._results else None,
+            sessions=self._sessions.stats() if self._sessions else None,
+            reaper=self._reaper.stats() if self._reaper else None,
+            hosts=hosts,
+        )
+
+    def check_file_refs(self, file_refs: Optional[Dict[str, str]]) -> None:
+        """Reject references to files that are not cached, before queueing.
+
+        Raises:
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        if not file_refs:
+            return
+        digests = list(file_refs.values())
+        if self._host_scheduler is None:
+            raise UnknownFileReferenceError(digests)
+        # All references of one execution must be cached on the same host.
+        missing = min(
+            (
+                host.file_cache.missing(digests) if host.file_cache else digests
+                for host in self._hosts.hosts
+            ),
+            key=len,
+        )
+        if missing:
+            raise UnknownFileReferenceError(missing)
+
+    def _place(self, file_refs: Optional[Dict[str, str]]) -> DockerHost:
+        """Pick the host for an execution: among those holding all of its
+        referenced files, the least loaded. Pair with self._hosts.release()."""
+        digests = list((file_refs or {}).values())
+        if not digests:
+            return self._hosts.acquire()
+        return self._hosts.acquire(
+            lambda host: host.file_cache is not None
+            and not host.file_cache.missing(digests)
+        )
+
+    @contextmanager
+    def _on_host(self, host: DockerHost) -> Iterator[None]:
+        """Count a docker failure in the block against the host's health."""
+        try:
+            yield
+        except Exception:
+            self._hosts.record_failure(host)
+            raise
+
+    def _cache_inputs(
+        self,
+        host: DockerHost,
+        inputs: Iterable[InputFile],
+        file_refs: Dict[str, str],
+    ) -> Dict[str, CachedFile]:
+        """Resolve every input file and reference to a pinned cache entry.
+
+        Inline files are hashed and only written to the host's cache when
+        their content is new; a repeated upload is just mounted. The caller
+        must release() the returned entries once the sandbox is gone.
+        """
+        file_cache = host.file_cache
+        assert file_cache is not None
+        cached: Dict[str, CachedFile] = {}
+        try:
+            for name, digest in file_refs.items():
+                entry = file_cache.acquire(digest)
+                if entry is None:
+                    raise UnknownFileReferenceError([digest])
+                cached[name] = entry
+            for input_file in inputs:
+                if input_file.digest is not None:
+                    digest, size = input_file.digest, input_file.size
+                else:
+                    digest, size = file_digest(input_file.fileobj)
+                entry = file_cache.acquire(digest)
+                if entry is None:
+                    entry = file_cache.put(digest, size, input_file.fileobj)
+                cached[input_file.name] = entry
+        except Exception:
+            file_cache.release(e.digest for e in cached.values())
+            raise
+        return cached
+
+    def reap_orphans(self) -> None:
+        """Remove orphaned sandbox containers and volumes on every host.
+
+        Blocking; the server runs it at startup and every REAPER_INTERVAL
+        seconds off the event loop.
+        """
+        if self._reaper is None:
+            return
+        for host in self._hosts.hosts:
+            try:
+                self._reaper.reap(host.client)
+            except Exception as e:
+                logger.warning(f"Reaping orphaned resources on {host.name} failed: {e}")
+
+    def close(self) -> None:
+        """Release resources held across executions (sessions, idle pools)."""
+        if self._sessions is not None:
+            self._sessions.close_all()
+        if self._host_scheduler is not None:
+            self._hosts.close()
+        self._io_threads.shutdown(wait=False)
+
+    def _build_workspace_tar(
+        self,
+        code: str,
+        inputs: Iterable[InputFile],
+        cached: Optional[Dict[str, CachedFile]] = None,
+    ) -> BinaryIO:
+        """Build the workspace tar: code, input files, output dir.
+
+        Every entry is owned by uid/gid 1000 (the sandbox user) in the tar
+        headers, which is what lets "direct" staging skip a chown pass. Input
+        files are copied from their file objects into a spooled temporary
+        file, which is handed to put_archive as a stream. Cached files become
+        symlinks to their read-only mounts instead of copies.
+        """
+        tar_stream = cast(
+            BinaryIO, tempfile.SpooledTemporaryFile(max_size=_TAR_SPOOL_BYTES)
+        )
+        with tarfile.open(fileobj=tar_stream, mode="w") as tar:
+            # main.py
+            code_bytes = code.encode("utf-8")
+            ti = tarfile.TarInfo(name="main.py")
+            ti.size = len(code_bytes)
+            ti.mtime = int(time.time())
+            ti.mode = 0o644
+            ti.uid = 1000
+            ti.gid = 1000
+            tar.addfile(ti, io.BytesIO(code_bytes))
+
+            # files/ directory and its contents
+            files_dir_info = tarfile.TarInfo(name="files")
+            files_dir_info.type = tarfile.DIRTYPE
+            files_dir_info.mode = 0o775
+            files_dir_info.mtime = int(time.time())
+            files_dir_info.uid = 1000
+            files_dir_info.gid = 1000
+            tar.addfile(files_dir_info)
+
+            for input_file in inputs:
+                fi = tarfile.TarInfo(name=f"files/{input_file.name}")
+                fi.size = input_file.size
+                fi.mtime = int(time.time())
+                fi.mode = 0o644
+                fi.uid = 1000
+                fi.gid = 1000
+                tar.addfile(fi, input_file.fileobj)
+
+            for filename, cached_file in (cached or {}).items():
+                link = tarfile.TarInfo(name=f"files/{filename}")
+                link.type = tarfile.SYMTYPE
+                link.linkname = cached_file.data_path
+                link.mtime = int(time.time())
+                link.uid = 1000
+                link.gid = 1000
+                tar.addfile(link)
+
+            # output/ directory (empty)
+            output_dir_info = tarfile.TarInfo(name="output")
+            output_dir_info.type = tarfile.DIRTYPE
+            output_dir_info.mode = 0o777
+            output_dir_info.mtime = int(time.time())
+            output_dir_info.uid = 1000
+            output_dir_info.gid = 1000
+            tar.addfile(output_dir_info)
+
+            # Writable cache/config dirs to avoid writes to read-only rootfs
+            for dir_name in [
+                ".cache",
+                ".config",
+                ".config/matplotlib",
+                "__pycache__",
+            ]:
+                d = tarfile.TarInfo(name=dir_name)
+                d.type = tarfile.DIRTYPE
+                d.mode = 0o777
+                d.mtime = int(time.time())
+                d.uid = 1000
+                d.gid = 1000
+                tar.addfile(d)
+
+            # Last entry, so the forkserver only starts once all else is there.
+            if self.config.sandbox_runtime == "forkserver":
+                sentinel = tarfile.TarInfo(name=_FORKSERVER_SENTINEL)
+                sentinel.mtime = int(time.time())
+                sentinel.mode = 0o644
+                sentinel.uid = 1000
+                sentinel.gid = 1000
+                tar.addfile(sentinel, io.BytesIO(b""))
+
+        tar_stream.seek(0)
+        return tar_stream
 
     async def execute(self, request: ExecutionRequest) -> ExecutionResponse:
         """
         Execute Python code in an isolated container
 
+        The Docker work runs on a worker thread, so the event loop (and with it
+        /health and every other request) stays responsive while it runs.
+
         Args:
             request: ExecutionRequest containing code and optional files
 
         Returns:
             ExecutionResponse with results
+
+        Raises:
+            ExecutorBusyError: all slots are busy and the wait queue is full
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        self.check_file_refs(request.file_refs)
+        key = await self._result_key(request)
+        hit = self._cached_result(key)
+        if hit is not None:
+            return hit
+        result = await self._submit(
+            _ExecutionJob(
+                execution_id=_new_execution_id(),
+                code=request.code,
+                inputs=decode_input_files(request.files),
+                capture=OutputCapture(limit=self.config.max_output_bytes),
+                file_refs=request.file_refs or {},
+                tenant_id=request.tenant_id,
+            )
+        )
+        response = result.response.model_copy(
+            update={"output_files": encode_output_files(result.artifacts)}
+        )
+        self._store_result(key, response)
+        return response
+
+    async def _result_key(self, request: ExecutionRequest) -> Optional[str]:
+        """Result cache key of a request that opted in, else None."""
+        if not request.cache or self._results is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            # Hashing large inputs and a possible image lookup stay off the loop
+            # (and off the docker-io threads, which are sized to the slots).
+            return await loop.run_in_executor(None, self._compute_result_key, request)
+        except Exception as e:
+            logger.warning(f"Result cache skipped: {e}")
+            return None
+
+    def _compute_result_key(self, request: ExecutionRequest) -> Optional[str]:
+        # The key includes the image's content id, so a rebuilt image behind
+        # the same tag never serves results of the old one.
+        # Hosts are expected to run the same image; the first one is asked.
+        if self._process is not None:
+            return result_key(
+                request.code,
+                request.files,
+                request.file_refs,
+                f"process:{self._process.python}:{self._process.version}",
+                cache_limits(self.config),
+            )
+        self._ensure_sandbox_image()
+        image_id = self._hosts.primary.images.image_id
+        if image_id is None:
+            return None
+        return result_key(
+            request.code,
+            request.files,
+            request.file_refs,
+            image_id,
+            cache_limits(self.config),
+        )
+
+    def _cached_result(self, key: Optional[str]) -> Optional[ExecutionResponse]:
+        if key is None or self._results is None:
+            return None
+        response = self._results.get(key)
+        if response is None:
+            return None
+        return response.model_copy(update={"cached": True, "metrics": None})
+
+    def _store_result(self, key: Optional[str], response: ExecutionResponse) -> None:
+        # Only runs that completed are worth repeating; timeouts and
+        # infrastructure failures (exit code -1) are retried for real.
+        if key is None or self._results is None or response.exit_code < 0:
+            return
+        self._results.put(key, response)
+
+    async def execute_with_artifacts(
+        self,
+        code: str,
+        inputs: List[InputFile],
+        file_refs: Optional[Dict[str, str]] = None,
+        tenant_id: Optional[str] = None,
+    ) -> ExecutionResult:
+        """
+        Execute Python code with binary inputs, returning every output file.
+
+        Unlike execute(), input files are read straight from their file objects
+        (no base64), and all files in output/ are returned as raw bytes, not
+        just CSVs.
+
+        Raises:
+            ExecutorBusyError: all slots are busy and the wait queue is full
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        self.check_file_refs(file_refs)
+        return await self._submit(
+            _ExecutionJob(
+                execution_id=_new_execution_id(),
+                code=code,
+                inputs=inputs,
+                capture=OutputCapture(limit=self.config.max_output_bytes),
+                file_refs=file_refs or {},
+                all_outputs=True,
+                tenant_id=tenant_id,
+            )
+        )
+
+    async def execute_batch(
+        self, requests: List[ExecutionRequest]
+    ) -> List[ExecutionResponse]:
         """
-        execution_id = str(uuid.uuid4())[:8]
+        Run independent snippets in parallel; results come back in request order.
+
+        Every snippet runs in its own sandbox, exactly like execute(). At most
+        max_concurrent_executions snippets of a batch are in flight at once,
+        so a batch never fills the wait queue on its own. Input files that
+        several snippets share are decoded once and, with the file cache
+        enabled, hashed once and written to each host's cache at most once,
+        then mounted read-only into each snippet that uses them. Snippets
+        that opted into the result cache and have a stored result do not run.
+
+        Raises:
+            BatchTooLargeError: more snippets than max_batch_size
+            ExecutorBusyError: the batch's first snippet could not be admitted
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        if len(requests) > self.config.max_batch_size:
+            raise BatchTooLargeError(len(requests), self.config.max_batch_size)
+        for request in requests:
+            self.check_file_refs(request.file_refs)
+
+        keys = await asyncio.gather(*(self._result_key(r) for r in requests))
+        results = [self._cached_result(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return cast(List[ExecutionResponse], results)
+
+        # base64 -> content, decoded once however many snippets use it
+        contents: Dict[str, bytes] = {}
+        uses: Dict[str, int] = {}
+        for i in pending:
+            for content_b64 in (requests[i].files or {}).values():
+                uses[content_b64] = uses.get(content_b64, 0) + 1
+                if content_b64 not in contents:
+                    contents[content_b64] = _decode_b64(content_b64)
+
+        loop = asyncio.get_running_loop()
+        # base64 -> SHA-256 of files used more than once, hashed once here
+        digests: Dict[str, str] = {}
+        reused = [b64 for b64, n in uses.items() if n > 1]
+        if (
+            reused
+            and self._host_scheduler is not None
+            and self._hosts.primary.file_cache is not None
+        ):
+            digests = await loop.run_in_executor(
+                None,
+                lambda: {
+                    b64: file_digest(io.BytesIO(contents[b64]))[0] for b64 in reused
+                },
+            )
+
+        window = asyncio.Semaphore(
+            max(1, min(len(pending), self.config.max_concurrent_executions))
+        )
+        # The batch as a whole is admitted or rejected with the first snippet.
+        first: Waiter = self._limiter.reserve(requests[pending[0]].tenant_id)
+        first_held = False
+
+        async def run(index: int) -> None:
+            nonlocal first_held
+            job = self._batch_job(requests[index], contents, digests)
+            async with window:
+                if index == pending[0]:
+                    waiter, first_held = first, True
+                else:
+                    waiter = await self._reserve_retrying(requests[index].tenant_id)
+                async with self._limiter.hold(waiter):
+                    result = await loop.run_in_executor(
+                        self._io_threads, self._execute_blocking, job
+                    )
+            response = result.response.model_copy(
+                update={"output_files": encode_output_files(result.artifacts)}
+            )
+            self._store_result(keys[index], response)
+            results[index] = response
 
         try:
-            # Re-ensure the image before it is needed: the tag may have been
-            # deleted since startup, and containers.create does not pull.
-            self._ensure_sandbox_image()
-
-            # Build in-memory tar archive with code, optional files, and output directory
-            tar_stream = io.BytesIO()
-            with tarfile.open(fileobj=tar_stream, mode="w") as tar:
-                # main.py
-                code_bytes = request.code.encode("utf-8")
-                ti = tarfile.TarInfo(name="main.py")
-                ti.size = len(code_bytes)
-                ti.mtime = int(time.time())
-                ti.mode = 0o644
-                ti.uid = 1000
-                ti.gid = 1000
-                tar.addfile(ti, io.BytesIO(code_bytes))
-
-                # files/ directory and its contents
-                files_dir_info = tarfile.TarInfo(name="files")
-                files_dir_info.type = tarfile.DIRTYPE
-                files_dir_info.mode = 0o775
-                files_dir_info.mtime = int(time.time())
-                files_dir_info.uid = 1000
-                files_dir_info.gid = 1000
-                tar.addfile(files_dir_info)
-
-                if request.files:
-                    for filename, content_b64 in request.files.items():
-                        try:
-                            content = base64.b64decode(content_b64)
-                        except Exception:
-                            content = b""
-                        fi = tarfile.TarInfo(name=f"files/{filename}")
-                        fi.size = len(content)
-                        fi.mtime = int(time.time())
-                        fi.mode = 0o644
-                        fi.uid = 1000
-                        fi.gid = 1000
-                        tar.addfile(fi, io.BytesIO(content))
-
-                # output/ directory (empty)
-                output_dir_info = tarfile.TarInfo(name="output")
-                output_dir_info.type = tarfile.DIRTYPE
-                output_dir_info.mode = 0o777
-                output_dir_info.mtime = int(time.time())
-                output_dir_info.uid = 1000
-                output_dir_info.gid = 1000
-                tar.addfile(output_dir_info)
-
-                # Writable cache/config dirs to avoid writes to read-only rootfs
-                for dir_name in [
-                    ".cache",
-                    ".config",
-                    ".config/matplotlib",
-                    "__pycache__",
-                ]:
-                    d = tarfile.TarInfo(name=dir_name)
-                    d.type = tarfile.DIRTYPE
-                    d.mode = 0o777
-                    d.mtime = int(time.time())
-                    d.uid = 1000
-                    d.gid = 1000
-                    tar.addfile(d)
-
-            tar_stream.seek(0)
-
-            # Per-execution ephemeral volume workflow (authoritative path)
-            vol_name = f"exec-vol-{execution_id}"
-            volume = self.docker_client.volumes.create(name=vol_name)  # type: ignore
+            await asyncio.gather(*(run(i) for i in pending))
+        finally:
+            if not first_held:
+                # Cancelled before the first snippet got to use its reservation.
+                self._limiter.cancel(first)
+        return cast(List[ExecutionResponse], results)
+
+    async def _reserve_retrying(self, tenant: Optional[str]) -> Waiter:
+        """Reserve a slot, waiting out a full queue instead of failing."""
+        while True:
             try:
-                # Populate the volume using a short-lived helper container
-                helper = self.docker_client.containers.create(  # type: ignore
-                    self.config.docker_image,
-                    command="sleep infinity",
-                    name=f"exec-prep-{execution_id}",
-                    user="root",
-                    volumes={vol_name: {"bind": "/mnt", "mode": "rw"}},
-                    network_disabled=True,
-                    mem_limit="128m",
-                    nano_cpus=int(self.config.max_cpu * 1e8),
-                    read_only=False,
-                    tmpfs={"/tmp": "size=50M"},
-                    security_opt=["no-new-privileges"],
-                    cap_drop=["ALL"],
-                    pids_limit=30,
-                    auto_remove=False,
+                return self._limiter.reserve(tenant)
+            except ExecutorBusyError:
+                await asyncio.sleep(_BATCH_RETRY_INTERVAL)
+
+    def _batch_job(
+        self,
+        request: ExecutionRequest,
+        contents: Dict[str, bytes],
+        digests: Dict[str, str],
+    ) -> _ExecutionJob:
+        inputs = [
+            InputFile(
+                filename,
+                len(contents[content_b64]),
+                io.BytesIO(contents[content_b64]),
+                digest=digests.get(content_b64),
+            )
+            for filename, content_b64 in (request.files or {}).items()
+        ]
+        return _ExecutionJob(
+            execution_id=_new_execution_id(),
+            code=request.code,
+            inputs=inputs,
+            capture=OutputCapture(limit=self.config.max_output_bytes),
+            file_refs=request.file_refs or {},
+            tenant_id=request.tenant_id,
+        )
+
+    async def submit(self, request: ExecutionRequest) -> ExecutionStatus:
+        """
+        Start an execution in the background and return its status right away.
+
+        Admission is decided before returning, so a full queue is still
+        reported as ExecutorBusyError; the job then waits for a slot like any
+        other execution. Poll with get_job(), stop with cancel_job().
+
+        Raises:
+            ExecutorBusyError: all slots are busy and the wait queue is full
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        self.check_file_refs(request.file_refs)
+        job = _ExecutionJob(
+            execution_id=_new_execution_id(),
+            code=request.code,
+            inputs=decode_input_files(request.files),
+            capture=OutputCapture(limit=self.config.max_output_bytes),
+            file_refs=request.file_refs or {},
+            tenant_id=request.tenant_id,
+        )
+        waiter = self._limiter.reserve(job.tenant_id)
+        record = JobRecord(execution_id=job.execution_id, waiter=waiter)
+        self._jobs.add(record)
+        record.task = asyncio.create_task(self._run_job(record, job, waiter))
+        return record.snapshot()
+
+    async def get_job(self, execution_id: str, wait: float = 0) -> ExecutionStatus:
+        """
+        Status of a submitted execution; with `wait`, long-poll up to that many
+        seconds for it to finish.
+
+        Raises:
+            JobNotFoundError: unknown or expired execution id
+        """
+        record = self._jobs.get(execution_id)
+        if wait > 0 and not record.finished:
+            try:
+                await asyncio.wait_for(record.done.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        return record.snapshot()
+
+    def cancel_job(self, execution_id: str) -> ExecutionStatus:
+        """
+        Cancel a submitted execution: a queued one gives up its place, a
+        running one has its container killed, which frees the slot as soon as
+        the sandbox is cleaned up. Cancelling a finished job is a no-op.
+
+        Raises:
+            JobNotFoundError: unknown or expired execution id
+        """
+        record = self._jobs.get(execution_id)
+        if not record.finished:
+            record.status = "cancelled"
+            if record.waiter is not None and not record.waiter.done():
+                record.waiter.cancel()
+            self._cancelled.add(execution_id)
+            self._kill_running(execution_id)
+        return record.snapshot()
+
+    async def _run_job(
+        self, record: JobRecord, job: _ExecutionJob, waiter: Waiter
+    ) -> None:
+        try:
+            async with self._limiter.hold(waiter):
+                if record.status == "cancelled":
+                    record.finish("cancelled", None)
+                    return
+                record.status = "running"
+                record.started_at = time.time()
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self._io_threads, self._execute_blocking, job
                 )
+            record.finish(
+                "completed",
+                result.response.model_copy(
+                    update={"output_files": encode_output_files(result.artifacts)}
+                ),
+            )
+        except asyncio.CancelledError:
+            # The waiter was cancelled while queued.
+            record.finish("cancelled", None)
+        except Exception as e:
+            record.finish(
+                "completed",
+                ExecutionResponse(
+                    success=False,
+                    error=str(e),
+                    exit_code=-1,
+                    execution_id=job.execution_id,
+                ),
+            )
+        finally:
+            self._cancelled.discard(job.execution_id)
+
+    async def _submit(self, job: _ExecutionJob) -> ExecutionResult:
+        """Wait for a slot, then run the job on a docker I/O thread."""
+        return await self._run_in_slot(
+            self._execute_blocking, job, tenant=job.tenant_id
+        )
+
+    async def _run_in_slot(
+        self, func: Callable[..., T], *args: Any, tenant: Optional[str] = None
+    ) -> T:
+        async with self._limiter.slot(tenant):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._io_threads, func, *args)
+
+    def _session_manager(self) -> SessionManager:
+        if self._sessions is None:
+            raise SessionLimitError(0)
+        return self._sessions
+
+    async def create_session(self, request: SessionCreateRequest) -> SessionInfo:
+        """
+        Open a persistent interpreter session.
+
+        The session's sandbox is isolated and limited exactly like a one-shot
+        execution, but its interpreter stays alive between steps, so imports
+        and loaded data are paid for once. Input files are staged once here.
+
+        Raises:
+            ExecutorBusyError: all slots are busy and the wait queue is full
+            SessionLimitError: max_sessions sessions are already open
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        sessions = self._session_manager()
+        self.check_file_refs(request.file_refs)
+        session = await self._run_in_slot(
+            sessions.open,
+            lambda session_id: self._start_session_sandbox(session_id, request),
+        )
+        return session.info(sessions.idle_timeout)
+
+    def get_session(self, session_id: str) -> SessionInfo:
+        """
+        Raises:
+            SessionNotFoundError: the session does not exist or has expired
+        """
+        sessions = self._session_manager()
+        return sessions.get(session_id).info(sessions.idle_timeout)
+
+    async def execute_in_session(
+        self, session_id: str, request: SessionExecuteRequest
+    ) -> ExecutionResponse:
+        """
+        Run one step of code in a session's interpreter.
+
+        Steps of one session run one at a time, each under the same timeout
+        and output caps as /execute. A step that times out or kills the
+        interpreter closes the session.
+
+        Raises:
+            ExecutorBusyError: all slots are busy and the wait queue is full
+            SessionNotFoundError: the session does not exist or has expired
+        """
+        self._session_manager().get(session_id)
+        result = await self._run_in_slot(
+            self._session_step_blocking,
+            session_id,
+            _ExecutionJob(
+                execution_id=_new_execution_id(),
+                code=request.code,
+                inputs=decode_input_files(request.files),
+                capture=OutputCapture(limit=self.config.max_output_bytes),
+            ),
+        )
+        return result.response.model_copy(
+            update={"output_files": encode_output_files(result.artifacts)}
+        )
+
+    async def close_session(self, session_id: str) -> None:
+        """
+        Raises:
+            SessionNotFoundError: the session does not exist or has expired
+        """
+        sessions = self._session_manager()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._io_threads, sessions.close, session_id)
+
+    async def execute_stream(
+        self, request: ExecutionRequest
+    ) -> AsyncGenerator[ExecutionEvent, None]:
+        """
+        Execute Python code and yield its output while it runs.
+
+        Yields a "started" event once a slot is held, then "stdout"/"stderr"
+        events as the container writes, then one "result" event. Output is
+        forwarded, not kept, so the result's output/error are empty.
+
+        The output queue is bounded: a slow reader stalls the worker thread,
+        which stops draining the container instead of buffering the log here.
+        Closing the iterator early (client went away) kills the container.
+
+        Raises:
+            ExecutorBusyError: all slots are busy and the wait queue is full
+            UnknownFileReferenceError: a referenced hash is not cached
+        """
+        self.check_file_refs(request.file_refs)
+        waiter = self._limiter.reserve(request.tenant_id)
+        loop = asyncio.get_running_loop()
+        execution_id = _new_execution_id()
+        events: "asyncio.Queue[ExecutionEvent]" = asyncio.Queue(
+            maxsize=_STREAM_QUEUE_SIZE
+        )
+        abandoned = threading.Event()
+
+        def publish(event: ExecutionEvent) -> None:
+            put = asyncio.run_coroutine_threadsafe(events.put(event), loop)
+            while not abandoned.is_set():
                 try:
-                    helper.start()  # type: ignore
-                    helper.exec_run(["sh", "-lc", "mkdir -p /mnt/files /mnt/output && chown -R 1000:1000 /mnt"])  # type: ignore
-                    # Upload prepared tar into the volume root
-                    helper.put_archive(path="/mnt", data=tar_stream.getvalue())  # type: ignore
-                    helper.exec_run(["sh", "-lc", "chown -R 1000:1000 /mnt"])  # type: ignore
-                finally:
-                    try:
-                        helper.remove(force=True)  # type: ignore
-                    except Exception:
-                        pass
-
-                # Run sandbox container with the volume mounted at /execution
-                sandbox = self.docker_client.containers.create(  # type: ignore
-                    self.config.docker_image,
-                    command="python /execution/main.py",
-                    name=f"exec-{execution_id}",
-                    volumes={vol_name: {"bind": "/execution", "mode": "rw"}},
-                    working_dir="/",
-                    network_disabled=True,
-                    mem_limit=self.config.max_memory,
-                    nano_cpus=int(self.config.max_cpu * 1e9),
-                    read_only=True,
-                    tmpfs={"/tmp": "size=100M"},
-                    environment={
-                        "HOME": "/execution",
-                        "XDG_CACHE_HOME": "/execution/.cache",
-                        "XDG_CONFIG_HOME": "/execution/.config",
-                        "MPLCONFIGDIR": "/execution/.config/matplotlib",
-                        "PYTHONPYCACHEPREFIX": "/execution/__pycache__",
-                        "MPLBACKEND": "Agg",
-                    },
-                    security_opt=["no-new-privileges"],
-                    cap_drop=["ALL"],
-                    pids_limit=50,
-                    auto_remove=False,
+                    put.result(timeout=0.5)
+                    return
+                except concurrent.futures.TimeoutError:
+                    continue
+            put.cancel()
+
+        def run() -> None:
+            if abandoned.is_set():
+                return
+            publish(ExecutionEvent(type="started", execution_id=execution_id))
+            capture = OutputCapture(
+                limit=self.config.max_output_bytes,
+                on_output=lambda stream, text: publish(
+                    ExecutionEvent(type=stream, data=text)  # type: ignore[arg-type]
+                ),
+                keep=False,
+            )
+            result = self._execute_blocking(
+                _ExecutionJob(
+                    execution_id=execution_id,
+                    code=request.code,
+                    inputs=decode_input_files(request.files),
+                    capture=capture,
+                    file_refs=request.file_refs or {},
+                    tenant_id=request.tenant_id,
                 )
+            )
+            response = result.response.model_copy(
+                update={"output_files": encode_output_files(result.artifacts)}
+            )
+            publish(ExecutionEvent(type="result", result=response))
+
+        worker: "Optional[asyncio.Future[None]]" = None
+
+        async def run_in_slot() -> None:
+            nonlocal worker
+            async with self._limiter.hold(waiter):
+                worker = loop.run_in_executor(self._io_threads, run)
+                await worker
+
+        # The slot is held by this task rather than by the generator, so it
+        # is given back once the worker thread has cleaned up, whether the
+        # stream is read to the end, closed early or cancelled.
+        holder = asyncio.ensure_future(run_in_slot())
+        try:
+            while True:
+                event = await events.get()
+                yield event
+                if event.type == "result":
+                    break
+        finally:
+            abandoned.set()
+            if worker is not None:
+                self._kill_running(execution_id)
+            elif waiter is not None and not waiter.done():
+                # Still queued: give the place back rather than wait for it.
+                self._limiter.cancel(waiter)
+            await asyncio.wait({holder})
+
+    def _kill_running(self, execution_id: str) -> None:
+        container = self._running.get(execution_id)
+        if container is None:
+            return
+        try:
+            container.kill()  # type: ignore
+        except Exception:
+            pass
+
+    def _run_container(
+        self, container: Any, capture: OutputCapture
+    ) -> Tuple[int, bool]:
+        """Feed a started container's output to `capture` until it exits.
+
+        Output is read from a demultiplexed attach stream while the code runs.
+        The timeout is enforced by killing the container, which ends the
+        stream. Returns the exit code and whether the timeout was hit.
+        """
+        timed_out = threading.Event()
+
+        def on_timeout() -> None:
+            timed_out.set()
+            try:
+                container.kill()  # type: ignore
+            except Exception:
+                pass
+
+        timer = threading.Timer(self.config.execution_timeout, on_timeout)
+        timer.daemon = True
+        timer.start()
+        try:
+            output = container.attach(  # type: ignore
+                stdout=True, stderr=True, stream=True, logs=True, demux=True
+            )
+            for stdout_chunk, stderr_chunk in output:
+                if stdout_chunk:
+                    capture.feed("stdout", stdout_chunk)
+                if stderr_chunk:
+                    capture.feed("stderr", stderr_chunk)
+            capture.close()
+            result = container.wait(timeout=_WAIT_AFTER_EXIT_TIMEOUT)  # type: ignore
+        finally:
+            timer.cancel()
+        return int(result.get("StatusCode", 1)), timed_out.is_set()  # type: ignore
+
+    def _collect_output_files(
+        self, container: Any, all_outputs: bool = False
+    ) -> Tuple[Dict[str, bytes], List[str]]:
+        """Read the files in /execution/output, bounded by the size caps.
+
+        Only CSVs are collected unless `all_outputs` is set.
+
+        The archive is parsed as a stream, straight off the docker response,
+        so only kept file contents are held in memory. Files larger than
+        max_output_file_bytes are skipped by their header size without being
+        buffered. The first file that would push the kept total past
+        max_output_total_bytes is reported as omitted and reading stops there,
+        so any later files are neither read nor listed.
+        """
+        per_file_limit = self.config.max_output_file_bytes
+        remaining = self.config.max_output_total_bytes
+        output_files: Dict[str, bytes] = {}
+        omitted: List[str] = []
+
+        stream, _ = container.get_archive("/execution/output")  # type: ignore
+        reader = _ChunkReader(cast(Iterator[bytes], iter(stream)))
+        try:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    if not (all_outputs or member.name.endswith(".csv")):
+                        continue
+                    name = os.path.basename(member.name)
+                    if member.size > per_file_limit:
+                        omitted.append(name)
+                        continue
+                    if member.size > remaining:
+                        omitted.append(name)
+                        break
+                    f = tar.extractfile(member)
+                    if f is None:
+                        continue
+                    content = f.read()
+                    remaining -= len(content)
+                    output_files[name] = content
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return output_files, omitted
+
+    def _execute_blocking(self, job: _ExecutionJob) -> ExecutionResult:
+        """Run one execution end to end; blocks on docker-py throughout."""
+        if self._process is not None:
+            return self._execute_in_process(job, self._process)
+        timer = PhaseTimer(job.submitted_at)
+        execution_id = job.execution_id
+        capture = job.capture
+
+        cached: Dict[str, CachedFile] = {}
+        usage: Tuple[Optional[int], Optional[float]] = (None, None)
+        outcome = "error"
+        host = self._place(job.file_refs)
+
+        try:
+            inputs = job.inputs
+            if host.file_cache is not None:
+                with timer.phase("file_cache"):
+                    cached = self._cache_inputs(host, job.inputs, job.file_refs)
+                inputs = []
+            with timer.phase("build_tar"):
+                workspace_tar = self._build_workspace_tar(job.code, inputs, cached)
+
+            # A pooled sandbox already exists (its image was present when it was
+            # created), so only the on-demand path needs the image re-ensured.
+            placed_at = time.perf_counter()
+            sandbox = None
+            if host.pool is not None and not cached:
+                sandbox = host.pool.claim()
+            if sandbox is None:
+                # Re-ensure the image before it is needed: the tag may have been
+                # deleted since startup, and containers.create does not pull.
+                with timer.phase("image_check"), self._on_host(host):
+                    self._ensure_sandbox_image(host)
+                with timer.phase("create"), self._on_host(host):
+                    sandbox = self._create_sandbox(
+                        execution_id, cached.values(), host
+                    )
+            container = sandbox.container
+            self._running[execution_id] = container
+            try:
+                if execution_id in self._cancelled:
+                    raise RuntimeError("Execution cancelled")
+                with timer.phase("stage"), self._on_host(host):
+                    self._stage_workspace(sandbox, workspace_tar)
+                if not sandbox.started:
+                    with timer.phase("start"), self._on_host(host):
+                        container.start()  # type: ignore
+                self._hosts.record_success(host, time.perf_counter() - placed_at)
+                if execution_id in self._cancelled:
+                    # Cancelled between registration and start; kill() missed it.
+                    self._kill_running(execution_id)
+                sampler = (
+                    ContainerStatsSampler(container)
+                    if self.config.collect_resource_stats
+                    else None
+                )
+                if sampler is not None:
+                    sampler.start()
                 try:
-                    sandbox.start()  # type: ignore
-                    result = sandbox.wait(timeout=self.config.execution_timeout)  # type: ignore
-                    stdout_bytes: bytes = cast(bytes, sandbox.logs(stdout=True, stderr=False))  # type: ignore
-                    stderr_bytes: bytes = cast(bytes, sandbox.logs(stdout=False, stderr=True))  # type: ignore
-                    stdout: str = (stdout_bytes or b"").decode("utf-8")
-                    stderr: str = (stderr_bytes or b"").decode("utf-8")
-
-                    # Collect outputs from mounted volume
-                    output_files: dict[str, str] = {}
-                    try:
-                        stream, _ = sandbox.get_archive("/execution/output")  # type: ignore
-                        archive_bytes: bytes = b"".join(cast(Iterable[bytes], stream))
-                        with tarfile.open(
-                            fileobj=io.BytesIO(archive_bytes), mode="r:"
-                        ) as tar:
-                            for member in tar.getmembers():
-                                if member.isfile() and member.name.endswith(".csv"):
-                                    f = tar.extractfile(member)
-                                    if f is None:
-                                        continue
-                                    content = f.read()
-                                    output_files[os.path.basename(member.name)] = (
-                                        base64.b64encode(content).decode("utf-8")
-                                    )
-                    except Exception as e:
-                        print(f"Warning: Could not retrieve output files: {e}")
+                    with timer.phase("run"):
+                        exit_code, timed_out = self._run_container(container, capture)
+                finally:
+                    if sampler is not None:
+                        usage = sampler.stop()
+                stderr = capture.text("stderr")
+                if timed_out:
+                    exit_code = -1
+                    stderr += (
+                        f"\nExecution timed out after "
+                        f"{self.config.execution_timeout} seconds"
+                    )
 
-                    return ExecutionResponse(
-                        success=result.get("StatusCode", 1) == 0,  # type: ignore
-                        output=stdout,
+                artifacts: Dict[str, bytes] = {}
+                omitted_files: List[str] = []
+                try:
+                    with timer.phase("collect_outputs"):
+                        artifacts, omitted_files = self._collect_output_files(
+                            container, job.all_outputs
+                        )
+                except Exception as e:
+                    logger.warning(f"Could not retrieve output files: {e}")
+
+                outcome = (
+                    "timeout" if timed_out else "success" if exit_code == 0 else "error"
+                )
+                result = ExecutionResult(
+                    response=ExecutionResponse(
+                        success=exit_code == 0,
+                        output=capture.text("stdout"),
                         error=stderr,
-                        exit_code=result.get("StatusCode", 1),  # type: ignore
+                        exit_code=exit_code,
                         execution_id=execution_id,
-                        output_files=output_files if output_files else None,
+                        output_truncated=capture.truncated("stdout"),
+                        error_truncated=capture.truncated("stderr"),
+                        omitted_output_files=omitted_files or None,
+                        file_hashes=(
+                            {name: entry.digest for name, entry in cached.items()}
+                            if cached
+                            else None
+                        ),
+                    ),
+                    artifacts=artifacts,
+                )
+            finally:
+                workspace_tar.close()
+                self._running.pop(execution_id, None)
+                with timer.phase("cleanup"):
+                    self._destroy_sandbox(sandbox)
+                logger.info(
+                    f"Execution {execution_id} phases "
+                    f"(staging={self.config.staging_mode}): {timer.summary()}"
+                )
+
+        except Exception as e:
+            result = ExecutionResult(
+                response=ExecutionResponse(
+                    success=False,
+                    output="",
+                    error=str(e),
+                    exit_code=-1,
+                    execution_id=execution_id,
+                    output_files=None,
+                )
+            )
+        finally:
+            # Unpinned only once the sandbox that mounted them is gone.
+            if cached and host.file_cache is not None:
+                host.file_cache.release(e.digest for e in cached.values())
+            self._hosts.release(host)
+
+        result.response.metrics = timer.metrics(*usage)
+        metrics.observe(result.response.metrics, outcome)
+        return result
+
+    def _execute_in_process(
+        self, job: _ExecutionJob, sandbox: ProcessSandbox
+    ) -> ExecutionResult:
+        """Run one execution in a process sandbox; blocks until it is done.
+
+        Same phases and result as the Docker path, minus image check and
+        container create: the workspace is written straight to a tmpfs.
+        """
+        timer = PhaseTimer(job.submitted_at)
+        execution_id = job.execution_id
+        capture = job.capture
+        usage: Tuple[Optional[int], Optional[float]] = (None, None)
+        outcome = "error"
+
+        try:
+            with sandbox.workspace(execution_id) as workspace:
+                with timer.phase("stage"):
+                    workspace.stage(
+                        job.code, ((f.name, f.fileobj) for f in job.inputs)
                     )
+                if execution_id in self._cancelled:
+                    raise RuntimeError("Execution cancelled")
+                with timer.phase("start"):
+                    process = workspace.start()
+                self._running[execution_id] = process
+                try:
+                    if execution_id in self._cancelled:
+                        self._kill_running(execution_id)
+                    with timer.phase("run"):
+                        exit_code, timed_out, usage = workspace.run(process, capture)
                 finally:
-                    try:
-                        sandbox.remove(force=True)  # type: ignore
-                    except Exception:
-                        pass
-            finally:
+                    self._running.pop(execution_id, None)
+                stderr = capture.text("stderr")
+                if timed_out:
+                    exit_code = -1
+                    stderr += (
+                        f"\nExecution timed out after "
+                        f"{self.config.execution_timeout} seconds"
+                    )
+                with timer.phase("collect_outputs"):
+                    artifacts, omitted_files = workspace.collect_outputs(
+                        job.all_outputs,
+                        self.config.max_output_file_bytes,
+                        self.config.max_output_total_bytes,
+                    )
+                if timed_out:
+                    outcome = "timeout"
+                else:
+                    outcome = "success" if exit_code == 0 else "error"
+                result = ExecutionResult(
+                    response=ExecutionResponse(
+                        success=exit_code == 0,
+                        output=capture.text("stdout"),
+                        error=stderr,
+                        exit_code=exit_code,
+                        execution_id=execution_id,
+                        output_truncated=capture.truncated("stdout"),
+                        error_truncated=capture.truncated("stderr"),
+                        omitted_output_files=omitted_files or None,
+                    ),
+                    artifacts=artifacts,
+                )
+            logger.info(
+                f"Execution {execution_id} phases (process): {timer.summary()}"
+            )
+        except Exception as e:
+            result = ExecutionResult(
+                response=ExecutionResponse(
+                    success=False,
+                    output="",
+                    error=str(e),
+                    exit_code=-1,
+                    execution_id=execution_id,
+                    output_files=None,
+                )
+            )
+
+        result.response.metrics = timer.metrics(*usage)
+        metrics.observe(result.response.metrics, outcome)
+        return result
+
+    def _start_session_sandbox(
+        self, session_id: str, request: SessionCreateRequest
+    ) -> Sandbox:
+        """Stage the session driver and input files, then start the interpreter."""
+        # A session counts against its host's load until it is closed.
+        host = self._place(request.file_refs)
+        inputs: Iterable[InputFile] = decode_input_files(request.files)
+        cached: Dict[str, CachedFile] = {}
+        try:
+            if host.file_cache is not None:
+                cached = self._cache_inputs(host, inputs, request.file_refs or {})
+                inputs = []
+            elif request.file_refs:
+                raise UnknownFileReferenceError(list(request.file_refs.values()))
+            workspace_tar = self._build_workspace_tar(
+                self._session_driver, inputs, cached
+            )
+            sandbox = None
+            # The driver is staged as main.py, so a pooled sandbox runs it as is.
+            if host.pool is not None and not cached:
+                sandbox = host.pool.claim()
+            with self._on_host(host):
+                if sandbox is None:
+                    self._ensure_sandbox_image(host)
+                    sandbox = self._create_sandbox(session_id, cached.values(), host)
                 try:
-                    volume.remove(force=True)  # type: ignore
+                    self._stage_workspace(sandbox, workspace_tar)
+                    if not sandbox.started:
+                        sandbox.container.start()  # type: ignore
                 except Exception:
-                    pass
+                    self._destroy_sandbox(sandbox)
+                    raise
+                finally:
+                    workspace_tar.close()
+        except Exception:
+            if host.file_cache is not None:
+                host.file_cache.release(e.digest for e in cached.values())
+            self._hosts.release(host)
+            raise
+        if cached:
+            self._session_pins[sandbox.sandbox_id] = [
+                e.digest for e in cached.values()
+            ]
+        logger.info(f"Session {session_id} started in sandbox {sandbox.sandbox_id}")
+        return sandbox
 
-        except Exception as e:
-            return ExecutionResponse(
-                success=False,
-                output="",
-                error=str(e),
-                exit_code=-1,
-                execution_id=execution_id,
-                output_files=None,
-            )
+    def _destroy_session_sandbox(self, sandbox: Sandbox) -> None:
+        self._destroy_sandbox(sandbox)
+        host: DockerHost = sandbox.host
+        pins = self._session_pins.pop(sandbox.sandbox_id, None)
+        if pins and host.file_cache is not None:
+            host.file_cache.release(pins)
+        self._hosts.release(host)
+
+    def _session_step_blocking(
+        self, session_id: str, job: _ExecutionJob
+    ) -> ExecutionResult:
+        """Run one step in a session's interpreter; blocks on docker-py."""
+        assert self._sessions is not None
+        timer = PhaseTimer(job.submitted_at)
+        capture = job.capture
+        with self._sessions.use(session_id) as session:
+            container = session.sandbox.container
+            step_name = f".steps/{session.steps}.py"
+            try:
+                with timer.phase("stage"):
+                    step_tar = self._build_step_tar(step_name, job.code, job.inputs)
+                    try:
+                        container.put_archive(  # type: ignore
+                            path="/execution", data=step_tar
+                        )
+                    finally:
+                        step_tar.close()
+                with timer.phase("run"):
+                    exit_code, timed_out = self._exec_step(
+                        session.sandbox, f"/execution/{step_name}", capture
+                    )
+                stderr = capture.text("stderr")
+
+                artifacts: Dict[str, bytes] = {}
+                omitted_files: List[str] = []
+                if timed_out:
+                    exit_code = -1
+                    stderr += (
+                        f"\nExecution timed out after "
+                        f"{self.config.execution_timeout} seconds; "
+                        f"the session was closed"
+                    )
+                    self._close_dead_session(session_id)
+                elif exit_code != 0 and not self._is_running(container):
+                    stderr += "\nThe session interpreter exited; the session was closed"
+                    self._close_dead_session(session_id)
+                else:
+                    try:
+                        with timer.phase("collect_outputs"):
+                            artifacts, omitted_files = self._collect_output_files(
+                                container
+                            )
+                    except Exception as e:
+                        logger.warning(f"Could not retrieve output files: {e}")
+
+                response = ExecutionResponse(
+                    success=exit_code == 0,
+                    output=capture.text("stdout"),
+                    error=stderr,
+                    exit_code=exit_code,
+                    execution_id=job.execution_id,
+                    output_truncated=capture.truncated("stdout"),
+                    error_truncated=capture.truncated("stderr"),
+                    omitted_output_files=omitted_files or None,
+                    # Resource usage is not per step: the container is shared.
+                    metrics=timer.metrics(),
+                )
+                outcome = (
+                    "timeout" if timed_out else "success" if exit_code == 0 else "error"
+                )
+                metrics.observe(response.metrics, outcome)  # type: ignore[arg-type]
+                return ExecutionResult(response=response, artifacts=artifacts)
+            except Exception as e:
+                # The sandbox is unusable (e.g. removed or stopped externally).
+                self._close_dead_session(session_id)
+                response = ExecutionResponse(
+                    success=False,
+                    output="",
+                    error=str(e),
+                    exit_code=-1,
+                    execution_id=job.execution_id,
+                    metrics=timer.metrics(),
+                )
+                metrics.observe(response.metrics, "error")  # type: ignore[arg-type]
+                return ExecutionResult(response=response)
+            finally:
+                logger.info(
+                    f"Session {session_id} step {session.steps} phases: "
+                    f"{timer.summary()}"
+                )
+
+    def _close_dead_session(self, session_id: str) -> None:
+        assert self._sessions is not None
+        try:
+            self._sessions.close(session_id)
+        except SessionNotFoundError:
+            pass
+
+    def _is_running(self, container: Any) -> bool:
+        try:
+            container.reload()  # type: ignore
+            return container.status == "running"  # type: ignore
+        except Exception:
+            return False
+
+    def _exec_step(
+        self, sandbox: Sandbox, step_path: str, capture: OutputCapture
+    ) -> Tuple[int, bool]:
+        """Run a staged step through the driver client via docker exec.
+
+        Same contract as _run_container; the timeout kills the whole sandbox,
+        since a step stuck in native code cannot be interrupted reliably.
+        """
+        container = sandbox.container
+        api = sandbox.host.client.api
+        exec_id = api.exec_create(  # type: ignore
+            container.id, ["python", "/execution/main.py", "run", step_path]
+        )["Id"]
+        timed_out = threading.Event()
+
+        def on_timeout() -> None:
+            timed_out.set()
+            try:
+                container.kill()  # type: ignore
+            except Exception:
+                pass
+
+        timer = threading.Timer(self.config.execution_timeout, on_timeout)
+        timer.daemon = True
+        timer.start()
+        try:
+            output = api.exec_start(exec_id, stream=True, demux=True)  # type: ignore
+            for stdout_chunk, stderr_chunk in output:
+                if stdout_chunk:
+                    capture.feed("stdout", stdout_chunk)
+                if stderr_chunk:
+                    capture.feed("stderr", stderr_chunk)
+            capture.close()
+        finally:
+            timer.cancel()
+        exit_code = api.exec_inspect(exec_id).get("ExitCode")  # type: ignore
+        return (exit_code if exit_code is not None else -1), timed_out.is_set()
+
+    def _build_step_tar(
+        self, step_name: str, code: str, inputs: Iterable[InputFile]
+    ) -> BinaryIO:
+        """Tar of one session step (its code and new input files) for /execution.
+
+        Copied into the running sandbox; like the workspace tar it goes to the
+        volume, since the rootfs is read-only.
+        """
+        tar_stream = cast(
+            BinaryIO, tempfile.SpooledTemporaryFile(max_size=_TAR_SPOOL_BYTES)
+        )
+        now = int(time.time())
+
+        def owned(info: tarfile.TarInfo, mode: int) -> tarfile.TarInfo:
+            info.mode = mode
+            info.mtime = now
+            info.uid = 1000
+            info.gid = 1000
+            return info
+
+        with tarfile.open(fileobj=tar_stream, mode="w") as tar:
+            steps_dir = owned(tarfile.TarInfo(name=".steps"), 0o755)
+            steps_dir.type = tarfile.DIRTYPE
+            tar.addfile(steps_dir)
+
+            code_bytes = code.encode("utf-8")
+            ti = owned(tarfile.TarInfo(name=step_name), 0o644)
+            ti.size = len(code_bytes)
+            tar.addfile(ti, io.BytesIO(code_bytes))
+
+            for input_file in inputs:
+                fi = owned(
+                    tarfile.TarInfo(name=f"files/{input_file.name}"), 0o644
+                )
+                fi.size = input_file.size
+                tar.addfile(fi, input_file.fileobj)
+        tar_stream.seek(0)
+        return tar_stream
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view over an iterator of byte chunks (a docker stream)."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def _new_execution_id() -> str:
+    return str(uuid.uuid4())[:8]
 
 
 async def main():
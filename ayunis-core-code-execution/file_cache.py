@@ -0,0 +1,249 @@
+"""Content-addressed cache of input files in read-only Docker volumes."""
+
+import hashlib
+import logging
+import tarfile
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from models import FileCacheStats
+
+logger = logging.getLogger(__name__)
+
+# Labels that identify cache volumes, so the index survives a service restart.
+DIGEST_LABEL = "ayunis.cas.sha256"
+SIZE_LABEL = "ayunis.cas.size"
+
+# Where a cached file's volume is mounted inside a sandbox, and the name of the
+# single file it holds; files/<name> is a symlink to it.
+MOUNT_ROOT = "/cas"
+DATA_NAME = "data"
+
+_HASH_CHUNK = 1024 * 1024
+_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+class UnknownFileReferenceError(Exception):
+    """A request referenced file hashes that are not (or no longer) cached."""
+
+    def __init__(self, digests: List[str]):
+        super().__init__(
+            "Unknown file reference(s), upload the file content again: "
+            + ", ".join(digests)
+        )
+        self.digests = digests
+
+
+@dataclass
+class CachedFile:
+    digest: str
+    size: int
+    volume_name: str
+
+    @property
+    def mount_path(self) -> str:
+        return f"{MOUNT_ROOT}/{self.digest}"
+
+    @property
+    def data_path(self) -> str:
+        return f"{self.mount_path}/{DATA_NAME}"
+
+
+def file_digest(fileobj: IO[bytes]) -> Tuple[str, int]:
+    """SHA-256 and size of a file object, read in chunks; rewinds it after."""
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = fileobj.read(_HASH_CHUNK)
+        if not chunk:
+            break
+        sha.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return sha.hexdigest(), size
+
+
+class InputFileCache:
+    """Keeps uploaded input files in one read-only volume per SHA-256.
+
+    A cached file is mounted read-only only into the sandboxes of executions
+    that use it, never into a shared location, so one caller cannot list or
+    read another caller's files. Entries in use are pinned; eviction removes
+    the least recently used unpinned volumes once the entry count or total
+    size exceeds its bound.
+    """
+
+    def __init__(
+        self,
+        docker_client: Any,
+        image: str,
+        max_bytes: int,
+        max_entries: int,
+        writer_labels: Optional[Callable[[], Dict[str, str]]] = None,
+    ):
+        self._client = docker_client
+        # Labels for the short-lived writer containers, so they are reaped
+        # if the service dies mid-write.
+        self._writer_labels = writer_labels
+        self._image = image
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._storing: Dict[str, threading.Event] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def load(self) -> None:
+        """Rebuild the index from cache volumes left by a previous run."""
+        volumes = self._client.volumes.list(filters={"label": DIGEST_LABEL})
+        with self._lock:
+            for volume in volumes:
+                labels = volume.attrs.get("Labels") or {}
+                digest = labels.get(DIGEST_LABEL)
+                if not digest or digest in self._entries:
+                    continue
+                size = int(labels.get(SIZE_LABEL, "0"))
+                self._entries[digest] = CachedFile(digest, size, volume.name)
+                self._bytes += size
+        logger.info(f"Input file cache loaded {len(self._entries)} entries")
+        self._evict()
+
+    def missing(self, digests: Iterable[str]) -> List[str]:
+        """The subset of `digests` that is not cached."""
+        with self._lock:
+            return [d for d in digests if d not in self._entries]
+
+    def acquire(self, digest: str) -> Optional[CachedFile]:
+        """Look up and pin a cached file; release() it once no longer mounted."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(digest)
+            self._pins[digest] = self._pins.get(digest, 0) + 1
+            return entry
+
+    def put(self, digest: str, size: int, fileobj: IO[bytes]) -> CachedFile:
+        """Store a file (single-flight per digest) and return it pinned."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(digest)
+                if entry is not None:
+                    self._entries.move_to_end(digest)
+                    self._pins[digest] = self._pins.get(digest, 0) + 1
+                    return entry
+                pending = self._storing.get(digest)
+                if pending is None:
+                    pending = self._storing[digest] = threading.Event()
+                    break
+            # Someone else is writing the same content; wait and re-check.
+            pending.wait(timeout=60)
+
+        try:
+            entry = self._write_volume(digest, size, fileobj)
+            with self._lock:
+                self._entries[digest] = entry
+                self._bytes += size
+                self._pins[digest] = self._pins.get(digest, 0) + 1
+        finally:
+            with self._lock:
+                self._storing.pop(digest).set()
+        self._evict()
+        return entry
+
+    def release(self, digests: Iterable[str]) -> None:
+        with self._lock:
+            for digest in digests:
+                count = self._pins.get(digest, 0) - 1
+                if count > 0:
+                    self._pins[digest] = count
+                else:
+                    self._pins.pop(digest, None)
+        self._evict()
+
+    def stats(self) -> FileCacheStats:
+        with self._lock:
+            return FileCacheStats(
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+            )
+
+    def _write_volume(self, digest: str, size: int, fileobj: IO[bytes]) -> CachedFile:
+        volume_name = f"exec-cas-{digest}"
+        volume = self._client.volumes.create(
+            name=volume_name,
+            labels={DIGEST_LABEL: digest, SIZE_LABEL: str(size)},
+        )
+        try:
+            # Written through a created, never-started container: docker
+            # extracts into the volume mount without running anything.
+            writer = self._client.containers.create(
+                self._image,
+                command="true",
+                name=f"exec-cas-write-{digest[:12]}-{int(time.time() * 1000)}",
+                volumes={volume_name: {"bind": MOUNT_ROOT, "mode": "rw"}},
+                network_disabled=True,
+                labels=self._writer_labels() if self._writer_labels else None,
+            )
+            try:
+                with tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES) as data:
+                    with tarfile.open(fileobj=data, mode="w") as tar:
+                        info = tarfile.TarInfo(name=DATA_NAME)
+                        info.size = size
+                        info.mode = 0o444
+                        info.mtime = int(time.time())
+                        info.uid = 1000
+                        info.gid = 1000
+                        tar.addfile(info, fileobj)
+                    data.seek(0)
+                    writer.put_archive(path=MOUNT_ROOT, data=data)
+            finally:
+                try:
+                    writer.remove(force=True)
+                except Exception as e:
+                    logger.warning(f"Could not remove cache writer container: {e}")
+        except Exception:
+            try:
+                volume.remove(force=True)
+            except Exception:
+                pass
+            raise
+        return CachedFile(digest=digest, size=size, volume_name=volume_name)
+
+    def _evict(self) -> None:
+        victims: List[CachedFile] = []
+        with self._lock:
+            candidates = [d for d in self._entries if d not in self._pins]
+            for digest in candidates:
+                if (
+                    self._bytes <= self.max_bytes
+                    and len(self._entries) <= self.max_entries
+                ):
+                    break
+                entry = self._entries.pop(digest)
+                self._bytes -= entry.size
+                self._evictions += 1
+                victims.append(entry)
+        for entry in victims:
+            try:
+                self._client.volumes.get(entry.volume_name).remove(force=True)
+            except Exception as e:
+                logger.warning(
+                    f"Could not remove cache volume {entry.volume_name}: {e}"
+                )
@@ -0,0 +1,150 @@
+"""Docker daemons sandboxes can run on, and picking one per execution."""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+from file_cache import InputFileCache
+from images import SandboxImageManager
+from models import HostStats
+from pool import SandboxPool
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in a host's latency average.
+_LATENCY_EWMA_ALPHA = 0.2
+
+# Latency assumed for a host without samples yet, and the floor, so a host
+# that happens to be fast never absorbs every execution regardless of load.
+_MIN_LATENCY = 0.05
+
+
+@dataclass
+class DockerHost:
+    """One Docker daemon, with the state that only exists on that daemon.
+
+    Images, cached input file volumes and pooled sandboxes are local to a
+    daemon, so each host has its own image manager, file cache and pool.
+    The load and health fields are guarded by the HostScheduler's lock.
+    """
+
+    name: str
+    client: Any
+    images: SandboxImageManager
+    file_cache: Optional[InputFileCache] = None
+    pool: Optional[SandboxPool] = None
+    # Executions placed on this host and not finished yet.
+    running: int = 0
+    # Average seconds from creating a sandbox to the container running.
+    latency: float = 0.0
+    consecutive_failures: int = 0
+    # time.monotonic() until which the host is out of rotation.
+    down_until: float = 0.0
+
+    def load(self) -> float:
+        """Expected wait behind this host's work: a lower value is preferred."""
+        return (self.running + 1) * max(self.latency, _MIN_LATENCY)
+
+
+class HostScheduler:
+    """Places each execution on the least-loaded available Docker host.
+
+    Load is the number of executions in flight on a host, weighted by how
+    long that daemon recently took to get a sandbox running. After
+    `failure_threshold` consecutive infrastructure failures a host is taken
+    out of rotation for `cooldown` seconds; the next execution placed on it
+    afterwards is a probe, and one more failure takes it out again.
+    """
+
+    def __init__(
+        self, hosts: List[DockerHost], failure_threshold: int, cooldown: float
+    ):
+        if not hosts:
+            raise ValueError("At least one Docker host is required")
+        self.hosts = hosts
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self) -> DockerHost:
+        return self.hosts[0]
+
+    def acquire(
+        self, eligible: Optional[Callable[[DockerHost], bool]] = None
+    ) -> DockerHost:
+        """Pick a host and count the execution against it until release().
+
+        Only hosts passing `eligible` are considered (e.g. those holding an
+        execution's cached input files), unless none does.
+        """
+        with self._lock:
+            candidates = [h for h in self.hosts if eligible is None or eligible(h)]
+            candidates = candidates or self.hosts
+            now = time.monotonic()
+            available = [h for h in candidates if h.down_until <= now]
+            if available:
+                host = min(available, key=DockerHost.load)
+            else:
+                # Everything eligible is out of rotation: probe the host that
+                # is due back first rather than failing outright.
+                host = min(candidates, key=lambda h: h.down_until)
+            host.running += 1
+            return host
+
+    def release(self, host: DockerHost) -> None:
+        with self._lock:
+            host.running -= 1
+
+    def record_success(self, host: DockerHost, latency: float) -> None:
+        with self._lock:
+            host.consecutive_failures = 0
+            host.down_until = 0.0
+            if host.latency == 0.0:
+                host.latency = latency
+            else:
+                host.latency += _LATENCY_EWMA_ALPHA * (latency - host.latency)
+
+    def record_failure(self, host: DockerHost) -> None:
+        with self._lock:
+            host.consecutive_failures += 1
+            if host.consecutive_failures < self.failure_threshold:
+                return
+        self.take_out(host)
+
+    def take_out(self, host: DockerHost) -> None:
+        """Take a host out of rotation for the cooldown period."""
+        with self._lock:
+            host.consecutive_failures = max(
+                host.consecutive_failures, self.failure_threshold
+            )
+            host.down_until = time.monotonic() + self.cooldown
+            failures = host.consecutive_failures
+        logger.warning(
+            f"Docker host {host.name} out of rotation for {self.cooldown:g}s "
+            f"after {failures} consecutive failures"
+        )
+
+    def stats(self) -> List[HostStats]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                HostStats(
+                    name=host.name,
+                    available=host.down_until <= now,
+                    running=host.running,
+                    latency_ms=round(host.latency * 1000, 3),
+                    consecutive_failures=host.consecutive_failures,
+                    pool=host.pool.stats() if host.pool else None,
+                    file_cache=host.file_cache.stats() if host.file_cache else None,
+                )
+                for host in self.hosts
+            ]
+
+    def close(self) -> None:
+        for host in self.hosts:
+            host.images.close()
+            if host.pool is not None:
+                host.pool.close()
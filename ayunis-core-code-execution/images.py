@@ -0,0 +1,163 @@
+"""Availability of the sandbox image, cached from the Docker events stream."""
+
+import logging
+import threading
+from typing import Any, Optional
+
+import docker
+
+logger = logging.getLogger(__name__)
+
+# Backoff bounds (seconds) for reconnecting to the events stream.
+_WATCH_BACKOFF_MIN = 1.0
+_WATCH_BACKOFF_MAX = 30.0
+
+
+class _Flight:
+    """One in-progress lookup/pull that concurrent callers wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class SandboxImageManager:
+    """Knows whether the sandbox image is present without asking per request.
+
+    Presence is cached in memory and trusted only while a watcher on the
+    Docker events stream is connected: an image delete or untag event drops
+    the cache, so the next execution looks the image up (and pulls it) again.
+    While the stream is down every ensure() does the lookup, as before.
+    Concurrent ensure() calls share one lookup and at most one pull.
+
+    The events stream is a hint, not the only safety net: the tag can vanish
+    between an event and a create, so callers also invalidate() and retry
+    when containers.create reports ImageNotFound.
+    """
+
+    def __init__(self, docker_client: Any, image: str):
+        self._client = docker_client
+        self.image = image
+        self._lock = threading.Lock()
+        self._present = False
+        self._watching = False
+        # Content id (sha256:...) of the image behind the tag at the last
+        # lookup; None until then or if the daemon did not report one.
+        self.image_id: Optional[str] = None
+        # Bumped by every invalidation, so a lookup that raced with an event
+        # does not mark the image present afterwards.
+        self._generation = 0
+        self._flight: Optional[_Flight] = None
+        self._closed = threading.Event()
+        self._stream: Any = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start watching image events in the background."""
+        self._thread = threading.Thread(
+            target=self._watch_loop, name="image-events", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def invalidate(self) -> None:
+        """Forget that the image is present (e.g. create hit ImageNotFound)."""
+        with self._lock:
+            self._present = False
+            self._generation += 1
+
+    def ensure(self) -> None:
+        """Ensure the image exists locally, pulling it if missing.
+
+        Raises:
+            RuntimeError: the image is missing and could not be pulled
+        """
+        with self._lock:
+            if self._present and self._watching:
+                return
+            flight = self._flight
+            leader = flight is None
+            if flight is None:
+                flight = self._flight = _Flight()
+            generation = self._generation
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return
+
+        try:
+            self._lookup_or_pull()
+            with self._lock:
+                if self._generation == generation:
+                    self._present = True
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def _lookup_or_pull(self) -> None:
+        image = self.image
+        try:
+            self._record_id(self._client.images.get(image))
+            return
+        except docker.errors.ImageNotFound:
+            print(f"Sandbox image {image} not found locally, pulling...")
+
+        try:
+            self._record_id(self._client.images.pull(image))
+            print(f"Pulled sandbox image: {image}")
+        except Exception as e:
+            raise RuntimeError(
+                f"Sandbox image '{image}' is not available locally and could "
+                f"not be pulled: {e}. "
+                f"Dev: run ./dev up (builds it) or `docker build -t "
+                f"python-sandbox:latest ayunis-core-code-execution/sandbox`. "
+                f"Prod: point DOCKER_IMAGE at a published GHCR sandbox tag."
+            ) from e
+
+    def _record_id(self, image: Any) -> None:
+        image_id = getattr(image, "id", None)
+        self.image_id = image_id if isinstance(image_id, str) else None
+
+    def _watch_loop(self) -> None:
+        backoff = _WATCH_BACKOFF_MIN
+        while not self._closed.is_set():
+            try:
+                self._stream = self._client.events(
+                    decode=True,
+                    filters={"type": ["image"], "event": ["delete", "untag"]},
+                )
+                with self._lock:
+                    # Events before this point were missed: re-check once.
+                    self._watching = True
+                    self._present = False
+                    self._generation += 1
+                backoff = _WATCH_BACKOFF_MIN
+                for event in self._stream:
+                    logger.info(
+                        f"Image {event.get('Action')} event, re-checking "
+                        f"{self.image} on next use"
+                    )
+                    self.invalidate()
+            except Exception as e:
+                if not self._closed.is_set():
+                    logger.warning(f"Docker image events stream failed: {e}")
+            finally:
+                with self._lock:
+                    self._watching = False
+                self._stream = None
+            self._closed.wait(backoff)
+            backoff = min(backoff * 2, _WATCH_BACKOFF_MAX)
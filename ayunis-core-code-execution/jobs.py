@@ -0,0 +1,95 @@
+"""Bookkeeping for executions submitted through the asynchronous job API."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from models import ExecutionResponse, ExecutionStatus
+from scheduling import Waiter
+
+# Finished jobs kept at most, oldest dropped first, on top of the retention time.
+_MAX_FINISHED_JOBS = 1000
+
+
+class JobNotFoundError(Exception):
+    """The execution id is unknown, or its result has expired."""
+
+    def __init__(self, execution_id: str):
+        super().__init__(f"Execution {execution_id} not found")
+        self.execution_id = execution_id
+
+
+@dataclass
+class JobRecord:
+    """State of one submitted execution; lives on the event loop."""
+
+    execution_id: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[ExecutionResponse] = None
+    # Place in the limiter's queue (None if a slot was free), so a queued job
+    # can be cancelled before its task ever runs.
+    waiter: Waiter = None
+    task: "Optional[asyncio.Task[None]]" = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    def finish(self, status: str, result: Optional[ExecutionResponse]) -> None:
+        # A cancellation decided earlier wins over the killed run's outcome.
+        if self.status != "cancelled":
+            self.status = status
+        self.result = result
+        self.finished_at = time.time()
+        self.done.set()
+
+    def snapshot(self) -> ExecutionStatus:
+        return ExecutionStatus(
+            execution_id=self.execution_id,
+            status=self.status,  # type: ignore[arg-type]
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            result=self.result,
+        )
+
+
+class JobStore:
+    """Submitted executions by id; finished ones expire after `retention`."""
+
+    def __init__(self, retention: float):
+        self.retention = retention
+        self._jobs: "OrderedDict[str, JobRecord]" = OrderedDict()
+
+    def add(self, record: JobRecord) -> None:
+        self._prune()
+        self._jobs[record.execution_id] = record
+
+    def remove(self, execution_id: str) -> None:
+        self._jobs.pop(execution_id, None)
+
+    def get(self, execution_id: str) -> JobRecord:
+        """
+        Raises:
+            JobNotFoundError: unknown or expired execution id
+        """
+        self._prune()
+        record = self._jobs.get(execution_id)
+        if record is None:
+            raise JobNotFoundError(execution_id)
+        return record
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        finished = [r for r in self._jobs.values() if r.finished_at is not None]
+        excess = len(finished) - _MAX_FINISHED_JOBS
+        for record in finished:
+            if excess > 0 or record.finished_at < cutoff:  # type: ignore[operator]
+                del self._jobs[record.execution_id]
+                excess -= 1
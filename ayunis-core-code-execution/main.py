@@ -3,7 +3,9 @@
 import asyncio
 import logging
 import os
+import socket
 import sys
+from typing import Dict
 
 from executor import PythonExecutor
 from server import ExecutorAPI
@@ -18,13 +20,80 @@ def setup_logging() -> None:
     )
 
 
+def parse_tenant_weights(value: str) -> Dict[str, float]:
+    """Parse TENANT_WEIGHTS, e.g. "acme=2,globex=0.5"."""
+    weights: Dict[str, float] = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        tenant, weight = item.split('=', 1)
+        weights[tenant.strip()] = float(weight)
+    return weights
+
+
 def create_executor_config() -> ExecutorConfig:
     """Create executor configuration from environment variables."""
     return ExecutorConfig(
         execution_timeout=int(os.getenv('EXECUTION_TIMEOUT', '30')),
         max_memory=os.getenv('MAX_MEMORY', '512m'),
         max_cpu=float(os.getenv('MAX_CPU', '1.0')),
-        docker_image=os.getenv('DOCKER_IMAGE', 'python-sandbox:latest')
+        docker_image=os.getenv('DOCKER_IMAGE', 'python-sandbox:latest'),
+        staging_mode=os.getenv('STAGING_MODE', 'direct'),  # type: ignore[arg-type]
+        sandbox_runtime=os.getenv('SANDBOX_RUNTIME', 'exec'),  # type: ignore[arg-type]
+        sandbox_backend=os.getenv(  # type: ignore[arg-type]
+            'SANDBOX_BACKEND', 'docker'
+        ),
+        process_python=os.getenv('PROCESS_PYTHON', 'python3'),
+        process_workdir=os.getenv('PROCESS_WORKDIR', '/dev/shm'),
+        process_binds=[
+            path.strip()
+            for path in os.getenv('PROCESS_BINDS', '').split(',')
+            if path.strip()
+        ],
+        process_cgroup=os.getenv('PROCESS_CGROUP') or None,
+        collect_resource_stats=(
+            os.getenv('COLLECT_RESOURCE_STATS', 'true').lower() != 'false'
+        ),
+        max_output_bytes=int(os.getenv('MAX_OUTPUT_BYTES', str(1024 * 1024))),
+        max_output_file_bytes=int(
+            os.getenv('MAX_OUTPUT_FILE_BYTES', str(10 * 1024 * 1024))
+        ),
+        max_output_total_bytes=int(
+            os.getenv('MAX_OUTPUT_TOTAL_BYTES', str(25 * 1024 * 1024))
+        ),
+        file_cache_max_bytes=int(os.getenv('FILE_CACHE_MAX_BYTES', '0')),
+        file_cache_max_entries=int(os.getenv('FILE_CACHE_MAX_ENTRIES', '256')),
+        result_cache_max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', '0')),
+        result_cache_max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1024')),
+        result_cache_ttl=int(os.getenv('RESULT_CACHE_TTL', '3600')),
+        instance_id=os.getenv('INSTANCE_ID') or socket.gethostname(),
+        reaper_interval=int(os.getenv('REAPER_INTERVAL', '300')),
+        reaper_max_age=int(os.getenv('REAPER_MAX_AGE', '3600')),
+        docker_hosts=[
+            url.strip()
+            for url in os.getenv('DOCKER_HOSTS', '').split(',')
+            if url.strip()
+        ],
+        host_failure_threshold=int(os.getenv('HOST_FAILURE_THRESHOLD', '3')),
+        host_cooldown_seconds=float(os.getenv('HOST_COOLDOWN_SECONDS', '30')),
+        max_concurrent_executions=int(os.getenv('MAX_CONCURRENT_EXECUTIONS', '4')),
+        max_queued_executions=int(os.getenv('MAX_QUEUED_EXECUTIONS', '16')),
+        pool_min_size=int(os.getenv('POOL_MIN_SIZE', '0')),
+        pool_max_size=int(os.getenv('POOL_MAX_SIZE', '4')),
+        compression_min_bytes=int(os.getenv('COMPRESSION_MIN_BYTES', '1024')),
+        max_decompressed_body_bytes=int(
+            os.getenv('MAX_DECOMPRESSED_BODY_BYTES', str(256 * 1024 * 1024))
+        ),
+        max_batch_size=int(os.getenv('MAX_BATCH_SIZE', '32')),
+        fair_scheduling=os.getenv('FAIR_SCHEDULING', 'false').lower() == 'true',
+        tenant_max_concurrent=int(os.getenv('TENANT_MAX_CONCURRENT', '0')),
+        tenant_max_queued=int(os.getenv('TENANT_MAX_QUEUED', '0')),
+        tenant_cpu_budget=float(os.getenv('TENANT_CPU_BUDGET', '0')),
+        tenant_budget_window=float(os.getenv('TENANT_BUDGET_WINDOW', '3600')),
+        tenant_weights=parse_tenant_weights(os.getenv('TENANT_WEIGHTS', '')),
+        job_retention_seconds=int(os.getenv('JOB_RETENTION_SECONDS', '600')),
+        max_sessions=int(os.getenv('MAX_SESSIONS', '0')),
+        session_idle_timeout=int(os.getenv('SESSION_IDLE_TIMEOUT', '300')),
     )
 
 
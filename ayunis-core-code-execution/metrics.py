@@ -0,0 +1,207 @@
+"""Execution metrics: container resource sampling and Prometheus export."""
+
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from models import ExecutionMetrics, ExecutorStats
+
+# Dedicated registry: only the executor's metrics, no process collectors
+# registered twice when tests build several apps.
+REGISTRY = CollectorRegistry()
+
+_PHASE_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+_MIB = 1024 * 1024
+
+PHASE_SECONDS = Histogram(
+    "code_execution_phase_seconds",
+    "Time spent per execution phase",
+    ["phase"],
+    buckets=_PHASE_BUCKETS,
+    registry=REGISTRY,
+)
+EXECUTION_SECONDS = Histogram(
+    "code_execution_duration_seconds",
+    "Total execution time, queueing included",
+    ["outcome"],
+    buckets=_PHASE_BUCKETS,
+    registry=REGISTRY,
+)
+PEAK_MEMORY_BYTES = Histogram(
+    "code_execution_peak_memory_bytes",
+    "Peak memory of the sandbox container",
+    buckets=tuple(m * _MIB for m in (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)),
+    registry=REGISTRY,
+)
+CPU_SECONDS = Histogram(
+    "code_execution_cpu_seconds",
+    "CPU time used by the sandbox container",
+    buckets=_PHASE_BUCKETS,
+    registry=REGISTRY,
+)
+REAPED = Counter(
+    "code_execution_reaped_resources",
+    "Orphaned sandbox containers and volumes removed by the reaper",
+    ["kind"],
+    registry=REGISTRY,
+)
+
+
+def observe(metrics: ExecutionMetrics, outcome: str) -> None:
+    """Record one execution; outcome is "success", "error" or "timeout"."""
+    for phase, ms in metrics.phases_ms.items():
+        PHASE_SECONDS.labels(phase=phase).observe(ms / 1000)
+    EXECUTION_SECONDS.labels(outcome=outcome).observe(metrics.total_ms / 1000)
+    if metrics.peak_memory_bytes is not None:
+        PEAK_MEMORY_BYTES.observe(metrics.peak_memory_bytes)
+    if metrics.cpu_time_ms is not None:
+        CPU_SECONDS.observe(metrics.cpu_time_ms / 1000)
+
+
+class _StatsCollector:
+    """Exposes ExecutorStats (queue, pool, caches, sessions) at scrape time."""
+
+    def __init__(self) -> None:
+        self.source: Optional[Callable[[], ExecutorStats]] = None
+
+    def collect(self) -> Iterator[Any]:
+        if self.source is None:
+            return
+        stats = self.source()
+        gauges: Dict[str, Tuple[str, float]] = {
+            "code_execution_running": (
+                "Executions holding a slot",
+                stats.queue.running,
+            ),
+            "code_execution_queued": (
+                "Executions waiting for a slot",
+                stats.queue.queued,
+            ),
+        }
+        counters: Dict[str, Tuple[str, float]] = {
+            "code_execution_rejected": (
+                "Executions rejected with 429",
+                stats.queue.rejected,
+            ),
+        }
+        if stats.pool is not None:
+            gauges["code_execution_pool_idle"] = (
+                "Ready pooled sandboxes",
+                stats.pool.idle,
+            )
+            counters["code_execution_pool_hits"] = ("Pool hits", stats.pool.hits)
+            counters["code_execution_pool_misses"] = ("Pool misses", stats.pool.misses)
+        if stats.file_cache is not None:
+            gauges["code_execution_file_cache_bytes"] = (
+                "Size of cached input files",
+                stats.file_cache.bytes,
+            )
+            counters["code_execution_file_cache_hits"] = (
+                "Input file cache hits",
+                stats.file_cache.hits,
+            )
+        if stats.result_cache is not None:
+            gauges["code_execution_result_cache_bytes"] = (
+                "Size of cached execution results",
+                stats.result_cache.bytes,
+            )
+            counters["code_execution_result_cache_hits"] = (
+                "Executions answered from the result cache",
+                stats.result_cache.hits,
+            )
+        if stats.sessions is not None:
+            gauges["code_execution_sessions_open"] = (
+                "Open sessions",
+                stats.sessions.open,
+            )
+        for name, (doc, value) in gauges.items():
+            yield GaugeMetricFamily(name, doc, value=value)
+        if stats.queue.tenants:
+            running = GaugeMetricFamily(
+                "code_execution_tenant_running",
+                "Executions of a tenant holding a slot",
+                labels=["tenant"],
+            )
+            queued = GaugeMetricFamily(
+                "code_execution_tenant_queued",
+                "Executions of a tenant waiting for a slot",
+                labels=["tenant"],
+            )
+            for tenant in stats.queue.tenants:
+                running.add_metric([tenant.tenant], tenant.running)
+                queued.add_metric([tenant.tenant], tenant.queued)
+            yield running
+            yield queued
+        for name, (doc, value) in counters.items():
+            yield CounterMetricFamily(name, doc, value=value)
+
+
+_stats_collector = _StatsCollector()
+REGISTRY.register(_stats_collector)
+
+
+def set_stats_source(source: Optional[Callable[[], ExecutorStats]]) -> None:
+    _stats_collector.source = source
+
+
+def render() -> bytes:
+    """Prometheus text exposition of every metric in REGISTRY."""
+    return generate_latest(REGISTRY)
+
+
+class ContainerStatsSampler:
+    """Samples a running container's peak memory and CPU time.
+
+    Reads the Docker stats stream on a background thread. The daemon emits
+    about one sample per second, and a container's accounting is gone once it
+    exits, so values are a lower bound and None for a container that finished
+    before its first non-empty sample.
+    """
+
+    def __init__(self, container: Any):
+        self._container = container
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._peak_memory = 0
+        self._cpu_ns = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._sample, name="container-stats", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> Tuple[Optional[int], Optional[float]]:
+        """Stop sampling; returns (peak memory bytes, CPU time ms)."""
+        self._stopped.set()
+        if self._thread is not None:
+            # The stream ends with the container; do not wait for the next sample.
+            self._thread.join(timeout=0.1)
+        with self._lock:
+            return (
+                self._peak_memory or None,
+                self._cpu_ns / 1e6 if self._cpu_ns else None,
+            )
+
+    def _sample(self) -> None:
+        try:
+            for sample in self._container.stats(stream=True, decode=True):
+                memory = sample.get("memory_stats") or {}
+                cpu = (sample.get("cpu_stats") or {}).get("cpu_usage") or {}
+                with self._lock:
+                    # cgroup v1 reports max_usage; v2 only the current usage.
+                    self._peak_memory = max(
+                        self._peak_memory,
+                        memory.get("max_usage") or 0,
+                        memory.get("usage") or 0,
+                    )
+                    self._cpu_ns = max(self._cpu_ns, cpu.get("total_usage") or 0)
+                if self._stopped.is_set():
+                    return
+        except Exception:
+            pass
@@ -1,6 +1,7 @@
 """Pydantic models for the Python code execution service."""
 
-from typing import Dict, Optional
+import socket
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -11,6 +12,57 @@ class ExecutionRequest(BaseModel):
     files: Optional[Dict[str, str]] = Field(
         None, description="Optional dictionary of filename -> base64-encoded content"
     )
+    file_refs: Optional[Dict[str, str]] = Field(
+        None,
+        description=(
+            "Optional dictionary of filename -> SHA-256 of a file uploaded in an "
+            "earlier request (see file_hashes); requires the input file cache"
+        ),
+    )
+    tenant_id: Optional[str] = Field(
+        None,
+        max_length=128,
+        description=(
+            "Caller (tenant or organisation) the execution is accounted to by "
+            "fair scheduling; executions without one share a default tenant"
+        ),
+    )
+    cache: bool = Field(
+        default=False,
+        description=(
+            "Reuse the stored result of an identical earlier execution (same "
+            "code, files, sandbox image and limits) instead of running the "
+            "code again; only for deterministic code. Requires the result cache"
+        ),
+    )
+
+
+class BatchExecutionRequest(BaseModel):
+    """Several independent snippets to run in one call."""
+
+    executions: List[ExecutionRequest] = Field(
+        ..., min_length=1, description="Snippets to run, each in its own sandbox"
+    )
+
+
+class ExecutionMetrics(BaseModel):
+    """Where an execution spent its time, and what the sandbox consumed."""
+
+    phases_ms: Dict[str, float] = Field(
+        ...,
+        description=(
+            "Milliseconds per phase (queue, file_cache, build_tar, image_check, "
+            "create, stage, start, run, collect_outputs, cleanup); phases that "
+            "did not happen are absent"
+        ),
+    )
+    total_ms: float = Field(..., description="Wall time, queueing included")
+    peak_memory_bytes: Optional[int] = Field(
+        None, description="Peak container memory, sampled from Docker stats"
+    )
+    cpu_time_ms: Optional[float] = Field(
+        None, description="Container CPU time, sampled from Docker stats"
+    )
 
 
 class ExecutionResponse(BaseModel):
@@ -25,7 +77,129 @@ class ExecutionResponse(BaseModel):
     execution_id: str = Field(..., description="Unique identifier for this execution")
     output_files: Optional[Dict[str, str]] = Field(
         None,
-        description="Dictionary of output CSV files: filename -> base64-encoded content",
+        description=(
+            "Dictionary of output CSV files: filename -> base64-encoded content"
+        ),
+    )
+    output_truncated: bool = Field(
+        default=False,
+        description=(
+            "Whether output exceeded the cap and only its head and tail are kept"
+        ),
+    )
+    error_truncated: bool = Field(
+        default=False,
+        description=(
+            "Whether error exceeded the cap and only its head and tail are kept"
+        ),
+    )
+    omitted_output_files: Optional[List[str]] = Field(
+        None, description="Output CSV files left out because they exceeded size caps"
+    )
+    file_hashes: Optional[Dict[str, str]] = Field(
+        None,
+        description=(
+            "SHA-256 of each input file, usable in file_refs of later requests "
+            "(only when the input file cache is enabled)"
+        ),
+    )
+    metrics: Optional[ExecutionMetrics] = Field(
+        None, description="Per-phase timing and resource usage of the execution"
+    )
+    cached: bool = Field(
+        default=False,
+        description=(
+            "Whether this result was served from the result cache; the code "
+            "did not run again and execution_id is that of the original run"
+        ),
+    )
+
+
+class BatchExecutionResponse(BaseModel):
+    """Results of a batch, in the order of the request's executions."""
+
+    results: List[ExecutionResponse] = Field(..., description="One result per snippet")
+
+
+class SessionCreateRequest(BaseModel):
+    """Request model for opening a persistent interpreter session."""
+
+    files: Optional[Dict[str, str]] = Field(
+        None, description="Optional dictionary of filename -> base64-encoded content"
+    )
+    file_refs: Optional[Dict[str, str]] = Field(
+        None,
+        description=(
+            "Optional dictionary of filename -> SHA-256 of a cached input file; "
+            "requires the input file cache"
+        ),
+    )
+
+
+class SessionExecuteRequest(BaseModel):
+    """Request model for one step of code in a session."""
+
+    code: str = Field(
+        ..., description="Python code to run in the session's interpreter"
+    )
+    files: Optional[Dict[str, str]] = Field(
+        None,
+        description="Optional dictionary of filename -> base64-encoded content, "
+        "added to files/ before the step runs",
+    )
+
+
+class SessionInfo(BaseModel):
+    """State of a persistent interpreter session."""
+
+    session_id: str = Field(..., description="Session identifier")
+    created_at: float = Field(..., description="Unix time the session was opened")
+    last_used_at: float = Field(..., description="Unix time of the last step")
+    expires_at: float = Field(
+        ..., description="Unix time the session is closed unless used again"
+    )
+    steps: int = Field(..., description="Steps executed so far")
+
+
+class ExecutionStatus(BaseModel):
+    """State of an execution submitted through the job API (/executions)."""
+
+    execution_id: str = Field(..., description="Unique identifier for this execution")
+    status: Literal["queued", "running", "completed", "cancelled"] = Field(
+        ..., description="Lifecycle state; see result.success for the outcome"
+    )
+    created_at: float = Field(..., description="Unix time the job was submitted")
+    started_at: Optional[float] = Field(
+        None, description="Unix time the execution got a slot"
+    )
+    finished_at: Optional[float] = Field(
+        None, description="Unix time the execution finished or was cancelled"
+    )
+    result: Optional[ExecutionResponse] = Field(
+        None,
+        description=(
+            "Result once finished; for a job cancelled while running, the "
+            "output produced until it was killed"
+        ),
+    )
+
+
+class ExecutionEvent(BaseModel):
+    """One line of the NDJSON stream returned by /execute/stream."""
+
+    type: Literal["started", "stdout", "stderr", "result"] = Field(
+        ..., description="Event type"
+    )
+    execution_id: Optional[str] = Field(
+        None, description="Execution identifier (started event)"
+    )
+    data: Optional[str] = Field(None, description="Output chunk (stdout/stderr events)")
+    result: Optional[ExecutionResponse] = Field(
+        None,
+        description=(
+            "Final result (result event); output and error are empty because "
+            "they were already streamed"
+        ),
     )
 
 
@@ -42,6 +216,174 @@ class ExecutorConfig(BaseModel):
     docker_image: str = Field(
         default="python-sandbox:latest", description="Docker image to use"
     )
+    staging_mode: Literal["direct", "helper"] = Field(
+        default="direct",
+        description=(
+            "How the workspace is staged: 'direct' copies it into the created "
+            "sandbox container, 'helper' uses a separate root helper container"
+        ),
+    )
+    sandbox_backend: Literal["docker", "process"] = Field(
+        default="docker",
+        description=(
+            "Where sandboxes run: 'docker' containers, or 'process', local "
+            "interpreter processes isolated with bubblewrap namespaces"
+        ),
+    )
+    process_python: str = Field(
+        default="python3", description="Interpreter the process backend runs"
+    )
+    process_workdir: str = Field(
+        default="/dev/shm",
+        description="Directory (a tmpfs) holding process sandbox workspaces",
+    )
+    process_binds: List[str] = Field(
+        default_factory=list,
+        description=(
+            "Paths mounted read-only into process sandboxes besides the "
+            "system directories, e.g. a virtualenv"
+        ),
+    )
+    process_cgroup: Optional[str] = Field(
+        default=None,
+        description=(
+            "Delegated cgroup v2 directory for per-execution limits of the "
+            "process backend; rlimits are used without one"
+        ),
+    )
+    sandbox_runtime: Literal["exec", "forkserver"] = Field(
+        default="exec",
+        description=(
+            "How the sandbox runs code: 'exec' starts python /execution/main.py, "
+            "'forkserver' runs it in a launcher that preloaded the scientific stack"
+        ),
+    )
+    collect_resource_stats: bool = Field(
+        default=True,
+        description="Sample peak memory and CPU time of each sandbox from Docker stats",
+    )
+    max_output_bytes: int = Field(
+        default=1024 * 1024,
+        description="Bytes of stdout and of stderr kept per execution (head and tail)",
+    )
+    max_output_file_bytes: int = Field(
+        default=10 * 1024 * 1024, description="Largest output file returned"
+    )
+    max_output_total_bytes: int = Field(
+        default=25 * 1024 * 1024,
+        description="Total output file bytes returned per execution",
+    )
+    file_cache_max_bytes: int = Field(
+        default=0,
+        description="Total size of cached input files; 0 disables the cache",
+    )
+    file_cache_max_entries: int = Field(
+        default=256, description="Maximum number of cached input files"
+    )
+    result_cache_max_bytes: int = Field(
+        default=0,
+        description="Total size of cached execution results; 0 disables the cache",
+    )
+    result_cache_max_entries: int = Field(
+        default=1024, description="Maximum number of cached execution results"
+    )
+    result_cache_ttl: int = Field(
+        default=3600, description="Seconds a cached execution result stays valid"
+    )
+    instance_id: str = Field(
+        default_factory=socket.gethostname,
+        description=(
+            "Identifies this service's containers and volumes (label "
+            "ayunis.instance); keep it stable across restarts"
+        ),
+    )
+    reaper_interval: int = Field(
+        default=300,
+        description="Seconds between orphaned resource sweeps; 0 disables the reaper",
+    )
+    reaper_max_age: int = Field(
+        default=3600,
+        description="Age after which another instance's sandbox resources are removed",
+    )
+    docker_hosts: List[str] = Field(
+        default_factory=list,
+        description=(
+            "Docker endpoints to run sandboxes on (e.g. tcp://10.0.0.2:2375); "
+            "empty uses the daemon from the environment"
+        ),
+    )
+    host_failure_threshold: int = Field(
+        default=3,
+        description="Consecutive Docker failures that take a host out of rotation",
+    )
+    host_cooldown_seconds: float = Field(
+        default=30, description="Seconds a failing host stays out of rotation"
+    )
+    max_concurrent_executions: int = Field(
+        default=4, description="Executions allowed to run at the same time"
+    )
+    max_queued_executions: int = Field(
+        default=16,
+        description="Executions allowed to wait for a slot before new ones get 429",
+    )
+    pool_min_size: int = Field(
+        default=0,
+        description="Sandboxes kept pre-created and ready to run; 0 disables the pool",
+    )
+    pool_max_size: int = Field(
+        default=4, description="Upper bound the pool may grow to under bursts"
+    )
+    fair_scheduling: bool = Field(
+        default=False,
+        description="Share slots between tenants by weighted fair queuing",
+    )
+    tenant_max_concurrent: int = Field(
+        default=0, description="Slots one tenant may hold at once; 0 for no cap"
+    )
+    tenant_max_queued: int = Field(
+        default=0,
+        description=(
+            "Executions one tenant may have waiting; 0 for only the global bound"
+        ),
+    )
+    tenant_cpu_budget: float = Field(
+        default=0,
+        description="CPU-seconds a tenant may use per budget window; 0 for no budget",
+    )
+    tenant_budget_window: float = Field(
+        default=3600, description="Seconds over which the CPU budget refills"
+    )
+    tenant_weights: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Share weight per tenant; tenants not listed have weight 1",
+    )
+    compression_min_bytes: int = Field(
+        default=1024,
+        ge=0,
+        description="Smallest response body compressed for clients that accept it",
+    )
+    max_decompressed_body_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        gt=0,
+        description="Largest request body accepted after decompression",
+    )
+    max_batch_size: int = Field(
+        default=32, description="Snippets accepted in one /execute/batch call"
+    )
+    job_retention_seconds: int = Field(
+        default=600,
+        description="Seconds a finished job's result stays available to GET",
+    )
+    max_sessions: int = Field(
+        default=0,
+        description=(
+            "Persistent interpreter sessions open at once; 0 (the default) "
+            "disables them"
+        ),
+    )
+    session_idle_timeout: int = Field(
+        default=300, description="Seconds after which an unused session is closed"
+    )
 
 
 class HealthResponse(BaseModel):
@@ -49,3 +391,154 @@ class HealthResponse(BaseModel):
 
     status: str = Field(..., description="Service status")
     message: str = Field(default="", description="Additional status information")
+
+
+class PoolStats(BaseModel):
+    """Sizing and hit/miss counters of the warm sandbox pool."""
+
+    min_size: int = Field(..., description="Configured minimum pool size")
+    max_size: int = Field(..., description="Configured maximum pool size")
+    target_size: int = Field(..., description="Current refill target")
+    idle: int = Field(..., description="Ready sandboxes waiting to be claimed")
+    hits: int = Field(..., description="Executions that claimed a ready sandbox")
+    misses: int = Field(..., description="Executions that had to create one")
+    refills: int = Field(..., description="Sandboxes created by the refiller")
+    refill_failures: int = Field(..., description="Failed refill attempts")
+    last_refill_ms: Optional[float] = Field(
+        None, description="Latency of the most recent refill"
+    )
+    avg_refill_ms: Optional[float] = Field(
+        None, description="Mean refill latency since startup"
+    )
+
+
+class TenantQueueStats(BaseModel):
+    """Fair scheduling state of one tenant."""
+
+    tenant: str = Field(..., description="Tenant identifier")
+    weight: float = Field(..., description="Configured share weight")
+    running: int = Field(..., description="Executions of the tenant holding a slot")
+    queued: int = Field(..., description="Executions of the tenant waiting")
+    rejected: int = Field(..., description="Executions of the tenant rejected")
+    cpu_seconds: float = Field(
+        ..., description="CPU-seconds charged (slot time times MAX_CPU)"
+    )
+    budget_remaining: Optional[float] = Field(
+        None, description="CPU-seconds left in the budget; absent without budgets"
+    )
+
+
+class QueueStats(BaseModel):
+    """Admission state of the executor's concurrency limiter."""
+
+    max_concurrent: int = Field(..., description="Configured concurrency cap")
+    max_queued: int = Field(..., description="Configured wait queue bound")
+    running: int = Field(..., description="Executions currently holding a slot")
+    queued: int = Field(..., description="Executions waiting for a slot")
+    rejected: int = Field(..., description="Executions rejected with 429")
+    tenants: List[TenantQueueStats] = Field(
+        default_factory=list,
+        description=(
+            "Per-tenant state with fair scheduling (tenants with executions "
+            "running or waiting, or budget in use)"
+        ),
+    )
+
+
+class FileCacheStats(BaseModel):
+    """Usage of the content-addressed input file cache."""
+
+    entries: int = Field(..., description="Cached files")
+    bytes: int = Field(..., description="Total size of cached files")
+    max_entries: int = Field(..., description="Configured entry bound")
+    max_bytes: int = Field(..., description="Configured size bound")
+    hits: int = Field(..., description="Inputs served from the cache")
+    misses: int = Field(..., description="Inputs that had to be stored")
+    evictions: int = Field(..., description="Files evicted (LRU)")
+
+
+class ResultCacheStats(BaseModel):
+    """Usage of the opt-in execution result cache."""
+
+    entries: int = Field(..., description="Cached results")
+    bytes: int = Field(..., description="Total size of cached output and files")
+    max_entries: int = Field(..., description="Configured entry bound")
+    max_bytes: int = Field(..., description="Configured size bound")
+    hits: int = Field(..., description="Executions answered from the cache")
+    misses: int = Field(..., description="Cacheable executions that had to run")
+    evictions: int = Field(..., description="Results evicted (LRU)")
+
+
+class SessionStats(BaseModel):
+    """Persistent interpreter sessions currently held by the executor."""
+
+    open: int = Field(..., description="Open sessions")
+    max_sessions: int = Field(..., description="Configured session limit")
+    idle_timeout: float = Field(..., description="Configured idle timeout in seconds")
+    created: int = Field(..., description="Sessions opened since startup")
+    expired: int = Field(..., description="Sessions closed by the idle timeout")
+
+
+class ReaperStats(BaseModel):
+    """What the orphaned resource reaper removed since startup."""
+
+    runs: int = Field(..., description="Completed sweeps")
+    containers_removed: int = Field(..., description="Orphaned containers removed")
+    volumes_removed: int = Field(..., description="Orphaned volumes removed")
+    failures: int = Field(..., description="Removals that failed")
+    last_run_at: Optional[float] = Field(
+        None, description="Unix time of the last sweep"
+    )
+
+
+class HostStats(BaseModel):
+    """Load and health of one Docker host."""
+
+    name: str = Field(..., description="Docker endpoint, or 'local'")
+    available: bool = Field(
+        ..., description="Whether the host is in rotation (not cooling down)"
+    )
+    running: int = Field(..., description="Executions and sessions placed on it")
+    latency_ms: float = Field(
+        ..., description="Average time from placement to a running sandbox"
+    )
+    consecutive_failures: int = Field(
+        ..., description="Docker failures since the last success"
+    )
+    pool: Optional[PoolStats] = Field(None, description="This host's warm pool")
+    file_cache: Optional[FileCacheStats] = Field(
+        None, description="This host's input file cache"
+    )
+
+
+class ExecutorStats(BaseModel):
+    """Runtime statistics of the executor, for capacity sizing."""
+
+    queue: QueueStats = Field(..., description="Concurrency and wait queue state")
+
+    pool: Optional[PoolStats] = Field(
+        None,
+        description=(
+            "Warm pool statistics summed over all Docker hosts (see hosts for "
+            "each); absent when the pool is disabled"
+        ),
+    )
+    file_cache: Optional[FileCacheStats] = Field(
+        None,
+        description=(
+            "Input file cache statistics summed over all Docker hosts (see "
+            "hosts for each); absent when disabled"
+        ),
+    )
+    result_cache: Optional[ResultCacheStats] = Field(
+        None, description="Result cache statistics; absent when disabled"
+    )
+    sessions: Optional[SessionStats] = Field(
+        None, description="Session statistics; absent when sessions are disabled"
+    )
+    reaper: Optional[ReaperStats] = Field(
+        None, description="Orphan reaper statistics; absent when disabled"
+    )
+    hosts: List[HostStats] = Field(
+        default_factory=list, description="Per Docker host load and health"
+    )
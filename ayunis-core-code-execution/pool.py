@@ -0,0 +1,193 @@
+"""Warm pool of pre-created sandbox containers."""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Optional
+
+from models import PoolStats
+
+logger = logging.getLogger(__name__)
+
+# After this many consecutive hits the refill target shrinks by one, so a burst
+# that grew the pool towards max_size does not keep it there forever.
+_SHRINK_AFTER_HITS = 20
+
+# Backoff bounds (seconds) for refills while the Docker daemon is failing, so a
+# broken daemon is not hammered with create calls in a tight loop.
+_REFILL_BACKOFF_MIN = 1.0
+_REFILL_BACKOFF_MAX = 30.0
+
+
+@dataclass
+class Sandbox:
+    """A created sandbox container and its workspace volume.
+
+    Single use: once a sandbox has run an execution it is destroyed
+    afterwards, never returned to the pool. `started` is set for containers
+    started ahead of time (forkserver runtime), which wait for their workspace.
+    """
+
+    sandbox_id: str
+    volume_name: str
+    volume: Any
+    container: Any
+    created_at: float = field(default_factory=time.time)
+    started: bool = False
+    # The hosts.DockerHost the sandbox was created on.
+    host: Any = None
+
+
+class SandboxPool:
+    """Keeps a number of ready-to-run sandboxes so requests skip the create.
+
+    Refilling happens on a background thread: the Docker calls behind
+    `factory` block, and the request path must never wait for them on a hit.
+    The refill target starts at `min_size`, grows by one per miss (bursts) up
+    to `max_size`, and shrinks back after a run of consecutive hits. Idle
+    sandboxes older than `max_age` are destroyed instead of handed out.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Sandbox],
+        destroy: Callable[[Sandbox], None],
+        min_size: int,
+        max_size: int,
+        max_age: Optional[float] = None,
+    ):
+        self._factory = factory
+        self._destroy = destroy
+        self.max_age = max_age
+        self.min_size = max(min_size, 0)
+        self.max_size = max(max_size, self.min_size)
+        self._target = self.min_size
+
+        self._idle: Deque[Sandbox] = deque()
+        self._creating = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        self._hits = 0
+        self._misses = 0
+        self._consecutive_hits = 0
+        self._refills = 0
+        self._refill_failures = 0
+        self._last_refill_ms: Optional[float] = None
+        self._total_refill_ms = 0.0
+
+    def start(self) -> None:
+        """Start the background refill thread."""
+        self._thread = threading.Thread(
+            target=self._refill_loop, name="sandbox-pool-refill", daemon=True
+        )
+        self._thread.start()
+
+    def claim(self) -> Optional[Sandbox]:
+        """Take a ready sandbox, or None on a miss (the caller creates one)."""
+        expired = []
+        with self._cond:
+            if self.max_age is not None:
+                cutoff = time.time() - self.max_age
+                while self._idle and self._idle[0].created_at < cutoff:
+                    expired.append(self._idle.popleft())
+            if self._idle:
+                self._hits += 1
+                self._consecutive_hits += 1
+                if (
+                    self._consecutive_hits >= _SHRINK_AFTER_HITS
+                    and self._target > self.min_size
+                ):
+                    self._target -= 1
+                    self._consecutive_hits = 0
+                sandbox = self._idle.popleft()
+            else:
+                self._misses += 1
+                self._consecutive_hits = 0
+                self._target = min(self._target + 1, self.max_size)
+                sandbox = None
+            self._cond.notify_all()
+        for stale in expired:
+            self._destroy(stale)
+        return sandbox
+
+    def close(self) -> None:
+        """Stop refilling and destroy every idle sandbox."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for sandbox in idle:
+            self._destroy(sandbox)
+
+    def stats(self) -> PoolStats:
+        """Snapshot of pool sizing and hit/miss counters."""
+        with self._cond:
+            return PoolStats(
+                min_size=self.min_size,
+                max_size=self.max_size,
+                target_size=self._target,
+                idle=len(self._idle),
+                hits=self._hits,
+                misses=self._misses,
+                refills=self._refills,
+                refill_failures=self._refill_failures,
+                last_refill_ms=self._last_refill_ms,
+                avg_refill_ms=(
+                    self._total_refill_ms / self._refills if self._refills else None
+                ),
+            )
+
+    def _refill_loop(self) -> None:
+        backoff = _REFILL_BACKOFF_MIN
+        while True:
+            with self._cond:
+                while not self._closed and (
+                    len(self._idle) + self._creating >= self._target
+                ):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._creating += 1
+
+            started_at = time.perf_counter()
+            sandbox: Optional[Sandbox] = None
+            try:
+                sandbox = self._factory()
+            except Exception as e:
+                logger.warning(f"Sandbox pool refill failed: {e}")
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+            if not self._record_refill(sandbox, elapsed_ms):
+                if sandbox is not None:
+                    self._destroy(sandbox)
+                return
+            if sandbox is None:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _REFILL_BACKOFF_MAX)
+            else:
+                backoff = _REFILL_BACKOFF_MIN
+
+    def _record_refill(self, sandbox: Optional[Sandbox], elapsed_ms: float) -> bool:
+        """Account for one refill attempt; False once the pool has been closed.
+
+        A sandbox created while the pool was closing is not added; the caller
+        destroys it.
+        """
+        with self._cond:
+            self._creating -= 1
+            if sandbox is None:
+                self._refill_failures += 1
+            elif not self._closed:
+                self._refills += 1
+                self._last_refill_ms = elapsed_ms
+                self._total_refill_ms += elapsed_ms
+                self._idle.append(sandbox)
+                self._cond.notify_all()
+            return not self._closed
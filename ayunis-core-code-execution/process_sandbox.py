@@ -0,0 +1,411 @@
+"""Sandboxes that run the interpreter as a local process, without Docker.
+
+The process is started under bubblewrap (bwrap) in fresh unprivileged user,
+mount, pid, network, IPC and UTS namespaces: the root is an empty tmpfs with
+only the interpreter's directories bind-mounted read-only, the workspace is
+a directory on a tmpfs mounted at /execution, and there is no network. The
+layout inside is the same as in a Docker sandbox (main.py, files/, output/).
+"""
+
+import logging
+import os
+import selectors
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from capture import OutputCapture
+
+logger = logging.getLogger(__name__)
+
+# Read-only bind mounts every sandbox gets (missing ones are skipped): enough
+# for a system or /usr/local interpreter, its shared libraries and TLS roots.
+DEFAULT_BINDS = (
+    "/usr",
+    "/bin",
+    "/sbin",
+    "/lib",
+    "/lib32",
+    "/lib64",
+    "/etc/alternatives",
+    "/etc/ld.so.cache",
+    "/etc/localtime",
+    "/etc/ssl",
+)
+
+# Same as the Docker sandbox's pids_limit.
+_MAX_PIDS = 50
+
+# Run by /bin/sh in front of bwrap when a cgroup is used: wait on stdin until
+# the parent has moved this pid into the cgroup, then exec the rest of argv.
+# EOF instead of the go-ahead line (the parent failed) exits without running.
+_CGROUP_GATE = 'read -r _ && exec "$@" </dev/null'
+
+_READ_SIZE = 64 * 1024
+
+_ENVIRONMENT = {
+    "HOME": "/execution",
+    "XDG_CACHE_HOME": "/execution/.cache",
+    "XDG_CONFIG_HOME": "/execution/.config",
+    "MPLCONFIGDIR": "/execution/.config/matplotlib",
+    "PYTHONPYCACHEPREFIX": "/execution/__pycache__",
+    "MPLBACKEND": "Agg",
+    "PATH": "/usr/local/bin:/usr/bin:/bin",
+}
+
+_WRITABLE_DIRS = (".cache", ".config", ".config/matplotlib", "__pycache__")
+
+
+class ProcessSandboxError(Exception):
+    """The process sandbox cannot be used on this machine."""
+
+
+def parse_memory(value: str) -> int:
+    """Bytes of a Docker-style memory limit such as "512m" or "2g"."""
+    units = {"b": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class ProcessWorkspace:
+    """One execution's workspace directory and, optionally, its cgroup.
+
+    Created and removed by ProcessSandbox.workspace(); single use, like a
+    Docker sandbox.
+    """
+
+    def __init__(
+        self, sandbox: "ProcessSandbox", path: str, cgroup: Optional[str]
+    ):
+        self._sandbox = sandbox
+        self.path = path
+        self.cgroup = cgroup
+
+    def stage(self, code: str, inputs: Iterable[Tuple[str, BinaryIO]]) -> None:
+        """Write main.py, files/ (from (name, file object) pairs) and the
+        empty output/ and cache dirs."""
+        with open(os.path.join(self.path, "main.py"), "wb") as f:
+            f.write(code.encode("utf-8"))
+        files_dir = os.path.join(self.path, "files")
+        os.mkdir(files_dir)
+        for name, fileobj in inputs:
+            target = os.path.normpath(os.path.join(files_dir, name))
+            if os.path.dirname(target) != files_dir:
+                raise ValueError(f"Invalid input file name: {name!r}")
+            with open(target, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+        os.mkdir(os.path.join(self.path, "output"))
+        for name in _WRITABLE_DIRS:
+            os.makedirs(os.path.join(self.path, name), exist_ok=True)
+
+    def start(self) -> "subprocess.Popen[bytes]":
+        """Start the interpreter on main.py; pair with run().
+
+        Nothing runs in the child between fork and exec: the rlimits are set
+        by a `prlimit` in front of bwrap, and the cgroup is joined from here,
+        while the child is still held at a gate in front of the command.
+        """
+        argv = self._sandbox.command(self.path)
+        if self.cgroup is None:
+            return self._spawn(self._sandbox.rlimits() + argv)
+
+        process = self._spawn(
+            ["/bin/sh", "-c", _CGROUP_GATE, "sh", *argv], stdin=subprocess.PIPE
+        )
+        assert process.stdin is not None
+        try:
+            with open(os.path.join(self.cgroup, "cgroup.procs"), "w") as f:
+                f.write(str(process.pid))
+            process.stdin.write(b"go\n")
+        except BaseException:
+            process.kill()
+            process.communicate()
+            raise
+        finally:
+            process.stdin.close()
+        return process
+
+    def _spawn(
+        self, argv: List[str], stdin: int = subprocess.DEVNULL
+    ) -> "subprocess.Popen[bytes]":
+        return subprocess.Popen(
+            argv,
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.path,
+            env={},
+            start_new_session=True,
+        )
+
+    def run(
+        self, process: "subprocess.Popen[bytes]", capture: OutputCapture
+    ) -> Tuple[int, bool, Tuple[Optional[int], Optional[float]]]:
+        """Feed the process's output to `capture` until it exits.
+
+        The timeout is enforced by killing the process; the sandbox's pid
+        namespace goes with it. Returns the exit code (128 + signal when
+        killed, as Docker reports it), whether the timeout was hit, and the
+        peak memory bytes and CPU time ms of the sandbox.
+        """
+        timed_out = threading.Event()
+
+        def on_timeout() -> None:
+            timed_out.set()
+            try:
+                process.kill()
+            except Exception:
+                pass
+
+        timer = threading.Timer(self._sandbox.timeout, on_timeout)
+        timer.daemon = True
+        timer.start()
+        try:
+            assert process.stdout is not None and process.stderr is not None
+            with selectors.DefaultSelector() as selector:
+                selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+                selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+                while selector.get_map():
+                    for key, _ in selector.select():
+                        chunk = os.read(key.fd, _READ_SIZE)
+                        if chunk:
+                            capture.feed(key.data, chunk)
+                        else:
+                            selector.unregister(key.fileobj)
+            capture.close()
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        finally:
+            timer.cancel()
+            process.stdout.close()  # type: ignore[union-attr]
+            process.stderr.close()  # type: ignore[union-attr]
+        exit_code = process.returncode
+        if exit_code < 0:
+            exit_code = 128 - exit_code
+        # ru_maxrss is in KiB and covers the sandbox's waited-for descendants.
+        usage = (
+            rusage.ru_maxrss * 1024 or None,
+            (rusage.ru_utime + rusage.ru_stime) * 1000 or None,
+        )
+        return exit_code, timed_out.is_set(), usage
+
+    def collect_outputs(
+        self, all_outputs: bool, per_file_limit: int, total_limit: int
+    ) -> Tuple[Dict[str, bytes], List[str]]:
+        """Read the files in output/ with the same caps as a Docker sandbox.
+
+        Symlinks and other non-regular files are skipped: the sandboxed code
+        created them, and they would resolve against this host's filesystem.
+        """
+        remaining = total_limit
+        output_files: Dict[str, bytes] = {}
+        omitted: List[str] = []
+        output_dir = os.path.join(self.path, "output")
+        for root, dirs, names in os.walk(output_dir):
+            dirs.sort()
+            for filename in sorted(names):
+                if not (all_outputs or filename.endswith(".csv")):
+                    continue
+                # O_NONBLOCK: opening a FIFO left there must not block.
+                flags = os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK
+                try:
+                    fd = os.open(os.path.join(root, filename), flags)
+                except OSError:
+                    continue
+                with os.fdopen(fd, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    if not stat.S_ISREG(st.st_mode):
+                        continue
+                    if st.st_size > per_file_limit:
+                        omitted.append(filename)
+                        continue
+                    if st.st_size > remaining:
+                        omitted.append(filename)
+                        return output_files, omitted
+                    content = f.read(st.st_size)
+                remaining -= len(content)
+                output_files[filename] = content
+        return output_files, omitted
+
+
+class ProcessSandbox:
+    """Runs executions as bubblewrap-sandboxed local interpreter processes.
+
+    Limits come from a delegated cgroup v2 directory when `cgroup_root` is
+    set (memory.max, cpu.max and pids.max per execution, like the Docker
+    sandbox). Without one they fall back to rlimits: address space for
+    memory and CPU seconds as a backstop behind the timeout. The process
+    count is then not limited: RLIMIT_NPROC counts every process of the
+    user, not those of one sandbox.
+    """
+
+    def __init__(
+        self,
+        python: str,
+        workdir: str,
+        timeout: float,
+        max_memory: str,
+        max_cpu: float,
+        binds: Iterable[str] = (),
+        cgroup_root: Optional[str] = None,
+        bwrap: str = "bwrap",
+        prlimit: str = "prlimit",
+    ):
+        self.python = python
+        self.workdir = workdir if os.path.isdir(workdir) else tempfile.gettempdir()
+        self.timeout = timeout
+        self.max_memory = parse_memory(max_memory)
+        self.max_cpu = max_cpu
+        self.binds = list(DEFAULT_BINDS) + [b for b in binds if b]
+        self.cgroup_root = cgroup_root
+        self.bwrap = bwrap
+        self.prlimit = prlimit
+        # Interpreter version reported from inside the sandbox by check().
+        self.version: Optional[str] = None
+
+    def check(self) -> None:
+        """Run the interpreter once in a sandbox, so a machine without user
+        namespaces or bwrap fails at startup rather than on every request.
+
+        Raises:
+            ProcessSandboxError: the sandbox cannot run the interpreter
+        """
+        if shutil.which(self.bwrap) is None:
+            raise ProcessSandboxError(f"{self.bwrap} not found on PATH")
+        if self.cgroup_root is not None:
+            if not os.access(self.cgroup_root, os.W_OK):
+                raise ProcessSandboxError(f"cgroup {self.cgroup_root} is not writable")
+        elif shutil.which(self.prlimit) is None:
+            raise ProcessSandboxError(f"{self.prlimit} not found on PATH")
+        else:
+            logger.warning(
+                "Process sandboxes run without a cgroup: the number of "
+                "processes per execution is not limited"
+            )
+        capture = OutputCapture(limit=4096)
+        with self.workspace("check") as workspace:
+            workspace.stage("import sys; print(sys.version)", [])
+            exit_code, _, _ = workspace.run(workspace.start(), capture)
+        if exit_code != 0:
+            raise ProcessSandboxError(
+                f"Sandboxed {self.python} exited with {exit_code}: "
+                f"{capture.text('stderr').strip()}"
+            )
+        self.version = capture.text("stdout").strip()
+
+    def command(self, workspace_path: str) -> List[str]:
+        """The bwrap invocation running main.py of a staged workspace."""
+        argv = [
+            self.bwrap,
+            "--unshare-all",
+            "--die-with-parent",
+            "--new-session",
+            "--uid",
+            "1000",
+            "--gid",
+            "1000",
+            "--hostname",
+            "sandbox",
+        ]
+        for path in self.binds:
+            argv += ["--ro-bind-try", path, path]
+        argv += [
+            "--proc",
+            "/proc",
+            "--dev",
+            "/dev",
+            "--tmpfs",
+            "/tmp",
+            "--bind",
+            workspace_path,
+            "/execution",
+            "--chdir",
+            "/",
+            "--clearenv",
+        ]
+        for name, value in self._environment().items():
+            argv += ["--setenv", name, value]
+        return argv + ["--", self.python, "/execution/main.py"]
+
+    def rlimits(self) -> List[str]:
+        """The prlimit prefix limiting a sandbox that has no cgroup."""
+        cpu_seconds = int(self.timeout * max(self.max_cpu, 1.0)) + 1
+        return [
+            self.prlimit,
+            f"--as={self.max_memory}",
+            f"--cpu={cpu_seconds}",
+            "--",
+        ]
+
+    @contextmanager
+    def workspace(
+        self, execution_id: Optional[str] = None
+    ) -> Iterator[ProcessWorkspace]:
+        """A fresh workspace (and cgroup), removed again on exit."""
+        execution_id = execution_id or str(uuid.uuid4())[:8]
+        path = tempfile.mkdtemp(prefix=f"exec-{execution_id}-", dir=self.workdir)
+        cgroup = None
+        try:
+            cgroup = self._create_cgroup(execution_id)
+            yield ProcessWorkspace(self, path, cgroup)
+        finally:
+            if cgroup is not None:
+                self._remove_cgroup(cgroup)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _environment(self) -> Dict[str, str]:
+        env = dict(_ENVIRONMENT)
+        # Numeric libraries size their thread pools by the host's cores, not
+        # by the CPU limit; keep them at the limit.
+        threads = str(max(int(self.max_cpu), 1))
+        for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            env[name] = threads
+        return env
+
+    def _create_cgroup(self, execution_id: str) -> Optional[str]:
+        if self.cgroup_root is None:
+            return None
+        path = os.path.join(self.cgroup_root, f"exec-{execution_id}")
+        os.mkdir(path)
+        settings = {
+            "memory.max": str(self.max_memory),
+            "memory.swap.max": "0",
+            "cpu.max": f"{int(self.max_cpu * 100000)} 100000",
+            "pids.max": str(_MAX_PIDS),
+        }
+        for name, value in settings.items():
+            try:
+                with open(os.path.join(path, name), "w") as f:
+                    f.write(value)
+            except FileNotFoundError:
+                # Controller not enabled for this subtree (e.g. no swap).
+                logger.warning(f"cgroup {path} has no {name}; limit not applied")
+        return path
+
+    def _remove_cgroup(self, path: str) -> None:
+        try:
+            # Anything left behind (there should be nothing: the pid
+            # namespace died with bwrap) is killed before the rmdir.
+            with open(os.path.join(path, "cgroup.kill"), "w") as f:
+                f.write("1")
+        except OSError:
+            pass
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            logger.warning(f"Could not remove cgroup {path}: {e}")
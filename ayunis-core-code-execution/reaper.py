@@ -0,0 +1,193 @@
+"""Removal of sandbox containers and volumes orphaned by a crashed service."""
+
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set
+
+import docker
+
+import metrics
+from models import ReaperStats
+
+logger = logging.getLogger(__name__)
+
+# Labels on every container and volume the executor creates for a sandbox.
+# Cached input file volumes (exec-cas-*) outlive the service on purpose and
+# do not carry them.
+INSTANCE_LABEL = "ayunis.instance"
+CREATED_LABEL = "ayunis.created"
+SANDBOX_LABEL = "ayunis.sandbox"
+# Session idle timeout (seconds) of the instance that created a sandbox which
+# may host a session. Labels are fixed at create time, so the last use is
+# read from the sandbox: every session step stages its code under this
+# directory, which sets its mtime.
+IDLE_TTL_LABEL = "ayunis.idle_ttl"
+SESSION_STEPS_PATH = "/execution/.steps"
+
+_DOCKER_TIME = re.compile(r"([^.]+T[\d:]+)(?:\.(\d+))?(Z|[+-][\d:]+)$")
+
+
+def resource_labels(
+    instance_id: str,
+    sandbox_id: Optional[str] = None,
+    idle_ttl: Optional[float] = None,
+) -> Dict[str, str]:
+    labels = {INSTANCE_LABEL: instance_id, CREATED_LABEL: str(int(time.time()))}
+    if sandbox_id is not None:
+        labels[SANDBOX_LABEL] = sandbox_id
+    if idle_ttl is not None:
+        labels[IDLE_TTL_LABEL] = str(int(idle_ttl))
+    return labels
+
+
+class OrphanReaper:
+    """Finds and removes sandbox resources nobody is going to clean up.
+
+    A resource of this instance is an orphan once it is older than `grace`
+    and its sandbox is not `in_use` (a remove() that failed, or a previous
+    run under the same instance id that crashed). A resource of another
+    instance is only removed once older than `max_age`, since that instance
+    may still be running against the same daemon; its pool recycles idle
+    sandboxes well before that age. A session sandbox of another instance
+    can legitimately be older still, so one that ran a step within its
+    idle TTL is kept, together with its volume.
+    """
+
+    def __init__(
+        self,
+        instance_id: str,
+        grace: float,
+        max_age: float,
+        in_use: Callable[[str], bool],
+    ):
+        self.instance_id = instance_id
+        self.grace = grace
+        self.max_age = max_age
+        self._in_use = in_use
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._containers = 0
+        self._volumes = 0
+        self._failures = 0
+        self._last_run_at: Optional[float] = None
+
+    def reap(self, client: Any) -> None:
+        """Remove orphaned containers, then their volumes, on one daemon."""
+        now = time.time()
+        containers = volumes = failures = 0
+        active_sessions: Set[str] = set()
+
+        for container in client.containers.list(
+            all=True, filters={"label": INSTANCE_LABEL}
+        ):
+            labels = container.labels or {}
+            if not self._is_orphan(labels, now):
+                continue
+            if self._is_active_session(container, labels, now):
+                active_sessions.add(labels.get(SANDBOX_LABEL, ""))
+                continue
+            try:
+                container.remove(force=True)
+                containers += 1
+            except docker.errors.NotFound:
+                pass
+            except Exception as e:
+                failures += 1
+                logger.warning(
+                    f"Reaper could not remove container {container.name}: {e}"
+                )
+
+        # Volumes last: a volume cannot be removed while a container uses it.
+        for volume in client.volumes.list(filters={"label": INSTANCE_LABEL}):
+            labels = volume.attrs.get("Labels") or {}
+            if not self._is_orphan(labels, now):
+                continue
+            if labels.get(SANDBOX_LABEL) in active_sessions:
+                continue
+            try:
+                volume.remove(force=True)
+                volumes += 1
+            except docker.errors.NotFound:
+                pass
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Reaper could not remove volume {volume.name}: {e}")
+
+        if containers or volumes or failures:
+            logger.info(
+                f"Reaper removed {containers} containers and {volumes} volumes "
+                f"({failures} failures)"
+            )
+        metrics.REAPED.labels(kind="container").inc(containers)
+        metrics.REAPED.labels(kind="volume").inc(volumes)
+        with self._lock:
+            self._runs += 1
+            self._containers += containers
+            self._volumes += volumes
+            self._failures += failures
+            self._last_run_at = now
+
+    def stats(self) -> ReaperStats:
+        with self._lock:
+            return ReaperStats(
+                runs=self._runs,
+                containers_removed=self._containers,
+                volumes_removed=self._volumes,
+                failures=self._failures,
+                last_run_at=self._last_run_at,
+            )
+
+    def _is_orphan(self, labels: Dict[str, str], now: float) -> bool:
+        try:
+            age = now - float(labels.get(CREATED_LABEL, ""))
+        except ValueError:
+            # Labelled by us but unreadable: judge by the instance alone.
+            age = float("inf")
+        if labels.get(INSTANCE_LABEL) != self.instance_id:
+            return age > self.max_age
+        sandbox_id = labels.get(SANDBOX_LABEL)
+        if sandbox_id is not None and self._in_use(sandbox_id):
+            return False
+        return age > self.grace
+
+    def _is_active_session(
+        self, container: Any, labels: Dict[str, str], now: float
+    ) -> bool:
+        """Whether another instance's session ran a step within its idle TTL."""
+        if labels.get(INSTANCE_LABEL) == self.instance_id:
+            return False
+        try:
+            idle_ttl = float(labels[IDLE_TTL_LABEL])
+        except (KeyError, ValueError):
+            return False
+        try:
+            _, stat = container.get_archive(SESSION_STEPS_PATH)
+        except docker.errors.NotFound:
+            # Never ran a step: not a session, or one that stayed unused.
+            return False
+        except Exception as e:
+            # Keep it this time rather than remove a session in use.
+            logger.warning(
+                f"Reaper could not check session activity of {container.name}: {e}"
+            )
+            return True
+        last_step = _parse_docker_time((stat or {}).get("mtime", ""))
+        return last_step is not None and now - last_step <= idle_ttl
+
+
+def _parse_docker_time(value: str) -> Optional[float]:
+    """Epoch seconds of an RFC 3339 timestamp as the Docker API reports it."""
+    match = _DOCKER_TIME.match(value)
+    if match is None:
+        return None
+    date, fraction, offset = match.groups()
+    # fromisoformat takes at most microseconds, and no "Z" before 3.11.
+    micros = (fraction or "0")[:6].ljust(6, "0")
+    offset = "+00:00" if offset == "Z" else offset
+    try:
+        return datetime.fromisoformat(f"{date}.{micros}{offset}").timestamp()
+    except ValueError:
+        return None
@@ -0,0 +1,135 @@
+"""Opt-in cache of execution results for repeated, deterministic executions."""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+from models import ExecutionResponse, ExecutorConfig, ResultCacheStats
+
+
+def result_key(
+    code: str,
+    files: Optional[Mapping[str, str]],
+    file_refs: Optional[Mapping[str, str]],
+    image_id: str,
+    limits: Mapping[str, Any],
+) -> str:
+    """SHA-256 over everything that decides an execution's outcome.
+
+    Inline files are keyed by their base64 content as sent, so identical
+    requests hash identically without decoding anything.
+    """
+    files_digest = {
+        name: hashlib.sha256(content.encode("ascii", "replace")).hexdigest()
+        for name, content in (files or {}).items()
+    }
+    material = json.dumps(
+        {
+            "code": code,
+            "files": files_digest,
+            "file_refs": dict(file_refs or {}),
+            "image": image_id,
+            "limits": dict(limits),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    response: ExecutionResponse
+    size: int
+    expires_at: float
+
+
+def _response_size(response: ExecutionResponse) -> int:
+    files = response.output_files or {}
+    return (
+        len(response.output)
+        + len(response.error)
+        + sum(len(name) + len(content) for name, content in files.items())
+    )
+
+
+class ResultCache:
+    """Execution responses by result_key(), with TTL and LRU eviction.
+
+    Bounded by entry count and by the size of the stored output and output
+    files. Used from the event loop only, so it needs no lock.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: str) -> Optional[ExecutionResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return entry.response
+
+    def put(self, key: str, response: ExecutionResponse) -> None:
+        size = _response_size(response)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = _Entry(response, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        self._evict()
+
+    def stats(self) -> ResultCacheStats:
+        return ResultCacheStats(
+            entries=len(self._entries),
+            bytes=self._bytes,
+            max_entries=self.max_entries,
+            max_bytes=self.max_bytes,
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+        )
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for key in expired:
+            self._drop(key)
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            key = next(iter(self._entries))
+            self._drop(key)
+            self._evictions += 1
+
+
+def cache_limits(config: ExecutorConfig) -> Dict[str, Any]:
+    """The ExecutorConfig settings that can change an execution's result."""
+    return {
+        "max_memory": config.max_memory,
+        "max_cpu": config.max_cpu,
+        "execution_timeout": config.execution_timeout,
+        "sandbox_runtime": config.sandbox_runtime,
+        "max_output_bytes": config.max_output_bytes,
+        "max_output_file_bytes": config.max_output_file_bytes,
+        "max_output_total_bytes": config.max_output_total_bytes,
+    }
@@ -0,0 +1,418 @@
+"""Admission control for executions: concurrency cap plus bounded wait queue."""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Mapping, Optional, Tuple
+
+from models import QueueStats, TenantQueueStats
+
+# Weight of the newest sample in the running-duration average behind
+# Retry-After; high enough to follow load shifts within a few executions.
+_DURATION_EWMA_ALPHA = 0.2
+
+# A reserved place in the wait queue; None when a slot was free right away.
+Waiter = Optional["asyncio.Future[None]"]
+
+# Tenant of executions that do not name one.
+DEFAULT_TENANT = "default"
+
+
+class ExecutorBusyError(Exception):
+    """Raised when every execution slot is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            f"Executor is at capacity; retry after {retry_after} seconds"
+        )
+        self.retry_after = retry_after
+
+
+class TenantBudgetExceededError(ExecutorBusyError):
+    """Raised when a tenant has used up its CPU-second budget for now."""
+
+    def __init__(self, tenant: str, retry_after: int):
+        Exception.__init__(
+            self,
+            f"Tenant {tenant} has used its CPU budget; "
+            f"retry after {retry_after} seconds",
+        )
+        self.tenant = tenant
+        self.retry_after = retry_after
+
+
+class ExecutionLimiter:
+    """Caps concurrent executions and the number of callers waiting for one.
+
+    Callers beyond `max_concurrent` wait in FIFO order; once `max_queued`
+    callers are already waiting, further ones are rejected immediately with
+    ExecutorBusyError instead of piling up behind work they will time out on.
+
+    The waiter futures are created lazily on the running loop, so the limiter
+    can be constructed outside of one (the executor is built before uvicorn
+    starts its loop).
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, initial_duration: float):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queued = max(max_queued, 0)
+        self._running = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._rejected = 0
+        self._avg_duration = initial_duration
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold one execution slot for the duration of the block."""
+        async with self.hold(self.reserve(tenant)):
+            yield
+
+    @asynccontextmanager
+    async def hold(self, waiter: Waiter) -> AsyncIterator[None]:
+        """Wait for a reserve()d slot, then hold it for the duration of the block."""
+        await self._wait(waiter)
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        try:
+            yield
+        finally:
+            self._record_duration(loop.time() - started_at)
+            self.release()
+
+    async def acquire(self) -> None:
+        await self._wait(self.reserve())
+
+    def reserve(self, tenant: Optional[str] = None) -> Waiter:
+        """Take a slot now, or a place in the wait queue, without waiting.
+
+        Returns None when a slot was taken, otherwise the future that resolves
+        once one is handed over; pass either to hold(). Lets a caller learn
+        synchronously whether it was admitted (job API) before it waits.
+        `tenant` is ignored: every caller shares one FIFO queue.
+
+        Raises:
+            ExecutorBusyError: every slot is busy and the wait queue is full
+        """
+        if self._running < self.max_concurrent and not self._waiters:
+            self._running += 1
+            return None
+        if len(self._waiters) >= self.max_queued:
+            self._rejected += 1
+            raise ExecutorBusyError(self.retry_after())
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return waiter
+
+    def cancel(self, waiter: Waiter) -> None:
+        """Give back a reserve()d slot or queue place that will not be held."""
+        if waiter is None or (waiter.done() and not waiter.cancelled()):
+            self.release()
+            return
+        waiter.cancel()
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+
+    async def _wait(self, waiter: Waiter) -> None:
+        if waiter is None:
+            return
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before cancellation; pass it on.
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        # Hand the slot straight to the next waiter instead of decrementing, so
+        # a newly arriving caller cannot overtake the queue.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._running -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until a queue position is likely to free up."""
+        waves = (len(self._waiters) + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_duration * waves))
+
+    def stats(self) -> QueueStats:
+        return QueueStats(
+            max_concurrent=self.max_concurrent,
+            max_queued=self.max_queued,
+            running=self._running,
+            queued=len(self._waiters),
+            rejected=self._rejected,
+        )
+
+    def _record_duration(self, seconds: float) -> None:
+        self._avg_duration += _DURATION_EWMA_ALPHA * (seconds - self._avg_duration)
+
+
+@dataclass
+class _Tenant:
+    name: str
+    weight: float
+    budget: float
+    refilled_at: float
+    queue: Deque["asyncio.Future[None]"] = field(default_factory=deque)
+    running: int = 0
+    # Charged CPU-seconds divided by weight, plus the estimates of running
+    # executions (pending): the waiting tenant with the lowest sum gets the
+    # next free slot.
+    virtual_time: float = 0.0
+    pending: float = 0.0
+    cpu_seconds: float = 0.0
+    rejected: int = 0
+
+
+class FairShareLimiter:
+    """ExecutionLimiter with weighted fair queuing between tenants.
+
+    Each tenant waits in its own FIFO queue. A free slot goes to the waiting
+    tenant that has reserved the least CPU time relative to its weight, so
+    one tenant submitting many long executions delays only its own work. A
+    tenant is charged the slot time of its executions times `cpu_per_slot`
+    (the CPU a sandbox may use): what it took from the shared capacity,
+    whether it kept the CPU busy or slept. Running executions count with the
+    average duration until they are released and charged what they used.
+
+    On top of the global bounds, a tenant may hold at most `tenant_max_running`
+    slots and have `tenant_max_queued` executions waiting (0: no limit), and
+    may spend `cpu_budget` CPU-seconds per `budget_window` seconds, refilled
+    continuously (0: no budget). A tenant over budget is rejected with
+    TenantBudgetExceededError until enough of it has refilled.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queued: int,
+        initial_duration: float,
+        cpu_per_slot: float = 1.0,
+        tenant_max_running: int = 0,
+        tenant_max_queued: int = 0,
+        cpu_budget: float = 0.0,
+        budget_window: float = 3600.0,
+        weights: Optional[Mapping[str, float]] = None,
+    ):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queued = max(max_queued, 0)
+        self.cpu_per_slot = cpu_per_slot
+        self.tenant_max_running = tenant_max_running
+        self.tenant_max_queued = tenant_max_queued
+        self.cpu_budget = cpu_budget
+        self.budget_window = max(budget_window, 1.0)
+        self.weights = dict(weights or {})
+        self._running = 0
+        self._queued = 0
+        self._rejected = 0
+        self._avg_duration = initial_duration
+        self._tenants: Dict[str, _Tenant] = {}
+        # Tenant and charged estimate of each handed-over slot, by waiter.
+        self._leases: Dict["asyncio.Future[None]", Tuple[_Tenant, float]] = {}
+        self._owners: Dict["asyncio.Future[None]", _Tenant] = {}
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold one execution slot for the duration of the block."""
+        async with self.hold(self.reserve(tenant)):
+            yield
+
+    @asynccontextmanager
+    async def hold(self, waiter: Waiter) -> AsyncIterator[None]:
+        """Wait for a reserve()d slot, then hold it for the duration of the block."""
+        assert waiter is not None
+        await self._wait(waiter)
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        try:
+            yield
+        finally:
+            self._release(waiter, loop.time() - started_at)
+
+    def reserve(self, tenant: Optional[str] = None) -> Waiter:
+        """Take a slot now, or a place in the tenant's queue, without waiting.
+
+        Always returns a future (already resolved when a slot was taken);
+        pass it to hold(), or give it back with cancel().
+
+        Raises:
+            TenantBudgetExceededError: the tenant has used up its CPU budget
+            ExecutorBusyError: the wait queue, or the tenant's, is full
+        """
+        t = self._tenant(tenant or DEFAULT_TENANT)
+        self._refill(t)
+        if self.cpu_budget > 0 and t.budget <= 0:
+            t.rejected += 1
+            self._rejected += 1
+            rate = self.cpu_budget / self.budget_window
+            self._forget_if_idle(t)
+            raise TenantBudgetExceededError(t.name, math.ceil(-t.budget / rate) + 1)
+
+        if not t.running and not t.queue:
+            # Returning from idle: no credit for the time it was away.
+            active = [
+                other.virtual_time
+                for other in self._tenants.values()
+                if other is not t and (other.running or other.queue)
+            ]
+            if active:
+                t.virtual_time = max(t.virtual_time, min(active))
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._owners[waiter] = t
+        if self._running < self.max_concurrent and self._eligible(t):
+            self._start(t, waiter)
+            return waiter
+        if self._queued >= self.max_queued or (
+            self.tenant_max_queued > 0 and len(t.queue) >= self.tenant_max_queued
+        ):
+            del self._owners[waiter]
+            t.rejected += 1
+            self._rejected += 1
+            self._forget_if_idle(t)
+            raise ExecutorBusyError(self.retry_after())
+        t.queue.append(waiter)
+        self._queued += 1
+        return waiter
+
+    def cancel(self, waiter: Waiter) -> None:
+        """Give back a reserve()d slot or queue place that will not be held."""
+        if waiter is None:
+            return
+        if waiter in self._leases:
+            self._release(waiter, 0.0)
+            return
+        waiter.cancel()
+        self._dequeue(waiter)
+
+    def retry_after(self) -> int:
+        """Seconds until a queue position is likely to free up."""
+        waves = (self._queued + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_duration * waves))
+
+    def stats(self) -> QueueStats:
+        now = time.monotonic()
+        tenants = []
+        for t in sorted(self._tenants.values(), key=lambda t: t.name):
+            self._refill(t, now)
+            tenants.append(
+                TenantQueueStats(
+                    tenant=t.name,
+                    weight=t.weight,
+                    running=t.running,
+                    queued=len(t.queue),
+                    rejected=t.rejected,
+                    cpu_seconds=round(t.cpu_seconds, 3),
+                    budget_remaining=(
+                        round(t.budget, 3) if self.cpu_budget > 0 else None
+                    ),
+                )
+            )
+        return QueueStats(
+            max_concurrent=self.max_concurrent,
+            max_queued=self.max_queued,
+            running=self._running,
+            queued=self._queued,
+            rejected=self._rejected,
+            tenants=tenants,
+        )
+
+    async def _wait(self, waiter: "asyncio.Future[None]") -> None:
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in self._leases:
+                # The slot was handed over just before cancellation; pass it on.
+                self._release(waiter, 0.0)
+            else:
+                self._dequeue(waiter)
+            raise
+
+    def _tenant(self, name: str) -> _Tenant:
+        t = self._tenants.get(name)
+        if t is None:
+            t = _Tenant(
+                name=name,
+                weight=max(self.weights.get(name, 1.0), 0.01),
+                budget=self.cpu_budget,
+                refilled_at=time.monotonic(),
+            )
+            self._tenants[name] = t
+        return t
+
+    def _refill(self, t: _Tenant, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        if self.cpu_budget > 0:
+            rate = self.cpu_budget / self.budget_window
+            t.budget = min(self.cpu_budget, t.budget + (now - t.refilled_at) * rate)
+        t.refilled_at = now
+
+    def _eligible(self, t: _Tenant) -> bool:
+        return self.tenant_max_running <= 0 or t.running < self.tenant_max_running
+
+    def _start(self, t: _Tenant, waiter: "asyncio.Future[None]") -> None:
+        estimate = self._avg_duration * self.cpu_per_slot
+        t.running += 1
+        t.pending += estimate
+        self._running += 1
+        self._leases[waiter] = (t, estimate)
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _release(self, waiter: "asyncio.Future[None]", seconds: float) -> None:
+        t, estimate = self._leases.pop(waiter)
+        self._owners.pop(waiter, None)
+        charged = seconds * self.cpu_per_slot
+        t.running -= 1
+        t.pending -= estimate
+        t.virtual_time += charged / t.weight
+        t.cpu_seconds += charged
+        self._refill(t)
+        t.budget -= charged
+        self._running -= 1
+        if seconds > 0:
+            self._avg_duration += _DURATION_EWMA_ALPHA * (seconds - self._avg_duration)
+        self._dispatch()
+        self._forget_if_idle(t)
+
+    def _dequeue(self, waiter: "asyncio.Future[None]") -> None:
+        t = self._owners.pop(waiter, None)
+        if t is not None and waiter in t.queue:
+            t.queue.remove(waiter)
+            self._queued -= 1
+            self._forget_if_idle(t)
+
+    def _dispatch(self) -> None:
+        # Hand free slots straight to waiters, lowest virtual time first, so
+        # a newly arriving caller cannot overtake the queues.
+        while self._running < self.max_concurrent:
+            waiting = [
+                t for t in self._tenants.values() if t.queue and self._eligible(t)
+            ]
+            if not waiting:
+                return
+            t = min(waiting, key=lambda t: t.virtual_time + t.pending / t.weight)
+            waiter = t.queue.popleft()
+            self._queued -= 1
+            if waiter.done():
+                self._owners.pop(waiter, None)
+                continue
+            self._start(t, waiter)
+
+    def _forget_if_idle(self, t: _Tenant) -> None:
+        # Tenants come and go; only those with work or a budget in use are
+        # kept, a returning tenant starts level with the active ones anyway.
+        if t.running or t.queue or (self.cpu_budget > 0 and t.budget < self.cpu_budget):
+            return
+        if self._tenants.get(t.name) is t:
+            del self._tenants[t.name]
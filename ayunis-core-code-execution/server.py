@@ -1,15 +1,44 @@
 """FastAPI server for Python code execution service."""
+import asyncio
+import json
 import logging
+import mimetypes
+import os
+import uuid
 from contextlib import asynccontextmanager
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, Query, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 
-from models import ExecutionRequest, ExecutionResponse, HealthResponse
+import metrics
+
+from compression import CompressionMiddleware
+from models import (
+    BatchExecutionRequest,
+    BatchExecutionResponse,
+    ExecutionEvent,
+    ExecutionMetrics,
+    ExecutionRequest,
+    ExecutionResponse,
+    ExecutionStatus,
+    ExecutorConfig,
+    ExecutorStats,
+    HealthResponse,
+    SessionCreateRequest,
+    SessionExecuteRequest,
+    SessionInfo,
+)
+from executor import BatchTooLargeError, InputFile
+from file_cache import UnknownFileReferenceError
+from jobs import JobNotFoundError
+from scheduling import ExecutorBusyError
+from sessions import SessionLimitError, SessionNotFoundError
 
 if TYPE_CHECKING:
-    from executor import PythonExecutor
+    from executor import ExecutionResult, PythonExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +50,27 @@ executor_instance: Optional['PythonExecutor'] = None
 async def lifespan(app: FastAPI):
     """Handle application startup and shutdown."""
     logger.info("Starting up Python executor service...")
-    # Startup logic here if needed
+    reaper_task: Optional[asyncio.Task] = None
+    if executor_instance is not None and executor_instance.config.reaper_interval > 0:
+        reaper_task = asyncio.create_task(
+            _reap_periodically(executor_instance.config.reaper_interval)
+        )
     yield
-    # Cleanup logic here if needed
     logger.info("Shutting down Python executor service...")
+    if reaper_task is not None:
+        reaper_task.cancel()
+    if executor_instance is not None:
+        # Idle pooled sandboxes would otherwise outlive the service
+        executor_instance.close()
+
+
+async def _reap_periodically(interval: float) -> None:
+    """Sweep orphaned sandbox resources at startup and every `interval` s."""
+    loop = asyncio.get_running_loop()
+    while True:
+        if executor_instance is not None:
+            await loop.run_in_executor(None, executor_instance.reap_orphans)
+        await asyncio.sleep(interval)
 
 
 # Create FastAPI app
@@ -43,19 +89,51 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Configure as needed for production
     allow_credentials=True,
-    allow_methods=["GET", "POST"],
+    allow_methods=["GET", "POST", "DELETE"],
     allow_headers=["*"],
 )
 
 
+def _compression_settings() -> Tuple[int, int]:
+    """Response size threshold and decompressed request cap, from config."""
+    config = (
+        executor_instance.config
+        if executor_instance is not None
+        else ExecutorConfig()
+    )
+    return config.compression_min_bytes, config.max_decompressed_body_bytes
+
+
+# gzip/zstd in both directions on the endpoints that carry files and outputs
+app.add_middleware(
+    CompressionMiddleware,
+    paths=("/execute", "/executions", "/sessions"),
+    settings=_compression_settings,
+)
+
+
 def set_executor(executor: 'PythonExecutor') -> None:
     """Set the global executor instance."""
     global executor_instance
     executor_instance = executor
+    metrics.set_stats_source(executor.stats)
+
+
+def _server_timing(execution_metrics: Optional[ExecutionMetrics]) -> Dict[str, str]:
+    """Server-Timing header with the execution's phases and total, if measured."""
+    if execution_metrics is None:
+        return {}
+    entries = [
+        f"{phase};dur={ms:.1f}" for phase, ms in execution_metrics.phases_ms.items()
+    ]
+    entries.append(f"total;dur={execution_metrics.total_ms:.1f}")
+    return {"Server-Timing": ", ".join(entries)}
 
 
 @app.post("/execute", response_model=ExecutionResponse)
-async def execute_code(request: ExecutionRequest) -> ExecutionResponse:
+async def execute_code(
+    request: ExecutionRequest, response: Response
+) -> ExecutionResponse:
     """Execute Python code in a sandboxed container."""
     if executor_instance is None:
         raise HTTPException(status_code=500, detail="Executor not initialized")
@@ -64,12 +142,362 @@ async def execute_code(request: ExecutionRequest) -> ExecutionResponse:
         logger.info("Executing code request")
         result = await executor_instance.execute(request)
         logger.info(f"Code execution completed: {result.execution_id}")
+        response.headers.update(_server_timing(result.metrics))
         return result
+    except ExecutorBusyError as e:
+        logger.warning(f"Code execution rejected: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except UnknownFileReferenceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Code execution error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/execute/batch", response_model=BatchExecutionResponse)
+async def execute_batch(request: BatchExecutionRequest) -> BatchExecutionResponse:
+    """Run several independent snippets in one call.
+
+    Snippets run in parallel, each in its own sandbox, up to the executor's
+    concurrency; results are returned in request order. A snippet that fails
+    does not affect the others. The whole batch gets 429 only when not even
+    its first snippet can be admitted.
+    """
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        logger.info(f"Executing batch of {len(request.executions)} snippets")
+        results = await executor_instance.execute_batch(request.executions)
+        return BatchExecutionResponse(results=results)
+    except ExecutorBusyError as e:
+        logger.warning(f"Batch execution rejected: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except (BatchTooLargeError, UnknownFileReferenceError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch execution error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post(
+    "/execute/stream",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "NDJSON stream of ExecutionEvent objects",
+            "content": {"application/x-ndjson": {}},
+        }
+    },
+)
+async def execute_code_stream(request: ExecutionRequest) -> StreamingResponse:
+    """Execute Python code, streaming stdout/stderr while it runs.
+
+    Each line is one ExecutionEvent: "started", then "stdout"/"stderr" chunks
+    as they are produced, then a final "result" with the exit code and output
+    files. Disconnecting stops the execution.
+    """
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    events = executor_instance.execute_stream(request)
+    try:
+        # Admission happens on the first event, so a full queue can still be
+        # answered with a proper 429 before the stream starts.
+        started = await events.__anext__()
+    except ExecutorBusyError as e:
+        logger.warning(f"Code execution rejected: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except UnknownFileReferenceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Streaming code execution started: {started.execution_id}")
+
+    async def ndjson() -> AsyncIterator[str]:
+        event: Optional[ExecutionEvent] = started
+        try:
+            while event is not None:
+                yield event.model_dump_json(exclude_none=True) + "\n"
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            logger.info(f"Streaming code execution completed: {started.execution_id}")
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def _upload_to_input(upload: UploadFile) -> InputFile:
+    """Wrap an uploaded part for staging without reading it into memory."""
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    return InputFile(
+        name=os.path.basename(upload.filename or "upload"),
+        size=size,
+        fileobj=upload.file,  # type: ignore[arg-type]
+    )
+
+
+async def _multipart_body(
+    result: "ExecutionResult", boundary: str
+) -> AsyncIterator[bytes]:
+    """The response as multipart/mixed: JSON result first, then one part per file."""
+    delimiter = f"--{boundary}\r\n".encode()
+    yield delimiter
+    yield b"Content-Type: application/json\r\n\r\n"
+    yield result.response.model_dump_json().encode("utf-8")
+    yield b"\r\n"
+    for name, content in result.artifacts.items():
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        quoted = name.replace("\\", "\\\\").replace('"', '\\"')
+        yield delimiter
+        yield (
+            f"Content-Type: {content_type}\r\n"
+            f'Content-Disposition: attachment; filename="{quoted}"\r\n'
+            f"Content-Length: {len(content)}\r\n\r\n"
+        ).encode("utf-8")
+        yield content
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+@app.post(
+    "/execute/multipart",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": (
+                "multipart/mixed: an application/json ExecutionResponse part, "
+                "then one binary part per output file"
+            ),
+            "content": {"multipart/mixed": {}},
+        }
+    },
+)
+async def execute_code_multipart(
+    code: str = Form(..., description="Python code to execute"),
+    files: List[UploadFile] = File(
+        default=[], description="Input files, staged into files/ by filename"
+    ),
+    file_refs: Optional[str] = Form(
+        default=None,
+        description='JSON object {"filename": "<sha256>"} of already cached files',
+    ),
+    tenant_id: Optional[str] = Form(
+        default=None, max_length=128, description="Tenant for fair scheduling"
+    ),
+) -> StreamingResponse:
+    """Execute Python code with binary file upload and download.
+
+    Input files are sent as multipart parts instead of base64 in JSON and are
+    streamed into the sandbox workspace. Every file the code writes to
+    output/ (plots, parquet, xlsx, ...) is returned as a binary part.
+    """
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    refs: Optional[dict] = None
+    if file_refs:
+        try:
+            refs = json.loads(file_refs)
+        except ValueError:
+            refs = None
+        if not isinstance(refs, dict) or not all(
+            isinstance(v, str) for v in refs.values()
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="file_refs must be a JSON object of filename to SHA-256",
+            )
+
+    try:
+        logger.info("Executing multipart code request")
+        result = await executor_instance.execute_with_artifacts(
+            code, [_upload_to_input(upload) for upload in files], refs, tenant_id
+        )
+        logger.info(f"Code execution completed: {result.response.execution_id}")
+    except ExecutorBusyError as e:
+        logger.warning(f"Code execution rejected: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except UnknownFileReferenceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Code execution error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    boundary = uuid.uuid4().hex
+    return StreamingResponse(
+        _multipart_body(result, boundary),
+        media_type=f"multipart/mixed; boundary={boundary}",
+        headers=_server_timing(result.response.metrics),
+    )
+
+
+def _session_error(e: Exception) -> HTTPException:
+    """Map session and admission errors to their HTTP status."""
+    if isinstance(e, SessionNotFoundError):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, ExecutorBusyError):
+        logger.warning(f"Session request rejected: {e}")
+        return HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if isinstance(e, SessionLimitError):
+        logger.warning(f"Session request rejected: {e}")
+        return HTTPException(status_code=429, detail=str(e))
+    if isinstance(e, UnknownFileReferenceError):
+        return HTTPException(status_code=400, detail=str(e))
+    logger.error(f"Session error: {e}")
+    return HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/sessions", response_model=SessionInfo)
+async def create_session(request: SessionCreateRequest) -> SessionInfo:
+    """Open a persistent interpreter session.
+
+    The session keeps one sandboxed interpreter, and its globals, alive
+    between /sessions/{id}/execute calls until it is deleted or has been idle
+    for SESSION_IDLE_TIMEOUT seconds.
+    """
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        session = await executor_instance.create_session(request)
+    except Exception as e:
+        raise _session_error(e)
+    logger.info(f"Session opened: {session.session_id}")
+    return session
+
+
+@app.get("/sessions/{session_id}", response_model=SessionInfo)
+async def get_session(session_id: str) -> SessionInfo:
+    """State of a session, including when it expires."""
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        return executor_instance.get_session(session_id)
+    except Exception as e:
+        raise _session_error(e)
+
+
+@app.post("/sessions/{session_id}/execute", response_model=ExecutionResponse)
+async def execute_in_session(
+    session_id: str, request: SessionExecuteRequest, response: Response
+) -> ExecutionResponse:
+    """Run one step of code in the session's interpreter."""
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        result = await executor_instance.execute_in_session(session_id, request)
+    except Exception as e:
+        raise _session_error(e)
+    logger.info(f"Session {session_id} step completed: {result.execution_id}")
+    response.headers.update(_server_timing(result.metrics))
+    return result
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def close_session(session_id: str) -> Response:
+    """Close a session and remove its sandbox."""
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        await executor_instance.close_session(session_id)
+    except Exception as e:
+        raise _session_error(e)
+    logger.info(f"Session closed: {session_id}")
+    return Response(status_code=204)
+
+
+@app.post("/executions", response_model=ExecutionStatus, status_code=202)
+async def submit_execution(request: ExecutionRequest) -> ExecutionStatus:
+    """Start an execution in the background and return its id immediately.
+
+    Poll GET /executions/{id} (optionally long-polling with ?wait=) for the
+    result, or DELETE it to cancel. Results are kept for
+    JOB_RETENTION_SECONDS after the execution finishes.
+    """
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        status = await executor_instance.submit(request)
+    except ExecutorBusyError as e:
+        logger.warning(f"Code execution rejected: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except UnknownFileReferenceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Execution submitted: {status.execution_id}")
+    return status
+
+
+@app.get("/executions/{execution_id}", response_model=ExecutionStatus)
+async def get_execution(
+    execution_id: str,
+    wait: float = Query(
+        default=0,
+        ge=0,
+        le=60,
+        description="Seconds to wait for the execution to finish before answering",
+    ),
+) -> ExecutionStatus:
+    """Status of a submitted execution, with its result once finished."""
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        return await executor_instance.get_job(execution_id, wait=wait)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/executions/{execution_id}", response_model=ExecutionStatus)
+async def cancel_execution(execution_id: str) -> ExecutionStatus:
+    """Cancel a submitted execution, killing its container if it is running."""
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+
+    try:
+        status = executor_instance.cancel_job(execution_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    logger.info(f"Execution cancelled: {execution_id}")
+    return status
+
+
+@app.get("/metrics", response_class=Response)
+async def prometheus_metrics() -> Response:
+    """Prometheus metrics: per-phase and total duration, peak memory and CPU
+    histograms, plus queue, pool, cache and session state."""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check() -> HealthResponse:
     """Check service health status."""
@@ -92,6 +520,14 @@ async def health_check() -> HealthResponse:
         )
 
 
+@app.get("/stats", response_model=ExecutorStats)
+async def executor_stats() -> ExecutorStats:
+    """Runtime statistics (warm pool hits/misses, refill latency)."""
+    if executor_instance is None:
+        raise HTTPException(status_code=500, detail="Executor not initialized")
+    return executor_instance.stats()
+
+
 @app.get("/")
 async def root():
     """Root endpoint with service information."""
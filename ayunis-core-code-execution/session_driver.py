@@ -0,0 +1,137 @@
+"""Interpreter driver for persistent sessions.
+
+Staged into a session sandbox as its main.py; runs inside the sandbox image,
+so it must only use the standard library.
+
+`python main.py` serves: it keeps one set of globals alive and runs each step
+sent over its unix socket in it, so imports and loaded data survive between
+steps. `python main.py run <file>` is the per-step client, started with docker
+exec: it forwards the step's stdout/stderr to its own and exits with the
+step's exit code, which is what the service reads back.
+
+Frames on the socket are a one-byte tag (o=stdout, e=stderr, x=exit code), a
+4-byte big-endian length and the payload.
+"""
+
+import io
+import os
+import socket
+import struct
+import sys
+import time
+import traceback
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from _typeshed import ReadableBuffer
+
+SOCKET_PATH = os.environ.get("SESSION_SOCKET", "/tmp/session.sock")
+CONNECT_TIMEOUT = 10.0
+
+_HEADER = struct.Struct(">cI")
+
+
+class _FrameWriter(io.RawIOBase):
+    def __init__(self, conn: socket.socket, tag: bytes):
+        self._conn = conn
+        self._tag = tag
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: "ReadableBuffer") -> int:
+        data = bytes(data)
+        if data:
+            self._conn.sendall(_HEADER.pack(self._tag, len(data)) + data)
+        return len(data)
+
+
+def _stream(conn: socket.socket, tag: bytes) -> io.TextIOWrapper:
+    return io.TextIOWrapper(
+        io.BufferedWriter(_FrameWriter(conn, tag)),
+        encoding="utf-8",
+        errors="backslashreplace",
+        write_through=True,
+    )
+
+
+def _run_step(path: str, namespace: dict) -> int:
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        exec(compile(source, path, "exec"), namespace)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def serve() -> None:
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen(1)
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            path = conn.makefile("rb").readline().decode("utf-8").strip()
+            stdout, stderr = _stream(conn, b"o"), _stream(conn, b"e")
+            sys.stdout, sys.stderr = stdout, stderr
+            try:
+                exit_code = _run_step(path, namespace)
+                stdout.flush()
+                stderr.flush()
+            finally:
+                sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+            payload = str(exit_code).encode()
+            try:
+                conn.sendall(_HEADER.pack(b"x", len(payload)) + payload)
+            except OSError:
+                pass
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("session interpreter went away")
+        data += chunk
+    return data
+
+
+def run(path: str) -> int:
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The interpreter may still be starting up right after the session opened.
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            conn.connect(SOCKET_PATH)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    with conn:
+        conn.sendall(path.encode("utf-8") + b"\n")
+        outputs = {b"o": sys.stdout.buffer, b"e": sys.stderr.buffer}
+        while True:
+            tag, size = _HEADER.unpack(_recv_exact(conn, _HEADER.size))
+            payload = _recv_exact(conn, size)
+            if tag == b"x":
+                return int(payload)
+            outputs[tag].write(payload)
+            outputs[tag].flush()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "run":
+        sys.exit(run(sys.argv[2]))
+    serve()
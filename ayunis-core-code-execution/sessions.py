@@ -0,0 +1,217 @@
+"""Persistent interpreter sessions: long-lived sandboxes for multi-step code."""
+
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional
+
+from models import SessionInfo, SessionStats
+from pool import Sandbox
+
+logger = logging.getLogger(__name__)
+
+# Upper bound (seconds) between two idle-session sweeps.
+_REAP_INTERVAL_MAX = 5.0
+
+
+class SessionNotFoundError(Exception):
+    """The session does not exist, expired, or was terminated."""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} not found")
+        self.session_id = session_id
+
+
+class SessionLimitError(Exception):
+    """Raised when max_sessions sessions are already open."""
+
+    def __init__(self, max_sessions: int):
+        super().__init__(
+            f"Session limit reached ({max_sessions} open); close one first"
+            if max_sessions > 0
+            else "Sessions are disabled (MAX_SESSIONS=0)"
+        )
+        self.max_sessions = max_sessions
+
+
+@dataclass
+class Session:
+    """A started sandbox whose interpreter keeps its globals between steps."""
+
+    session_id: str
+    sandbox: Sandbox
+    created_at: float = field(default_factory=time.time)
+    last_used_at: float = field(default_factory=time.time)
+    steps: int = 0
+    closed: bool = False
+    # Serializes steps: one interpreter runs one step at a time.
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def info(self, idle_timeout: float) -> SessionInfo:
+        return SessionInfo(
+            session_id=self.session_id,
+            created_at=self.created_at,
+            last_used_at=self.last_used_at,
+            expires_at=self.last_used_at + idle_timeout,
+            steps=self.steps,
+        )
+
+
+class SessionManager:
+    """Tracks open sessions, caps their number and expires idle ones.
+
+    Sandboxes are opened by the caller-supplied `start` callback (blocking
+    Docker calls, run outside the lock) and torn down with `destroy`. A
+    background thread closes sessions unused for `idle_timeout` seconds; a
+    session in the middle of a step is never reaped.
+    """
+
+    def __init__(
+        self,
+        destroy: Callable[[Sandbox], None],
+        max_sessions: int,
+        idle_timeout: float,
+    ):
+        self._destroy = destroy
+        self.max_sessions = max(max_sessions, 0)
+        self.idle_timeout = idle_timeout
+
+        self._sessions: Dict[str, Session] = {}
+        self._opening = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        self._created = 0
+        self._expired = 0
+
+    def start(self) -> None:
+        """Start the background idle-session reaper."""
+        self._thread = threading.Thread(
+            target=self._reap_loop, name="session-reaper", daemon=True
+        )
+        self._thread.start()
+
+    def open(self, start: Callable[[str], Sandbox]) -> Session:
+        """Reserve a session slot, start its sandbox and register it.
+
+        Raises:
+            SessionLimitError: max_sessions sessions are open or opening
+        """
+        with self._cond:
+            if len(self._sessions) + self._opening >= self.max_sessions:
+                raise SessionLimitError(self.max_sessions)
+            self._opening += 1
+        session_id = uuid.uuid4().hex[:12]
+        try:
+            sandbox = start(session_id)
+        finally:
+            with self._cond:
+                self._opening -= 1
+        session = Session(session_id=session_id, sandbox=sandbox)
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._sessions[session_id] = session
+                self._created += 1
+        if closed:
+            self._destroy(sandbox)
+            raise SessionNotFoundError(session_id)
+        return session
+
+    def get(self, session_id: str) -> Session:
+        with self._cond:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        return session
+
+    @contextmanager
+    def use(self, session_id: str) -> Iterator[Session]:
+        """Hold a session for one step (blocking; call from a worker thread).
+
+        `closed` is only set while holding the session lock or before the
+        session leaves the registry, so it is checked again once the lock is
+        held.
+
+        Raises:
+            SessionNotFoundError: the session is gone, or was closed while
+                waiting for a previous step to finish
+        """
+        session = self.get(session_id)
+        with session.lock:
+            if session.closed:
+                raise SessionNotFoundError(session_id)
+            session.steps += 1
+            try:
+                yield session
+            finally:
+                session.last_used_at = time.time()
+
+    def close(self, session_id: str) -> None:
+        """Terminate a session and destroy its sandbox.
+
+        Raises:
+            SessionNotFoundError: the session does not exist
+        """
+        with self._cond:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                session.closed = True
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        self._destroy(session.sandbox)
+
+    def close_all(self) -> None:
+        """Stop the reaper and terminate every session (service shutdown)."""
+        with self._cond:
+            self._closed = True
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            for session in sessions:
+                session.closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for session in sessions:
+            self._destroy(session.sandbox)
+
+    def stats(self) -> SessionStats:
+        with self._cond:
+            return SessionStats(
+                open=len(self._sessions),
+                max_sessions=self.max_sessions,
+                idle_timeout=self.idle_timeout,
+                created=self._created,
+                expired=self._expired,
+            )
+
+    def _reap_loop(self) -> None:
+        interval = min(max(self.idle_timeout / 2, 0.05), _REAP_INTERVAL_MAX)
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=interval)
+                if self._closed:
+                    return
+                deadline = time.time() - self.idle_timeout
+                idle = []
+                for session in list(self._sessions.values()):
+                    # Taking the lock proves no step is running; a step that
+                    # takes it afterwards sees `closed` and gives up.
+                    if session.last_used_at >= deadline:
+                        continue
+                    if not session.lock.acquire(blocking=False):
+                        continue
+                    try:
+                        session.closed = True
+                    finally:
+                        session.lock.release()
+                    del self._sessions[session.session_id]
+                    self._expired += 1
+                    idle.append(session)
+            for session in idle:
+                logger.info(f"Session {session.session_id} expired after idling")
+                self._destroy(session.sandbox)
@@ -0,0 +1,35 @@
+"""Smoke test of the load benchmark against its stand-in Docker API."""
+
+import importlib.util
+from pathlib import Path
+
+LOAD = Path(__file__).resolve().parent.parent / "benchmarks" / "load.py"
+
+
+def test_load_benchmark_runs_against_the_fake_daemon(capsys) -> None:
+    spec = importlib.util.spec_from_file_location("load_benchmark", LOAD)
+    load = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
+    spec.loader.exec_module(load)  # type: ignore[union-attr]
+
+    rows = load.main(
+        [
+            "--mode=fake",
+            "--concurrency=1,2",
+            "--requests=4",
+            "--payloads=code,stdout-5mb",
+            "--latency-scale=0",
+        ]
+    )
+
+    assert [(r["payload"], r["concurrency"]) for r in rows] == [
+        ("code", 1),
+        ("stdout-5mb", 1),
+        ("code", 2),
+        ("stdout-5mb", 2),
+    ]
+    for row in rows:
+        assert row["failures"] == 0
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"]
+        assert row["per_second"] > 0
+        assert "run" in row["phases_ms"]
+    assert "stdout-5mb" in capsys.readouterr().out
@@ -0,0 +1,53 @@
+"""Tests for bounded output capture."""
+
+from capture import HeadTailBuffer, OutputCapture
+
+
+def test_buffer_under_the_limit_is_kept_verbatim() -> None:
+    buffer = HeadTailBuffer(limit=16)
+    buffer.write(b"hello ")
+    buffer.write(b"world")
+
+    assert buffer.truncated is False
+    assert buffer.text() == "hello world"
+
+
+def test_buffer_keeps_head_and_tail_across_many_writes() -> None:
+    buffer = HeadTailBuffer(limit=6)
+    for i in range(100):
+        buffer.write(str(i % 10).encode())
+
+    assert buffer.truncated is True
+    assert buffer.total == 100
+    assert buffer.text() == "012\n[... 94 bytes truncated ...]\n789"
+
+
+def test_buffer_does_not_split_a_character_at_the_head_tail_boundary() -> None:
+    # "ü" is two bytes, starting at limit // 2: its halves land one in the
+    # head and one in the tail.
+    buffer = HeadTailBuffer(limit=8)
+    buffer.write("abcü12".encode())
+
+    assert buffer.truncated is False
+    assert buffer.text() == "abcü12"
+
+
+def test_buffer_drops_characters_cut_by_truncation() -> None:
+    buffer = HeadTailBuffer(limit=8)
+    buffer.write(("abcü" + "x" * 20 + "ü123").encode())
+
+    assert buffer.truncated is True
+    assert buffer.text() == "abc\n[... 22 bytes truncated ...]\n123"
+
+
+def test_capture_without_keep_holds_nothing_but_forwards_everything() -> None:
+    received: list = []
+    capture = OutputCapture(
+        limit=4, on_output=lambda s, t: received.append((s, t)), keep=False
+    )
+    capture.feed("stdout", b"0123456789")
+    capture.close()
+
+    assert received == [("stdout", "0123456789")]
+    assert capture.text("stdout") == ""
+    assert capture.truncated("stdout") is False
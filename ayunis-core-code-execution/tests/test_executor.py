@@ -6,12 +6,19 @@ sandbox tag is runtime-mutable, so the execution path must tolerate the image
 being deleted after the service has started.
 """
 
+import asyncio
+import io
+import tarfile
+import threading
+import time
+from typing import Any
 from unittest.mock import MagicMock, patch
 
 import docker
 import pytest
 
-from executor import PythonExecutor
+from executor import BatchTooLargeError, InputFile, PythonExecutor, decode_input_files
+from file_cache import UnknownFileReferenceError
 from models import ExecutionRequest, ExecutorConfig
 
 
@@ -77,15 +84,15 @@ async def test_execute_repulls_when_image_deleted_after_construction() -> None:
     helper = MagicMock()
     sandbox = MagicMock()
     sandbox.wait.return_value = {"StatusCode": 0}
-    sandbox.logs.side_effect = lambda stdout, stderr: b"hello\n" if stdout else b""
+    sandbox.attach.return_value = iter([(b"hello\n", None)])
     sandbox.get_archive.side_effect = Exception("no output dir")
 
-    def containers_create(image: str, **_kwargs: object) -> MagicMock:
+    def containers_create(image: str, **kwargs: object) -> MagicMock:
         # Mirror docker-py: create has no implicit pull and fails hard when the
         # tag is absent. Only the per-execution re-ensure can save this path.
         if not state["pulled"]:
             raise docker.errors.ImageNotFound(f"{image} was deleted")
-        return helper if client.containers.create.call_count == 1 else sandbox
+        return helper if kwargs.get("command") == "sleep infinity" else sandbox
 
     client.containers.create.side_effect = containers_create
     client.volumes.create.return_value = MagicMock()
@@ -112,3 +119,587 @@ async def test_execute_fails_gracefully_when_image_unavailable() -> None:
     assert result.success is False
     assert result.exit_code == -1
     client.containers.create.assert_not_called()
+
+
+def _fake_run(client: MagicMock) -> dict:
+    """Return a separate mock per created container, keyed by its command."""
+    created: dict = {}
+
+    def containers_create(image: str, **kwargs: object) -> MagicMock:
+        container = MagicMock()
+        container.wait.return_value = {"StatusCode": 0}
+        container.get_archive.side_effect = Exception("no output dir")
+        created[kwargs.get("command")] = container
+        return container
+
+    client.containers.create.side_effect = containers_create
+    return created
+
+
+@pytest.mark.asyncio
+async def test_direct_staging_copies_workspace_into_sandbox_without_helper() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    created = _fake_run(client)
+
+    result = await executor.execute(ExecutionRequest(code="print(1)"))
+
+    assert result.success is True
+    assert list(created) == ["python /execution/main.py"]
+    sandbox = created["python /execution/main.py"]
+    sandbox.put_archive.assert_called_once()
+    assert sandbox.put_archive.call_args.kwargs["path"] == "/execution"
+    sandbox.exec_run.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_helper_staging_populates_volume_through_helper_container() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(staging_mode="helper"))
+    created = _fake_run(client)
+
+    result = await executor.execute(ExecutionRequest(code="print(1)"))
+
+    assert result.success is True
+    helper = created["sleep infinity"]
+    helper.put_archive.assert_called_once()
+    assert helper.put_archive.call_args.kwargs["path"] == "/mnt"
+    helper.remove.assert_called_once_with(force=True)
+    created["python /execution/main.py"].put_archive.assert_not_called()
+
+
+def test_workspace_tar_entries_are_owned_by_sandbox_user() -> None:
+    executor = _make_executor(MagicMock())
+    data = executor._build_workspace_tar(
+        "print(1)", decode_input_files({"a.csv": "eCx5Cg=="})
+    )
+
+    with tarfile.open(fileobj=data, mode="r:") as tar:
+        members = tar.getmembers()
+    assert {"main.py", "files", "files/a.csv", "output"} <= {m.name for m in members}
+    assert all(m.uid == 1000 and m.gid == 1000 for m in members)
+
+
+@pytest.mark.asyncio
+async def test_execute_runs_docker_calls_off_the_event_loop() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    created = _fake_run(client)
+    release = threading.Event()
+
+    def blocking_create(image: str, **kwargs: object) -> MagicMock:
+        container = MagicMock()
+        container.wait.side_effect = lambda timeout: (
+            release.wait(5) and {"StatusCode": 0}
+        )
+        container.get_archive.side_effect = Exception("no output dir")
+        created[kwargs.get("command")] = container
+        return container
+
+    client.containers.create.side_effect = blocking_create
+
+    running = asyncio.create_task(executor.execute(ExecutionRequest(code="x")))
+    # The loop must keep serving other work while the container "runs".
+    await asyncio.sleep(0.05)
+    assert not running.done()
+    assert executor.stats().queue.running == 1
+    release.set()
+
+    result = await asyncio.wait_for(running, timeout=5)
+    assert result.success is True
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_forwards_demultiplexed_output_then_result() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    created = _fake_run(client)
+
+    def with_output(image: str, **kwargs: object) -> MagicMock:
+        container = MagicMock()
+        # "ü" split across two reads must still arrive intact.
+        container.attach.return_value = iter(
+            [(b"a\xc3", None), (b"\xbc\n", None), (None, b"oops\n")]
+        )
+        container.wait.return_value = {"StatusCode": 0}
+        container.get_archive.side_effect = Exception("no output dir")
+        created[kwargs.get("command")] = container
+        return container
+
+    client.containers.create.side_effect = with_output
+
+    events = [e async for e in executor.execute_stream(ExecutionRequest(code="x"))]
+
+    assert events[0].type == "started"
+    assert [(e.type, e.data) for e in events[1:-1]] == [
+        ("stdout", "a"),
+        ("stdout", "ü\n"),
+        ("stderr", "oops\n"),
+    ]
+    result = events[-1].result
+    assert result is not None and result.exit_code == 0
+    # Streamed output is not also buffered into the final result.
+    assert result.output == ""
+    assert executor.stats().queue.running == 0
+
+
+@pytest.mark.asyncio
+async def test_closing_a_stream_early_kills_the_container_and_frees_the_slot() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(
+            ExecutorConfig(max_concurrent_executions=1, max_queued_executions=1)
+        )
+    killed = threading.Event()
+
+    def endless_output() -> object:
+        yield (b"partial\n", None)
+        killed.wait(5)
+
+    container = MagicMock()
+    container.attach.side_effect = lambda **_kwargs: endless_output()
+    container.kill.side_effect = lambda: killed.set()
+    container.wait.return_value = {"StatusCode": 137}
+    container.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = container
+
+    running = executor.execute_stream(ExecutionRequest(code="x"))
+    queued = executor.execute_stream(ExecutionRequest(code="y"))
+    assert (await running.__anext__()).type == "started"
+    waiting = asyncio.ensure_future(queued.__anext__())
+    await asyncio.sleep(0.05)
+    assert executor.stats().queue.queued == 1
+
+    # Cancelled while queued: the queue place is given back.
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert executor.stats().queue.queued == 0
+    # Closed mid-run: the container is killed and the slot freed.
+    await running.aclose()
+
+    container.kill.assert_called()
+    assert executor.stats().queue.running == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_keeps_its_slot_until_the_worker_thread_is_done() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    finish = threading.Event()
+
+    def stuck_output() -> object:
+        yield (b"partial\n", None)
+        finish.wait(5)
+
+    container = MagicMock()
+    container.attach.side_effect = lambda **_kwargs: stuck_output()
+    container.wait.return_value = {"StatusCode": 137}
+    container.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = container
+
+    async def consume() -> None:
+        async for _ in executor.execute_stream(ExecutionRequest(code="x")):
+            pass
+
+    consumer = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.05)
+    # Cancelled again while it cleans up, as a server tearing down does.
+    consumer.cancel()
+    await asyncio.sleep(0.01)
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    assert executor.stats().queue.running == 1
+
+    finish.set()
+    for _ in range(100):
+        if executor.stats().queue.running == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert executor.stats().queue.running == 0
+
+
+@pytest.mark.asyncio
+async def test_execute_kills_container_on_timeout() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(execution_timeout=0))
+    killed = threading.Event()
+
+    def endless_output() -> object:
+        yield (b"partial\n", None)
+        killed.wait(5)
+
+    sandbox = MagicMock()
+    sandbox.attach.side_effect = lambda **_kwargs: endless_output()
+    sandbox.kill.side_effect = lambda: killed.set()
+    sandbox.wait.return_value = {"StatusCode": 137}
+    sandbox.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = sandbox
+
+    result = await executor.execute(ExecutionRequest(code="while True: pass"))
+
+    sandbox.kill.assert_called()
+    assert result.success is False
+    assert result.exit_code == -1
+    assert result.output == "partial\n"
+    assert "timed out" in result.error
+
+
+def _output_archive(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name=f"output/{name}")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def test_collect_output_files_skips_files_over_the_per_file_cap() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(max_output_file_bytes=10))
+    data = _output_archive({"small.csv": b"a,b\n", "big.csv": b"x" * 11})
+    container = MagicMock()
+    container.get_archive.return_value = (
+        iter([data[i : i + 100] for i in range(0, len(data), 100)]),
+        {},
+    )
+
+    files, omitted = executor._collect_output_files(container)
+
+    assert list(files) == ["small.csv"]
+    assert omitted == ["big.csv"]
+
+
+def test_collect_output_files_stops_reading_at_the_total_cap() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(max_output_total_bytes=10))
+    data = _output_archive({"a.csv": b"x" * 6, "b.csv": b"y" * 6, "c.csv": b"z"})
+    container = MagicMock()
+    container.get_archive.return_value = (iter([data]), {})
+
+    files, omitted = executor._collect_output_files(container)
+
+    assert list(files) == ["a.csv"]
+    assert omitted == ["b.csv"]
+
+
+@pytest.mark.asyncio
+async def test_execute_keeps_head_and_tail_of_oversized_output() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(max_output_bytes=8))
+    sandbox = MagicMock()
+    sandbox.attach.return_value = iter([(b"HEAD" + b"." * 1000 + b"TAIL", None)])
+    sandbox.wait.return_value = {"StatusCode": 0}
+    sandbox.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = sandbox
+
+    result = await executor.execute(ExecutionRequest(code="x"))
+
+    assert result.output_truncated is True
+    assert result.error_truncated is False
+    assert result.output.startswith("HEAD")
+    assert result.output.endswith("TAIL")
+    assert "1000 bytes truncated" in result.output
+
+
+@pytest.mark.asyncio
+async def test_execute_with_artifacts_streams_inputs_and_returns_all_outputs() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    sandbox = MagicMock()
+    sandbox.attach.return_value = iter([])
+    sandbox.wait.return_value = {"StatusCode": 0}
+    png = b"\x89PNG\r\n\x1a\n"
+    sandbox.get_archive.return_value = (
+        iter([_output_archive({"plot.png": png, "table.csv": b"a\n"})]),
+        {},
+    )
+    staged: dict = {}
+
+    def put_archive(path: str, data: object) -> None:
+        with tarfile.open(fileobj=data, mode="r:") as tar:  # type: ignore[arg-type]
+            member = tar.getmember("files/data.bin")
+            staged["data.bin"] = tar.extractfile(member).read()  # type: ignore
+
+    sandbox.put_archive.side_effect = put_archive
+    client.containers.create.return_value = sandbox
+
+    result = await executor.execute_with_artifacts(
+        "x", [InputFile(name="data.bin", size=3, fileobj=io.BytesIO(b"\x00\x01\x02"))]
+    )
+
+    assert staged == {"data.bin": b"\x00\x01\x02"}
+    assert result.artifacts == {"plot.png": png, "table.csv": b"a\n"}
+    assert result.response.output_files is None
+
+
+@pytest.mark.asyncio
+async def test_execute_returns_only_csv_outputs_base64_encoded() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    sandbox = MagicMock()
+    sandbox.attach.return_value = iter([])
+    sandbox.wait.return_value = {"StatusCode": 0}
+    sandbox.get_archive.return_value = (
+        iter([_output_archive({"plot.png": b"png", "table.csv": b"a\n"})]),
+        {},
+    )
+    client.containers.create.return_value = sandbox
+
+    result = await executor.execute(ExecutionRequest(code="x"))
+
+    assert result.output_files == {"table.csv": "YQo="}
+
+
+@pytest.mark.asyncio
+async def test_cached_inputs_are_mounted_read_only_and_linked() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    client.volumes.list.return_value = []
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(
+            ExecutorConfig(file_cache_max_bytes=1000, pool_min_size=1)
+        )
+    try:
+        sandbox = MagicMock()
+        sandbox.attach.return_value = iter([])
+        sandbox.wait.return_value = {"StatusCode": 0}
+        sandbox.get_archive.side_effect = Exception("no output dir")
+        staged: dict = {}
+
+        def put_archive(path: str, data: object) -> None:
+            with tarfile.open(fileobj=data, mode="r:") as tar:  # type: ignore[arg-type]
+                staged.update({m.name: m for m in tar.getmembers()})
+
+        sandbox.put_archive.side_effect = put_archive
+        create_kwargs: list = []
+
+        def create(*_args: object, **kwargs: object) -> MagicMock:
+            create_kwargs.append(kwargs)
+            if kwargs.get("command") == "python /execution/main.py":
+                return sandbox
+            return MagicMock()
+
+        client.containers.create.side_effect = create
+        pool = executor._hosts.primary.pool
+        pool.claim = MagicMock()  # type: ignore[union-attr,method-assign]
+
+        first = await executor.execute(
+            ExecutionRequest(code="x", files={"a.csv": "YQo="})
+        )
+        digest = first.file_hashes["a.csv"]  # type: ignore[index]
+        second = await executor.execute(
+            ExecutionRequest(code="x", file_refs={"b.csv": digest})
+        )
+
+        assert first.success and second.success
+        link = staged["files/b.csv"]
+        assert link.issym() and link.linkname == f"/cas/{digest}/data"
+        assert create_kwargs[-1]["volumes"][f"exec-cas-{digest}"] == {
+            "bind": f"/cas/{digest}",
+            "mode": "ro",
+        }
+        # Mounts are fixed at create time, so cached inputs bypass the pool.
+        pool.claim.assert_not_called()  # type: ignore[union-attr]
+        assert executor.stats().file_cache.hits == 1  # type: ignore[union-attr]
+    finally:
+        executor.close()
+
+
+@pytest.mark.asyncio
+async def test_unknown_file_reference_is_rejected_before_queueing() -> None:
+    executor = _make_executor(MagicMock())
+
+    with pytest.raises(UnknownFileReferenceError):
+        await executor.execute(ExecutionRequest(code="x", file_refs={"a": "0" * 64}))
+
+
+@pytest.mark.asyncio
+async def test_execute_reports_phase_timings_and_sampled_resources() -> None:
+    client = MagicMock()
+    executor = _make_executor(client)
+    sandbox = MagicMock()
+    sandbox.attach.return_value = iter([(b"ok\n", None)])
+    sandbox.wait.return_value = {"StatusCode": 0}
+    sandbox.get_archive.side_effect = Exception("no output dir")
+    sandbox.stats.return_value = iter(
+        [
+            {
+                "memory_stats": {"usage": 50_000_000},
+                "cpu_stats": {"cpu_usage": {"total_usage": 2_000_000}},
+            },
+            {
+                "memory_stats": {"usage": 30_000_000},
+                "cpu_stats": {"cpu_usage": {"total_usage": 9_000_000}},
+            },
+        ]
+    )
+    client.containers.create.return_value = sandbox
+
+    result = await executor.execute(ExecutionRequest(code="print('ok')"))
+
+    assert result.metrics is not None
+    assert list(result.metrics.phases_ms) == [
+        "queue",
+        "build_tar",
+        "image_check",
+        "create",
+        "stage",
+        "start",
+        "run",
+        "collect_outputs",
+        "cleanup",
+    ]
+    assert result.metrics.total_ms >= sum(result.metrics.phases_ms.values()) - 1
+    assert result.metrics.peak_memory_bytes == 50_000_000
+    assert result.metrics.cpu_time_ms == 9.0
+    sandbox.stats.assert_called_once_with(stream=True, decode=True)
+
+
+@pytest.mark.asyncio
+async def test_create_image_not_found_invalidates_cache_and_retries() -> None:
+    """With presence cached (no per-request lookup), a tag deleted without an
+    event reaching us yet is caught by containers.create and re-pulled."""
+    client = MagicMock()
+    executor = _make_executor(client)
+    # Freeze the manager in the "watched and present" state.
+    images = executor._hosts.primary.images
+    images.close()
+    images._thread.join(timeout=2)  # type: ignore[union-attr]
+    images._present = True
+    images._watching = True
+    client.images.get.reset_mock()
+
+    sandbox = MagicMock()
+    sandbox.wait.return_value = {"StatusCode": 0}
+    sandbox.attach.return_value = iter([])
+    sandbox.get_archive.side_effect = Exception("no output dir")
+    client.images.get.side_effect = docker.errors.ImageNotFound("deleted")
+    client.containers.create.side_effect = [
+        docker.errors.ImageNotFound("deleted"),
+        sandbox,
+    ]
+
+    result = await executor.execute(ExecutionRequest(code="x"))
+
+    assert result.success is True
+    client.images.pull.assert_called_once_with("python-sandbox:latest")
+    assert client.containers.create.call_count == 2
+
+
+def _echo_code_containers(client: MagicMock) -> dict:
+    """Containers that print the code staged into them; tracks concurrency."""
+    state = {"running": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def containers_create(*_args: object, **kwargs: object) -> MagicMock:
+        container = MagicMock()
+        staged: dict = {}
+
+        def put_archive(path: str, data: object) -> None:
+            with tarfile.open(fileobj=data, mode="r:") as tar:  # type: ignore[arg-type]
+                if "main.py" in tar.getnames():
+                    main = tar.extractfile("main.py")
+                    assert main is not None
+                    staged["code"] = main.read()
+
+        def attach(**_kwargs: object) -> object:
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.02)
+            yield (staged["code"], None)
+            with lock:
+                state["running"] -= 1
+
+        container.put_archive.side_effect = put_archive
+        container.attach.side_effect = attach
+        container.wait.return_value = {"StatusCode": 0}
+        container.get_archive.side_effect = Exception("no output dir")
+        return container
+
+    client.containers.create.side_effect = containers_create
+    return state
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_runs_in_parallel_within_budget_and_keeps_order() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(
+            ExecutorConfig(max_concurrent_executions=2, max_queued_executions=0)
+        )
+    state = _echo_code_containers(client)
+    tenants: list = []
+    execute_blocking = executor._execute_blocking
+
+    def record_tenant(job: Any) -> Any:
+        tenants.append(job.tenant_id)
+        return execute_blocking(job)
+
+    executor._execute_blocking = record_tenant  # type: ignore[method-assign]
+
+    results = await executor.execute_batch(
+        [ExecutionRequest(code=f"snippet {i}", tenant_id="t1") for i in range(5)]
+    )
+
+    assert [r.output for r in results] == [f"snippet {i}" for i in range(5)]
+    assert len({r.execution_id for r in results}) == 5
+    assert tenants == ["t1"] * 5
+    # Never more than the concurrency budget, even with no wait queue at all.
+    assert state["peak"] == 2
+    assert executor.stats().queue.running == 0
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_caches_shared_input_files_once() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    client.volumes.list.return_value = []
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(file_cache_max_bytes=1000))
+    try:
+        _echo_code_containers(client)
+        shared = {"data.csv": "YQo="}
+
+        results = await executor.execute_batch(
+            [
+                ExecutionRequest(code="one", files=shared),
+                ExecutionRequest(code="two", files=shared),
+            ]
+        )
+
+        assert all(r.success for r in results)
+        cas_volumes = [
+            c.kwargs["name"]
+            for c in client.volumes.create.call_args_list
+            if c.kwargs["name"].startswith("exec-cas-")
+        ]
+        assert len(cas_volumes) == 1
+        stats = executor.stats().file_cache
+        assert stats is not None and stats.entries == 1
+    finally:
+        executor.close()
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_rejects_oversized_batches() -> None:
+    executor = _make_executor(MagicMock())
+    executor.config.max_batch_size = 1
+
+    with pytest.raises(BatchTooLargeError):
+        await executor.execute_batch(
+            [ExecutionRequest(code="1"), ExecutionRequest(code="2")]
+        )
@@ -0,0 +1,127 @@
+"""Tests for the content-addressed input file cache, against a mocked docker client."""
+
+import hashlib
+import io
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from file_cache import DIGEST_LABEL, SIZE_LABEL, InputFileCache, file_digest
+
+
+def _cache(
+    client: MagicMock, max_bytes: int = 1000, max_entries: int = 10
+) -> InputFileCache:
+    client.containers.create.side_effect = lambda *_a, **_k: MagicMock()
+    client.volumes.create.side_effect = lambda *_a, **_k: MagicMock()
+    return InputFileCache(client, "python-sandbox:latest", max_bytes, max_entries)
+
+
+def _put(cache: InputFileCache, content: bytes) -> str:
+    digest, size = file_digest(io.BytesIO(content))
+    cache.put(digest, size, io.BytesIO(content))
+    return digest
+
+
+def test_file_digest_hashes_and_rewinds() -> None:
+    f = io.BytesIO(b"hello")
+
+    digest, size = file_digest(f)
+
+    assert digest == hashlib.sha256(b"hello").hexdigest()
+    assert size == 5
+    assert f.read() == b"hello"
+
+
+def test_put_writes_read_only_file_into_labelled_volume() -> None:
+    client = MagicMock()
+    cache = _cache(client)
+    writer = MagicMock()
+    staged: dict = {}
+
+    def put_archive(path: str, data: object) -> None:
+        with tarfile.open(fileobj=data, mode="r:") as tar:  # type: ignore[arg-type]
+            member = tar.getmember("data")
+            staged.update(path=path, mode=member.mode, uid=member.uid)
+            staged["content"] = tar.extractfile(member).read()  # type: ignore
+
+    writer.put_archive.side_effect = put_archive
+    client.containers.create.side_effect = None
+    client.containers.create.return_value = writer
+
+    digest = _put(cache, b"a,b\n1,2\n")
+
+    _, kwargs = client.volumes.create.call_args
+    assert kwargs["labels"] == {DIGEST_LABEL: digest, SIZE_LABEL: "8"}
+    assert staged == {
+        "path": "/cas",
+        "mode": 0o444,
+        "uid": 1000,
+        "content": b"a,b\n1,2\n",
+    }
+    writer.start.assert_not_called()
+    writer.remove.assert_called_once_with(force=True)
+
+
+def test_acquire_counts_hits_and_misses() -> None:
+    cache = _cache(MagicMock())
+    digest = _put(cache, b"x")
+    cache.release([digest])
+
+    assert cache.acquire("0" * 64) is None
+    entry = cache.acquire(digest)
+
+    assert entry is not None and entry.data_path == f"/cas/{digest}/data"
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries, stats.bytes) == (1, 1, 1, 1)
+
+
+def test_eviction_skips_pinned_entries_and_removes_lru_volume() -> None:
+    client = MagicMock()
+    cache = _cache(client, max_bytes=10)
+    first = _put(cache, b"a" * 6)
+    second = _put(cache, b"b" * 6)
+
+    # Both still pinned: over the byte bound, but nothing may be removed.
+    assert cache.stats().entries == 2
+
+    cache.release([first, second])
+
+    assert cache.missing([first, second]) == [first]
+    client.volumes.get.assert_called_once_with(f"exec-cas-{first}")
+    assert cache.stats().evictions == 1
+
+
+def test_failed_write_removes_volume_and_is_not_cached() -> None:
+    client = MagicMock()
+    cache = _cache(client)
+    volume = MagicMock()
+    client.volumes.create.side_effect = None
+    client.volumes.create.return_value = volume
+    writer = MagicMock()
+    writer.put_archive.side_effect = RuntimeError("disk full")
+    client.containers.create.side_effect = None
+    client.containers.create.return_value = writer
+
+    with pytest.raises(RuntimeError):
+        _put(cache, b"x")
+
+    writer.remove.assert_called_once_with(force=True)
+    volume.remove.assert_called_once_with(force=True)
+    assert cache.stats().entries == 0
+
+
+def test_load_rebuilds_index_from_labelled_volumes() -> None:
+    client = MagicMock()
+    volume = MagicMock()
+    volume.name = "exec-cas-abc"
+    volume.attrs = {"Labels": {DIGEST_LABEL: "abc", SIZE_LABEL: "42"}}
+    client.volumes.list.return_value = [volume]
+    cache = _cache(client)
+
+    cache.load()
+
+    client.volumes.list.assert_called_once_with(filters={"label": DIGEST_LABEL})
+    assert cache.missing(["abc", "def"]) == ["def"]
+    assert cache.stats().bytes == 42
@@ -0,0 +1,48 @@
+"""Tests for the sandbox image's preloading launcher (sandbox/forkserver.py)."""
+
+import importlib.util
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+FORKSERVER = Path(__file__).resolve().parent.parent / "sandbox" / "forkserver.py"
+
+
+@pytest.fixture
+def forkserver(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    spec = importlib.util.spec_from_file_location("forkserver", FORKSERVER)
+    module = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
+    spec.loader.exec_module(module)  # type: ignore[union-attr]
+    monkeypatch.setattr(module, "WORKSPACE", str(tmp_path))
+    monkeypatch.setattr(module, "MAIN", str(tmp_path / "main.py"))
+    monkeypatch.setattr(module, "SENTINEL", str(tmp_path / ".start"))
+    monkeypatch.setattr(module, "PRELOAD", "json, no_such_module_xyz")
+    monkeypatch.setattr(sys, "argv", list(sys.argv))
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    return module
+
+
+def test_runs_main_only_after_sentinel_with_preloaded_modules(
+    forkserver, tmp_path: Path
+) -> None:
+    (tmp_path / "main.py").write_text(
+        "import sys\n"
+        "open(__file__ + '.out', 'w').write("
+        "f\"{__name__} {sys.argv[0]} {'json' in sys.modules}\")\n"
+    )
+    runner = threading.Thread(target=forkserver.main)
+    runner.start()
+    time.sleep(0.05)
+
+    # Staged, but the sentinel (last tar entry) is not there yet.
+    assert runner.is_alive()
+    assert (tmp_path / ".config" / "matplotlib").is_dir()
+
+    (tmp_path / ".start").touch()
+    runner.join(timeout=5)
+
+    out = (tmp_path / "main.py.out").read_text()
+    assert out == f"__main__ {tmp_path / 'main.py'} True"
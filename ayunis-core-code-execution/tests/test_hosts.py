@@ -0,0 +1,116 @@
+"""Tests for scheduling executions across several Docker hosts."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from executor import PythonExecutor
+from hosts import DockerHost, HostScheduler
+from models import ExecutionRequest, ExecutorConfig
+
+
+def _host(name: str) -> DockerHost:
+    return DockerHost(name=name, client=MagicMock(), images=MagicMock())
+
+
+def test_least_loaded_host_is_picked() -> None:
+    fast, slow = _host("fast"), _host("slow")
+    scheduler = HostScheduler([slow, fast], failure_threshold=3, cooldown=30)
+    scheduler.record_success(fast, 0.1)
+    scheduler.record_success(slow, 1.0)
+
+    placed = [scheduler.acquire() for _ in range(4)]
+
+    # Three on the fast daemon cost less than a second one on the slow one.
+    assert [h.name for h in placed] == ["fast", "fast", "fast", "fast"]
+    assert fast.running == 4
+    for host in placed:
+        scheduler.release(host)
+    scheduler.record_success(fast, 5.0)  # the daemon slows down: load shifts
+    assert scheduler.acquire().name == "slow"
+
+
+def test_failing_host_leaves_rotation_until_the_cooldown_passes() -> None:
+    a, b = _host("a"), _host("b")
+    scheduler = HostScheduler([a, b], failure_threshold=2, cooldown=30)
+
+    with patch("hosts.time.monotonic", return_value=100.0):
+        scheduler.record_failure(a)
+        assert scheduler.stats()[0].available is True
+        scheduler.record_failure(a)
+        assert scheduler.stats()[0].available is False
+        assert {scheduler.acquire().name for _ in range(3)} == {"b"}
+
+    with patch("hosts.time.monotonic", return_value=131.0):
+        # Back in rotation as a probe; idle, so it gets the next execution.
+        assert scheduler.acquire().name == "a"
+        scheduler.record_failure(a)
+        assert scheduler.stats()[0].available is False
+
+
+def test_eligible_hosts_are_preferred_and_down_hosts_still_probed() -> None:
+    a, b = _host("a"), _host("b")
+    scheduler = HostScheduler([a, b], failure_threshold=1, cooldown=30)
+
+    assert scheduler.acquire(lambda h: h is b) is b
+    scheduler.record_failure(a)
+    scheduler.record_failure(b)
+    # Nothing available: the host due back first is tried rather than failing.
+    assert scheduler.acquire() is a
+
+
+def _client(image_id: str) -> MagicMock:
+    client = MagicMock()
+    client.images.get.return_value = MagicMock(id=image_id)
+    container = MagicMock()
+    container.attach.side_effect = lambda **_kwargs: iter([(b"ok\n", None)])
+    container.wait.return_value = {"StatusCode": 0}
+    container.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = container
+    return client
+
+
+@pytest.mark.asyncio
+async def test_executions_move_off_a_failing_host() -> None:
+    clients = {"tcp://a:2375": _client("sha256:1"), "tcp://b:2375": _client("sha256:1")}
+    with patch("docker.DockerClient", side_effect=lambda base_url: clients[base_url]):
+        executor = PythonExecutor(
+            ExecutorConfig(
+                docker_hosts=list(clients),
+                host_failure_threshold=1,
+            )
+        )
+    try:
+        a, b = clients.values()
+        assert (await executor.execute(ExecutionRequest(code="1"))).success
+        assert a.containers.create.call_count == 1
+
+        a.containers.create.side_effect = Exception("daemon unreachable")
+        failed = await executor.execute(ExecutionRequest(code="1"))
+        assert failed.success is False and "unreachable" in failed.error
+        stats = {h.name: h for h in executor.stats().hosts}
+        assert stats["tcp://a:2375"].available is False
+        assert stats["tcp://b:2375"].available is True
+
+        assert (await executor.execute(ExecutionRequest(code="1"))).success
+        assert b.containers.create.call_count == 1
+        assert all(h.running == 0 for h in executor.stats().hosts)
+    finally:
+        executor.close()
+
+
+def test_executor_stats_sum_the_file_caches_of_all_hosts() -> None:
+    clients = {"tcp://a:2375": _client("sha256:1"), "tcp://b:2375": _client("sha256:1")}
+    for client in clients.values():
+        client.volumes.list.return_value = []
+    with patch("docker.DockerClient", side_effect=lambda base_url: clients[base_url]):
+        executor = PythonExecutor(
+            ExecutorConfig(docker_hosts=list(clients), file_cache_max_bytes=1000)
+        )
+    try:
+        stats = executor.stats()
+        per_host = [h.file_cache for h in stats.hosts]
+        assert [c.max_bytes for c in per_host if c] == [1000, 1000]
+        assert stats.file_cache is not None and stats.file_cache.max_bytes == 2000
+    finally:
+        executor.close()
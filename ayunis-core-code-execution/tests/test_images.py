@@ -0,0 +1,147 @@
+"""Tests for the event-driven sandbox image presence cache."""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator, List
+from unittest.mock import MagicMock
+
+import docker
+import pytest
+
+from images import SandboxImageManager
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+class _EventStream:
+    """Stands in for docker-py's blocking events stream."""
+
+    def __init__(self) -> None:
+        self._events: "queue.Queue[Any]" = queue.Queue()
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            yield event
+
+    def emit(self, action: str) -> None:
+        self._events.put({"Type": "image", "Action": action})
+
+    def close(self) -> None:
+        self._events.put(None)
+
+
+@pytest.fixture
+def watched() -> Iterator[tuple]:
+    client = MagicMock()
+    stream = _EventStream()
+    client.events.return_value = stream
+    manager = SandboxImageManager(client, "python-sandbox:latest")
+    manager.start()
+    _wait_for(lambda: manager._watching)
+    try:
+        yield client, stream, manager
+    finally:
+        manager.close()
+
+
+def test_presence_is_cached_while_events_are_watched(watched) -> None:
+    client, _stream, manager = watched
+
+    manager.ensure()
+    manager.ensure()
+    manager.ensure()
+
+    client.images.get.assert_called_once_with("python-sandbox:latest")
+    _, kwargs = client.events.call_args
+    assert kwargs["filters"] == {"type": ["image"], "event": ["delete", "untag"]}
+
+
+def test_delete_event_drops_the_cache_and_next_use_repulls(watched) -> None:
+    client, stream, manager = watched
+    manager.ensure()
+    client.images.get.side_effect = docker.errors.ImageNotFound("deleted")
+
+    stream.emit("delete")
+    _wait_for(lambda: not manager._present)
+    manager.ensure()
+
+    client.images.pull.assert_called_once_with("python-sandbox:latest")
+
+
+def test_every_call_looks_up_while_the_stream_is_down() -> None:
+    client = MagicMock()
+    manager = SandboxImageManager(client, "python-sandbox:latest")
+
+    manager.ensure()
+    manager.ensure()
+
+    assert client.images.get.call_count == 2
+
+
+def test_concurrent_callers_share_one_pull() -> None:
+    client = MagicMock()
+    client.images.get.side_effect = docker.errors.ImageNotFound("missing")
+    release = threading.Event()
+    client.images.pull.side_effect = lambda _image: release.wait(2)
+    manager = SandboxImageManager(client, "python-sandbox:latest")
+    errors: List[BaseException] = []
+
+    def ensure() -> None:
+        try:
+            manager.ensure()
+        except BaseException as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=ensure) for _ in range(5)]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: client.images.pull.call_count == 1)
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join(timeout=2)
+
+    assert errors == []
+    client.images.pull.assert_called_once()
+
+
+def test_waiters_see_the_leaders_pull_failure() -> None:
+    client = MagicMock()
+    client.images.get.side_effect = docker.errors.ImageNotFound("missing")
+    started = threading.Event()
+
+    def failing_pull(_image: str) -> None:
+        started.set()
+        time.sleep(0.05)
+        raise docker.errors.APIError("registry down")
+
+    client.images.pull.side_effect = failing_pull
+    manager = SandboxImageManager(client, "python-sandbox:latest")
+    errors: List[BaseException] = []
+
+    def ensure() -> None:
+        try:
+            manager.ensure()
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=ensure)
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=ensure)
+    follower.start()
+    leader.join(timeout=2)
+    follower.join(timeout=2)
+
+    assert len(errors) == 2
+    client.images.pull.assert_called_once()
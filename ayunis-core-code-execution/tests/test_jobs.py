@@ -0,0 +1,117 @@
+"""Tests for the asynchronous job API (submit, poll, cancel)."""
+
+import asyncio
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from executor import PythonExecutor
+from jobs import JobNotFoundError
+from models import ExecutionRequest, ExecutorConfig
+from scheduling import ExecutorBusyError
+
+
+def _make_executor(client: MagicMock, **config: object) -> PythonExecutor:
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        return PythonExecutor(ExecutorConfig(**config))  # type: ignore[arg-type]
+
+
+def _blocking_container(released: threading.Event) -> MagicMock:
+    """A container whose output blocks until killed (or released)."""
+    container = MagicMock()
+
+    def output() -> object:
+        yield (b"started\n", None)
+        released.wait(5)
+
+    container.attach.side_effect = lambda **_kwargs: output()
+    container.kill.side_effect = lambda: released.set()
+    container.wait.return_value = {"StatusCode": 137}
+    container.get_archive.side_effect = Exception("no output dir")
+    return container
+
+
+async def _until(predicate: object, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():  # type: ignore[operator]
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_submitted_execution_completes_and_can_be_polled() -> None:
+    client = MagicMock()
+    container = MagicMock()
+    container.attach.side_effect = lambda **_kwargs: iter([(b"hi\n", None)])
+    container.wait.return_value = {"StatusCode": 0}
+    container.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = container
+    executor = _make_executor(client)
+
+    submitted = await executor.submit(ExecutionRequest(code="print('hi')"))
+    assert submitted.status in ("queued", "running")
+
+    status = await executor.get_job(submitted.execution_id, wait=5)
+
+    assert status.status == "completed"
+    assert status.finished_at is not None
+    assert status.result is not None and status.result.output == "hi\n"
+    assert executor.stats().queue.running == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_running_execution_kills_it_and_frees_the_slot() -> None:
+    client = MagicMock()
+    released = threading.Event()
+    container = _blocking_container(released)
+    client.containers.create.return_value = container
+    executor = _make_executor(client, max_concurrent_executions=1)
+
+    submitted = await executor.submit(ExecutionRequest(code="while True: pass"))
+    await _until(lambda: container.attach.called)
+
+    cancelled = executor.cancel_job(submitted.execution_id)
+    status = await executor.get_job(submitted.execution_id, wait=5)
+
+    assert cancelled.status == "cancelled"
+    container.kill.assert_called()
+    assert status.status == "cancelled"
+    assert status.finished_at is not None
+    assert executor.stats().queue.running == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_queued_execution_never_starts_it() -> None:
+    client = MagicMock()
+    released = threading.Event()
+    client.containers.create.return_value = _blocking_container(released)
+    executor = _make_executor(
+        client, max_concurrent_executions=1, max_queued_executions=1
+    )
+
+    running = await executor.submit(ExecutionRequest(code="while True: pass"))
+    queued = await executor.submit(ExecutionRequest(code="print(1)"))
+    with pytest.raises(ExecutorBusyError):
+        await executor.submit(ExecutionRequest(code="print(2)"))
+
+    executor.cancel_job(queued.execution_id)
+    status = await executor.get_job(queued.execution_id, wait=5)
+    assert status.status == "cancelled"
+    assert status.started_at is None
+    assert executor.stats().queue.queued == 0
+
+    released.set()
+    assert (await executor.get_job(running.execution_id, wait=5)).status == "completed"
+    assert client.containers.create.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_execution_id_raises_not_found() -> None:
+    executor = _make_executor(MagicMock())
+
+    with pytest.raises(JobNotFoundError):
+        await executor.get_job("missing")
+    with pytest.raises(JobNotFoundError):
+        executor.cancel_job("missing")
@@ -0,0 +1,192 @@
+"""Tests for the warm sandbox pool.
+
+The pool only sees a factory and a destroy callback, so these use plain fakes
+instead of a docker client.
+"""
+
+import tarfile
+import threading
+import time
+from typing import Callable, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from executor import PythonExecutor
+from models import ExecutionRequest, ExecutorConfig
+from pool import Sandbox, SandboxPool
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+class _Factory:
+    def __init__(self) -> None:
+        self.created: List[Sandbox] = []
+        self.destroyed: List[Sandbox] = []
+        self._lock = threading.Lock()
+
+    def create(self) -> Sandbox:
+        with self._lock:
+            sandbox = Sandbox(
+                sandbox_id=f"s{len(self.created)}",
+                volume_name=f"exec-vol-s{len(self.created)}",
+                volume=MagicMock(),
+                container=MagicMock(),
+            )
+            self.created.append(sandbox)
+            return sandbox
+
+    def destroy(self, sandbox: Sandbox) -> None:
+        with self._lock:
+            self.destroyed.append(sandbox)
+
+
+def test_pool_refills_to_min_size() -> None:
+    factory = _Factory()
+    pool = SandboxPool(factory.create, factory.destroy, min_size=2, max_size=4)
+    pool.start()
+    try:
+        _wait_for(lambda: pool.stats().idle == 2)
+        assert len(factory.created) == 2
+        assert pool.stats().avg_refill_ms is not None
+    finally:
+        pool.close()
+
+
+def test_claim_counts_hits_and_refills_behind() -> None:
+    factory = _Factory()
+    pool = SandboxPool(factory.create, factory.destroy, min_size=1, max_size=1)
+    pool.start()
+    try:
+        _wait_for(lambda: pool.stats().idle == 1)
+        first = pool.claim()
+
+        assert first is not None
+        _wait_for(lambda: pool.stats().idle == 1)
+        second = pool.claim()
+        assert second is not None and second is not first
+        assert pool.stats().hits == 2
+    finally:
+        pool.close()
+
+
+def test_miss_grows_target_up_to_max() -> None:
+    factory = _Factory()
+    pool = SandboxPool(factory.create, factory.destroy, min_size=0, max_size=2)
+
+    assert pool.claim() is None
+    assert pool.claim() is None
+    assert pool.claim() is None
+
+    stats = pool.stats()
+    assert stats.misses == 3
+    assert stats.target_size == 2
+
+
+def test_close_destroys_idle_sandboxes() -> None:
+    factory = _Factory()
+    pool = SandboxPool(factory.create, factory.destroy, min_size=2, max_size=2)
+    pool.start()
+    _wait_for(lambda: pool.stats().idle == 2)
+
+    pool.close()
+
+    assert sorted(s.sandbox_id for s in factory.destroyed) == ["s0", "s1"]
+    assert pool.stats().idle == 0
+
+
+def test_refill_failure_is_counted_and_retried() -> None:
+    factory = _Factory()
+    calls = {"n": 0}
+
+    def flaky() -> Sandbox:
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("daemon unavailable")
+        return factory.create()
+
+    with patch("pool._REFILL_BACKOFF_MIN", 0.01):
+        pool = SandboxPool(flaky, factory.destroy, min_size=1, max_size=1)
+        pool.start()
+        try:
+            _wait_for(lambda: pool.stats().idle == 1)
+            assert pool.stats().refill_failures == 1
+        finally:
+            pool.close()
+
+
+@pytest.mark.asyncio
+async def test_execute_uses_pooled_sandbox_once_then_destroys_it() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    client.containers.create.side_effect = lambda *_a, **_k: MagicMock()
+    client.volumes.create.side_effect = lambda *_a, **_k: MagicMock()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(
+            ExecutorConfig(pool_min_size=1, pool_max_size=1)
+        )
+    try:
+        _wait_for(lambda: executor.stats().pool.idle == 1)  # type: ignore[union-attr]
+        pooled = executor._hosts.primary.pool._idle[0]  # type: ignore[union-attr]
+        pooled.container.wait.return_value = {"StatusCode": 0}
+        pooled.container.get_archive.side_effect = Exception("no output dir")
+        client.images.get.reset_mock()
+
+        result = await executor.execute(ExecutionRequest(code="print(1)"))
+
+        assert result.success is True
+        pooled.container.start.assert_called_once()
+        pooled.container.remove.assert_called_once_with(force=True)
+        pooled.volume.remove.assert_called_once_with(force=True)
+        # A hit skips the image re-check: the container already exists.
+        client.images.get.assert_not_called()
+        assert executor.stats().pool.hits == 1  # type: ignore[union-attr]
+    finally:
+        executor.close()
+
+
+@pytest.mark.asyncio
+async def test_forkserver_pool_starts_ahead_and_stages_sentinel_last() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    client.containers.create.side_effect = lambda *_a, **_k: MagicMock()
+    client.volumes.create.side_effect = lambda *_a, **_k: MagicMock()
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(
+            ExecutorConfig(
+                pool_min_size=1, pool_max_size=1, sandbox_runtime="forkserver"
+            )
+        )
+    try:
+        _wait_for(lambda: executor.stats().pool.idle == 1)  # type: ignore[union-attr]
+        pooled = executor._hosts.primary.pool._idle[0]  # type: ignore[union-attr]
+        assert pooled.started is True
+        pooled.container.start.assert_called_once()
+        _, kwargs = client.containers.create.call_args
+        assert kwargs["command"] == "python /opt/ayunis/forkserver.py"
+
+        staged: list = []
+
+        def put_archive(path: str, data: object) -> None:
+            with tarfile.open(fileobj=data, mode="r:") as tar:  # type: ignore[arg-type]
+                staged.extend(tar.getnames())
+
+        pooled.container.put_archive.side_effect = put_archive
+        pooled.container.attach.return_value = iter([])
+        pooled.container.wait.return_value = {"StatusCode": 0}
+        pooled.container.get_archive.side_effect = Exception("no output dir")
+
+        result = await executor.execute(ExecutionRequest(code="print(1)"))
+
+        assert result.success is True
+        assert staged[0] == "main.py" and staged[-1] == ".start"
+        # Already running: the execution only stages the workspace.
+        pooled.container.start.assert_called_once()
+    finally:
+        executor.close()
@@ -0,0 +1,253 @@
+"""Tests for the process sandbox backend.
+
+bwrap is not needed for most of these: the sandbox command is replaced by
+running the interpreter directly in the workspace, which exercises staging,
+output capture, timeouts and output collection. The isolation itself is only
+checked where bwrap is installed.
+"""
+
+import asyncio
+import io
+import os
+import shutil
+import sys
+from typing import List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from capture import OutputCapture
+from executor import PythonExecutor
+from file_cache import UnknownFileReferenceError
+from models import ExecutionRequest, ExecutorConfig
+from process_sandbox import ProcessSandbox, parse_memory
+
+
+def _unsandboxed(workspace_path: str) -> List[str]:
+    return [sys.executable, os.path.join(workspace_path, "main.py")]
+
+
+def _sandbox(**kwargs: object) -> ProcessSandbox:
+    options = dict(
+        python=sys.executable,
+        workdir="/dev/shm",
+        timeout=5,
+        max_memory="1g",
+        max_cpu=1.0,
+    )
+    options.update(kwargs)
+    sandbox = ProcessSandbox(**options)  # type: ignore[arg-type]
+    sandbox.command = _unsandboxed  # type: ignore[method-assign]
+    return sandbox
+
+
+def test_workspace_runs_code_and_collects_regular_output_files() -> None:
+    sandbox = _sandbox()
+    code = (
+        "import os\n"
+        "print(open('files/in.txt').read())\n"
+        "open('output/a.csv', 'w').write('x,y')\n"
+        "open('output/b.txt', 'w').write('skipped')\n"
+        "os.symlink('/etc/hostname', 'output/link.csv')\n"
+        "os.mkfifo('output/pipe.csv')\n"
+    )
+    capture = OutputCapture(limit=1024)
+
+    with sandbox.workspace("t1") as workspace:
+        path = workspace.path
+        workspace.stage(code, [("in.txt", io.BytesIO(b"hello"))])
+        exit_code, timed_out, _ = workspace.run(workspace.start(), capture)
+        artifacts, omitted = workspace.collect_outputs(False, 1024, 1024)
+
+    assert (exit_code, timed_out) == (0, False)
+    assert capture.text("stdout") == "hello\n"
+    assert artifacts == {"a.csv": b"x,y"}
+    assert omitted == []
+    assert not os.path.exists(path)
+
+
+def test_timeout_kills_the_process() -> None:
+    sandbox = _sandbox(timeout=0.5)
+    capture = OutputCapture(limit=1024)
+
+    with sandbox.workspace() as workspace:
+        workspace.stage("import time\nprint('up', flush=True)\ntime.sleep(30)", [])
+        exit_code, timed_out, _ = workspace.run(workspace.start(), capture)
+
+    assert timed_out
+    assert exit_code == 137
+    assert capture.text("stdout") == "up\n"
+
+
+def test_input_file_names_cannot_leave_the_workspace() -> None:
+    with _sandbox().workspace() as workspace:
+        with pytest.raises(ValueError):
+            workspace.stage("", [("../main.py", io.BytesIO(b"x"))])
+
+
+@pytest.mark.skipif(shutil.which("prlimit") is None, reason="prlimit not installed")
+def test_rlimits_are_applied_without_a_cgroup() -> None:
+    sandbox = _sandbox(max_memory="768m", timeout=4)
+    code = (
+        "import resource\n"
+        "print(resource.getrlimit(resource.RLIMIT_AS)[0])\n"
+        "print(resource.getrlimit(resource.RLIMIT_CPU)[0])\n"
+    )
+    capture = OutputCapture(limit=1024)
+
+    with sandbox.workspace() as workspace:
+        workspace.stage(code, [])
+        exit_code, _, _ = workspace.run(workspace.start(), capture)
+
+    assert exit_code == 0, capture.text("stderr")
+    assert capture.text("stdout").split() == [str(768 * 1024 * 1024), "5"]
+
+
+def test_cgroup_is_joined_from_the_parent_before_the_code_runs(tmp_path) -> None:
+    # A plain directory stands in for the delegated cgroup: the limit files
+    # are just written, and cgroup.procs records the pid that was moved.
+    sandbox = _sandbox(cgroup_root=str(tmp_path))
+    code = "import os\nprint(os.getpid())\n"
+    capture = OutputCapture(limit=1024)
+
+    with sandbox.workspace("cg") as workspace:
+        assert workspace.cgroup is not None
+        workspace.stage(code, [])
+        process = workspace.start()
+        exit_code, _, _ = workspace.run(process, capture)
+        with open(os.path.join(workspace.cgroup, "cgroup.procs")) as f:
+            joined = f.read()
+        with open(os.path.join(workspace.cgroup, "pids.max")) as f:
+            pids_max = f.read()
+
+    assert exit_code == 0, capture.text("stderr")
+    # The gate execs the command, so the code runs as the pid that joined.
+    assert joined == str(process.pid) == capture.text("stdout").strip()
+    assert pids_max == "50"
+
+
+@pytest.mark.skipif(shutil.which("prlimit") is None, reason="prlimit not installed")
+@pytest.mark.parametrize("module", ["numpy", "pandas"])
+def test_scientific_stack_imports_under_the_default_memory_limit(module: str) -> None:
+    pytest.importorskip(module)
+    sandbox = _sandbox(max_memory=ExecutorConfig().max_memory, timeout=60)
+    # The sandbox's thread caps, which bwrap would set: thread pools sized by
+    # the host's cores are what pushes the address space up.
+    threads = [
+        f"{name}={value}"
+        for name, value in sandbox._environment().items()
+        if name.endswith("_NUM_THREADS")
+    ]
+    sandbox.command = lambda path: [  # type: ignore[method-assign]
+        "env",
+        *threads,
+        *_unsandboxed(path),
+    ]
+    capture = OutputCapture(limit=4096)
+
+    with sandbox.workspace() as workspace:
+        workspace.stage(f"import {module}\nprint('ok')\n", [])
+        exit_code, _, _ = workspace.run(workspace.start(), capture)
+
+    assert ExecutorConfig().max_memory == "512m"
+    assert exit_code == 0, capture.text("stderr")
+    assert capture.text("stdout") == "ok\n"
+
+
+def test_command_isolates_the_interpreter() -> None:
+    sandbox = ProcessSandbox(
+        python="/opt/venv/bin/python",
+        workdir="/dev/shm",
+        timeout=5,
+        max_memory="512m",
+        max_cpu=1.0,
+        binds=["/opt/venv"],
+    )
+
+    argv = sandbox.command("/dev/shm/exec-1")
+
+    assert "--unshare-all" in argv and "--die-with-parent" in argv
+    assert ["--ro-bind-try", "/opt/venv", "/opt/venv"] == argv[
+        argv.index("/opt/venv") - 1 : argv.index("/opt/venv") + 2
+    ]
+    assert ["--bind", "/dev/shm/exec-1", "/execution"] == argv[
+        argv.index("--bind") : argv.index("--bind") + 3
+    ]
+    assert argv[-2:] == ["/opt/venv/bin/python", "/execution/main.py"]
+    assert parse_memory("512m") == 512 * 1024 * 1024
+
+
+@pytest.mark.asyncio
+async def test_executor_with_process_backend_needs_no_docker() -> None:
+    from_env = MagicMock()
+    with patch("docker.from_env", from_env), patch(
+        "process_sandbox.shutil.which", return_value="/usr/bin/bwrap"
+    ), patch.object(ProcessSandbox, "command", staticmethod(_unsandboxed)):
+        executor = PythonExecutor(
+            ExecutorConfig(sandbox_backend="process", process_python=sys.executable)
+        )
+        response = await executor.execute(
+            ExecutionRequest(
+                code="open('output/r.csv', 'w').write('1')\nprint('ok')"
+            )
+        )
+        with pytest.raises(UnknownFileReferenceError):
+            executor.check_file_refs({"data.csv": "0" * 64})
+
+    from_env.assert_not_called()
+    assert response.success and response.output == "ok\n"
+    assert response.output_files is not None and "r.csv" in response.output_files
+    assert response.metrics is not None and "run" in response.metrics.phases_ms
+    assert executor.stats().hosts == []
+    executor.close()
+
+
+@pytest.mark.skipif(shutil.which("bwrap") is None, reason="bwrap not installed")
+def test_bwrap_sandbox_has_no_network_and_a_read_only_root() -> None:
+    sandbox = ProcessSandbox(
+        python="python3", workdir="/dev/shm", timeout=10, max_memory="1g", max_cpu=1
+    )
+    sandbox.check()
+    code = (
+        "import socket\n"
+        "try:\n"
+        "    socket.create_connection(('1.1.1.1', 53), timeout=1)\n"
+        "except OSError:\n"
+        "    print('no network')\n"
+        "try:\n"
+        "    open('/usr/x', 'w')\n"
+        "except OSError:\n"
+        "    print('read-only')\n"
+        "open('/execution/output/ok.csv', 'w').write('1')\n"
+    )
+    capture = OutputCapture(limit=1024)
+
+    with sandbox.workspace() as workspace:
+        workspace.stage(code, [])
+        exit_code, _, _ = workspace.run(workspace.start(), capture)
+        artifacts, _ = workspace.collect_outputs(False, 1024, 1024)
+
+    assert exit_code == 0, capture.text("stderr")
+    assert capture.text("stdout") == "no network\nread-only\n"
+    assert artifacts == {"ok.csv": b"1"}
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_process_execution_kills_it() -> None:
+    with patch(
+        "process_sandbox.shutil.which", return_value="/usr/bin/bwrap"
+    ), patch.object(ProcessSandbox, "command", staticmethod(_unsandboxed)):
+        executor = PythonExecutor(
+            ExecutorConfig(sandbox_backend="process", process_python=sys.executable)
+        )
+        submitted = await executor.submit(
+            ExecutionRequest(code="import time\ntime.sleep(30)")
+        )
+        while submitted.execution_id not in executor._running:
+            await asyncio.sleep(0.01)
+        executor.cancel_job(submitted.execution_id)
+        status = await executor.get_job(submitted.execution_id, wait=5)
+
+    assert status.status == "cancelled"
+    assert executor.stats().queue.running == 0
+    executor.close()
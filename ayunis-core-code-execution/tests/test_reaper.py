@@ -0,0 +1,163 @@
+"""Tests for removing orphaned sandbox containers and volumes."""
+
+from typing import Dict, List
+from unittest.mock import MagicMock, patch
+
+import docker
+import pytest
+
+from executor import PythonExecutor
+from models import ExecutionRequest, ExecutorConfig
+from pool import Sandbox, SandboxPool
+from reaper import (
+    CREATED_LABEL,
+    IDLE_TTL_LABEL,
+    INSTANCE_LABEL,
+    SANDBOX_LABEL,
+    OrphanReaper,
+)
+
+NOW = 10_000.0
+
+
+def _labels(instance: str, age: float, sandbox_id: str) -> Dict[str, str]:
+    return {
+        INSTANCE_LABEL: instance,
+        CREATED_LABEL: str(int(NOW - age)),
+        SANDBOX_LABEL: sandbox_id,
+    }
+
+
+def _client(resources: List[Dict[str, str]]) -> MagicMock:
+    client = MagicMock()
+    containers, volumes = [], []
+    for labels in resources:
+        container = MagicMock(labels=labels)
+        container.name = f"exec-{labels[SANDBOX_LABEL]}"
+        containers.append(container)
+        volume = MagicMock(attrs={"Labels": labels})
+        volume.name = f"exec-vol-{labels[SANDBOX_LABEL]}"
+        volumes.append(volume)
+    client.containers.list.return_value = containers
+    client.volumes.list.return_value = volumes
+    return client
+
+
+def _removed(client: MagicMock) -> List[str]:
+    return [
+        r.name
+        for r in client.containers.list.return_value + client.volumes.list.return_value
+        if r.remove.called
+    ]
+
+
+def test_own_untracked_resources_are_removed_after_the_grace_period() -> None:
+    reaper = OrphanReaper("me", grace=300, max_age=3600, in_use={"live"}.__contains__)
+    client = _client(
+        [
+            _labels("me", 600, "crashed"),
+            _labels("me", 600, "live"),
+            _labels("me", 60, "young"),
+        ]
+    )
+
+    with patch("reaper.time.time", return_value=NOW):
+        reaper.reap(client)
+
+    assert _removed(client) == ["exec-crashed", "exec-vol-crashed"]
+    stats = reaper.stats()
+    assert (stats.runs, stats.containers_removed, stats.volumes_removed) == (1, 1, 1)
+    assert stats.last_run_at == NOW
+
+
+def test_other_instances_resources_are_only_removed_past_max_age() -> None:
+    reaper = OrphanReaper("me", grace=300, max_age=3600, in_use=lambda _id: False)
+    client = _client([_labels("other", 600, "busy"), _labels("other", 7200, "dead")])
+
+    with patch("reaper.time.time", return_value=NOW):
+        reaper.reap(client)
+
+    assert _removed(client) == ["exec-dead", "exec-vol-dead"]
+
+
+def test_other_instances_sessions_used_within_their_idle_ttl_are_kept() -> None:
+    reaper = OrphanReaper("me", grace=300, max_age=3600, in_use=lambda _id: False)
+    resources = [
+        dict(_labels("other", 7200, name), **{IDLE_TTL_LABEL: "300"})
+        for name in ("active", "stale", "unused")
+    ]
+    client = _client(resources)
+    active, stale, unused = client.containers.list.return_value
+    # NOW is 02:46:40 UTC on 1 January 1970: one step 60s ago, one 1000s ago.
+    active.get_archive.return_value = (iter(()), {"mtime": "1970-01-01T02:45:40Z"})
+    stale.get_archive.return_value = (iter(()), {"mtime": "1970-01-01T02:30:00Z"})
+    unused.get_archive.side_effect = docker.errors.NotFound("no steps")
+
+    with patch("reaper.time.time", return_value=NOW):
+        reaper.reap(client)
+
+    assert _removed(client) == [
+        "exec-stale",
+        "exec-unused",
+        "exec-vol-stale",
+        "exec-vol-unused",
+    ]
+
+
+def test_remove_failures_are_counted_and_do_not_stop_the_sweep() -> None:
+    reaper = OrphanReaper("me", grace=0, max_age=0, in_use=lambda _id: False)
+    client = _client([_labels("me", 10, "a"), _labels("me", 10, "b")])
+    first, second = client.containers.list.return_value
+    first.remove.side_effect = docker.errors.APIError("busy")
+    second.remove.side_effect = docker.errors.NotFound("gone")
+
+    with patch("reaper.time.time", return_value=NOW):
+        reaper.reap(client)
+
+    stats = reaper.stats()
+    assert (stats.containers_removed, stats.volumes_removed) == (0, 2)
+    assert stats.failures == 1
+
+
+def test_idle_pooled_sandboxes_past_max_age_are_destroyed_not_claimed() -> None:
+    destroyed: List[Sandbox] = []
+    pool = SandboxPool(
+        factory=MagicMock(),
+        destroy=destroyed.append,
+        min_size=0,
+        max_size=2,
+        max_age=100,
+    )
+    old = Sandbox(
+        "old", "exec-vol-old", MagicMock(), MagicMock(), created_at=NOW - 200
+    )
+    fresh = Sandbox("new", "exec-vol-new", MagicMock(), MagicMock(), created_at=NOW)
+    pool._idle.extend([old, fresh])
+
+    with patch("pool.time.time", return_value=NOW):
+        assert pool.claim() is fresh
+    assert destroyed == [old]
+
+
+@pytest.mark.asyncio
+async def test_executor_labels_sandboxes_and_forgets_destroyed_ones() -> None:
+    client = MagicMock()
+    client.images.get.return_value = object()
+    container = MagicMock()
+    container.attach.side_effect = lambda **_kwargs: iter([(b"ok\n", None)])
+    container.wait.return_value = {"StatusCode": 0}
+    container.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = container
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(instance_id="svc-1"))
+
+    await executor.execute(ExecutionRequest(code="print('ok')"))
+
+    volume_labels = client.volumes.create.call_args.kwargs["labels"]
+    container_labels = client.containers.create.call_args.kwargs["labels"]
+    assert volume_labels[INSTANCE_LABEL] == "svc-1"
+    assert container_labels[SANDBOX_LABEL] == volume_labels[SANDBOX_LABEL]
+    # Sessions are opt-in; without them there is no idle TTL to honour.
+    assert IDLE_TTL_LABEL not in container_labels
+    assert executor._reaper is not None
+    assert not executor._reaper._in_use(volume_labels[SANDBOX_LABEL])
@@ -0,0 +1,86 @@
+"""Tests for the opt-in execution result cache."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from executor import PythonExecutor
+from models import ExecutionRequest, ExecutionResponse, ExecutorConfig
+from result_cache import ResultCache, cache_limits, result_key
+
+
+def _response(output: str = "", exit_code: int = 0) -> ExecutionResponse:
+    return ExecutionResponse(
+        success=exit_code == 0, output=output, exit_code=exit_code, execution_id="e1"
+    )
+
+
+def test_key_depends_on_code_files_image_and_limits() -> None:
+    limits = cache_limits(ExecutorConfig())
+    base = result_key("print(1)", {"a.csv": "YQo="}, None, "sha256:1", limits)
+
+    assert base == result_key("print(1)", {"a.csv": "YQo="}, None, "sha256:1", limits)
+    assert base != result_key("print(2)", {"a.csv": "YQo="}, None, "sha256:1", limits)
+    assert base != result_key("print(1)", {"a.csv": "Ygo="}, None, "sha256:1", limits)
+    assert base != result_key("print(1)", {"a.csv": "YQo="}, None, "sha256:2", limits)
+    assert base != result_key(
+        "print(1)",
+        {"a.csv": "YQo="},
+        None,
+        "sha256:1",
+        cache_limits(ExecutorConfig(max_memory="1g")),
+    )
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_bounds() -> None:
+    cache = ResultCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.put("a", _response("aaaa"))
+    cache.put("b", _response("bbbb"))
+    assert cache.get("a") is not None
+    cache.put("c", _response("cccc"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    # Larger than the whole cache: never stored.
+    cache.put("d", _response("d" * 11))
+    assert cache.get("d") is None
+    assert cache.stats().evictions == 1
+
+
+def test_entries_expire_after_the_ttl() -> None:
+    cache = ResultCache(max_entries=10, max_bytes=100, ttl=30)
+    with patch("result_cache.time.monotonic", return_value=100.0):
+        cache.put("a", _response("x"))
+    with patch("result_cache.time.monotonic", return_value=129.0):
+        assert cache.get("a") is not None
+    with patch("result_cache.time.monotonic", return_value=131.0):
+        assert cache.get("a") is None
+    assert cache.stats().entries == 0
+
+
+@pytest.mark.asyncio
+async def test_opted_in_repeat_is_served_from_cache_without_running() -> None:
+    client = MagicMock()
+    client.images.get.return_value = MagicMock(id="sha256:abc")
+    with patch("docker.from_env", return_value=client):
+        executor = PythonExecutor(ExecutorConfig(result_cache_max_bytes=1000))
+    container = MagicMock()
+    container.attach.side_effect = lambda **_kwargs: iter([(b"42\n", None)])
+    container.wait.return_value = {"StatusCode": 0}
+    container.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = container
+    try:
+        request = ExecutionRequest(code="print(42)", cache=True)
+        first = await executor.execute(request)
+        second = await executor.execute(request)
+        uncached = await executor.execute(ExecutionRequest(code="print(42)"))
+
+        assert first.cached is False and second.cached is True
+        assert second.output == "42\n"
+        assert second.execution_id == first.execution_id
+        assert uncached.cached is False
+        assert client.containers.create.call_count == 2
+        stats = executor.stats().result_cache
+        assert stats is not None and stats.hits == 1 and stats.entries == 1
+    finally:
+        executor.close()
@@ -0,0 +1,175 @@
+"""Tests for execution admission control."""
+
+import asyncio
+
+import pytest
+
+from scheduling import (
+    ExecutionLimiter,
+    ExecutorBusyError,
+    FairShareLimiter,
+    TenantBudgetExceededError,
+)
+
+
+@pytest.mark.asyncio
+async def test_callers_beyond_the_cap_wait_in_fifo_order() -> None:
+    limiter = ExecutionLimiter(max_concurrent=1, max_queued=2, initial_duration=1)
+    order: list = []
+    release_first = asyncio.Event()
+
+    async def run(name: str, gate: "asyncio.Event | None" = None) -> None:
+        async with limiter.slot():
+            order.append(name)
+            if gate is not None:
+                await gate.wait()
+
+    first = asyncio.create_task(run("first", release_first))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(run("second"))
+    third = asyncio.create_task(run("third"))
+    await asyncio.sleep(0)
+
+    assert limiter.stats().running == 1
+    assert limiter.stats().queued == 2
+
+    release_first.set()
+    await asyncio.gather(first, second, third)
+
+    assert order == ["first", "second", "third"]
+    assert limiter.stats().running == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately_with_retry_after() -> None:
+    limiter = ExecutionLimiter(max_concurrent=1, max_queued=1, initial_duration=10)
+    await limiter.acquire()
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(ExecutorBusyError) as excinfo:
+        await limiter.acquire()
+
+    # One execution ahead per slot plus the queued one: two waves of ~10s.
+    assert excinfo.value.retry_after == 20
+    assert limiter.stats().rejected == 1
+    limiter.release()
+    await waiting
+    limiter.release()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_frees_its_queue_position() -> None:
+    limiter = ExecutionLimiter(max_concurrent=1, max_queued=1, initial_duration=1)
+    await limiter.acquire()
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    assert limiter.stats().queued == 0
+    limiter.release()
+    assert limiter.stats().running == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_reservations_are_given_back() -> None:
+    limiter = ExecutionLimiter(max_concurrent=1, max_queued=1, initial_duration=1)
+    taken = limiter.reserve()
+    queued = limiter.reserve()
+
+    limiter.cancel(queued)
+    assert limiter.stats().queued == 0
+    limiter.cancel(taken)
+    assert limiter.stats().running == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_share_serves_a_light_tenant_before_a_heavy_backlog() -> None:
+    limiter = FairShareLimiter(max_concurrent=1, max_queued=8, initial_duration=1)
+    order: list = []
+    gate = asyncio.Event()
+
+    async def run(tenant: str, name: str) -> None:
+        async with limiter.slot(tenant):
+            order.append(name)
+            await gate.wait()
+
+    tasks = [asyncio.create_task(run("heavy", f"heavy{i}")) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(run("light", "light")))
+    await asyncio.sleep(0)
+
+    tenants = {t.tenant: t for t in limiter.stats().tenants}
+    assert (tenants["heavy"].running, tenants["heavy"].queued) == (1, 2)
+    assert tenants["light"].queued == 1
+
+    gate.set()
+    await asyncio.gather(*tasks)
+
+    # The light tenant overtakes the heavy one's backlog, not the reverse.
+    assert order == ["heavy0", "light", "heavy1", "heavy2"]
+    assert limiter.stats().running == 0 and limiter.stats().tenants == []
+
+
+@pytest.mark.asyncio
+async def test_tenant_concurrency_cap_leaves_slots_to_others() -> None:
+    limiter = FairShareLimiter(
+        max_concurrent=2, max_queued=4, initial_duration=1, tenant_max_running=1
+    )
+    first = limiter.reserve("a")
+    second = limiter.reserve("a")
+    other = limiter.reserve("b")
+
+    assert first is not None and first.done()
+    assert second is not None and not second.done()
+    assert other is not None and other.done()
+
+    limiter.cancel(first)
+    assert second.done()
+    limiter.cancel(second)
+    limiter.cancel(other)
+    assert limiter.stats().running == 0
+
+
+@pytest.mark.asyncio
+async def test_tenant_queue_bound_and_cpu_budget_reject_with_retry_after() -> None:
+    limiter = FairShareLimiter(
+        max_concurrent=1,
+        max_queued=8,
+        initial_duration=1,
+        tenant_max_queued=1,
+        cpu_budget=0.01,
+        budget_window=100,
+    )
+    async with limiter.slot("a"):
+        queued = limiter.reserve("a")
+        with pytest.raises(ExecutorBusyError):
+            limiter.reserve("a")
+        limiter.cancel(queued)
+        await asyncio.sleep(0.05)
+
+    with pytest.raises(TenantBudgetExceededError) as excinfo:
+        limiter.reserve("a")
+    assert excinfo.value.retry_after >= 1
+    other = limiter.reserve("b")
+    limiter.cancel(other)
+
+    (stats,) = [t for t in limiter.stats().tenants if t.tenant == "a"]
+    assert stats.rejected == 2
+    assert stats.cpu_seconds >= 0.05
+    assert stats.budget_remaining is not None and stats.budget_remaining < 0
+
+
+@pytest.mark.asyncio
+async def test_rejected_reservations_leave_no_tenant_behind() -> None:
+    limiter = FairShareLimiter(max_concurrent=1, max_queued=0, initial_duration=1)
+    async with limiter.slot("a"):
+        for i in range(100):
+            with pytest.raises(ExecutorBusyError):
+                limiter.reserve(f"tenant-{i}")
+        assert list(limiter._tenants) == ["a"]
+
+    assert limiter._tenants == {}
@@ -0,0 +1,437 @@
+"""Tests for the HTTP layer, with the executor replaced by a stub."""
+
+import asyncio
+import gzip
+import json
+from typing import AsyncIterator, Iterator, List, Optional
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+import server
+from executor import BatchTooLargeError, ExecutionResult, InputFile
+from file_cache import UnknownFileReferenceError
+from jobs import JobNotFoundError
+from models import (
+    ExecutionEvent,
+    ExecutionMetrics,
+    ExecutionRequest,
+    ExecutionResponse,
+    ExecutionStatus,
+    ExecutorConfig,
+    ExecutorStats,
+    QueueStats,
+)
+from scheduling import ExecutorBusyError
+from sessions import SessionLimitError, SessionNotFoundError
+
+
+@pytest.fixture
+def stub_executor() -> Iterator[MagicMock]:
+    executor = MagicMock()
+    executor.config = ExecutorConfig()
+    server.set_executor(executor)
+    try:
+        yield executor
+    finally:
+        server.executor_instance = None
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server.app), base_url="http://executor.test"
+    )
+
+
+@pytest.mark.asyncio
+async def test_execute_returns_429_with_retry_after_when_busy(
+    stub_executor: MagicMock,
+) -> None:
+    async def busy(_request: ExecutionRequest) -> ExecutionResponse:
+        raise ExecutorBusyError(retry_after=7)
+
+    stub_executor.execute = busy
+
+    async with _client() as client:
+        response = await client.post("/execute", json={"code": "print(1)"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "7"
+
+
+@pytest.mark.asyncio
+async def test_health_answers_while_an_execution_is_running(
+    stub_executor: MagicMock,
+) -> None:
+    release = asyncio.Event()
+
+    async def slow(_request: ExecutionRequest) -> ExecutionResponse:
+        await release.wait()
+        return ExecutionResponse(success=True, exit_code=0, execution_id="abc")
+
+    stub_executor.execute = slow
+
+    async with _client() as client:
+        running = asyncio.create_task(
+            client.post("/execute", json={"code": "print(1)"})
+        )
+        health = await asyncio.wait_for(client.get("/health"), timeout=1)
+        release.set()
+        assert (await running).status_code == 200
+
+    assert health.json()["status"] == "healthy"
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_emits_ndjson_events(stub_executor: MagicMock) -> None:
+    result = ExecutionResponse(success=True, exit_code=0, execution_id="abc")
+
+    async def events(_request: ExecutionRequest) -> AsyncIterator[ExecutionEvent]:
+        yield ExecutionEvent(type="started", execution_id="abc")
+        yield ExecutionEvent(type="stdout", data="step 1\n")
+        yield ExecutionEvent(type="stderr", data="warning\n")
+        yield ExecutionEvent(type="result", result=result)
+
+    stub_executor.execute_stream = events
+
+    async with _client() as client:
+        response = await client.post("/execute/stream", json={"code": "print(1)"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["started", "stdout", "stderr", "result"]
+    assert lines[1]["data"] == "step 1\n"
+    assert lines[3]["result"]["exit_code"] == 0
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_returns_429_before_streaming_when_busy(
+    stub_executor: MagicMock,
+) -> None:
+    async def busy(_request: ExecutionRequest) -> AsyncIterator[ExecutionEvent]:
+        raise ExecutorBusyError(retry_after=3)
+        yield  # pragma: no cover
+
+    stub_executor.execute_stream = busy
+
+    async with _client() as client:
+        response = await client.post("/execute/stream", json={"code": "print(1)"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_execute_multipart_stages_uploads_and_returns_binary_parts(
+    stub_executor: MagicMock,
+) -> None:
+    received: dict = {}
+
+    async def run(
+        code: str,
+        inputs: List[InputFile],
+        file_refs: Optional[dict] = None,
+        tenant_id: Optional[str] = None,
+    ) -> ExecutionResult:
+        received["code"] = code
+        received["inputs"] = {i.name: (i.size, i.fileobj.read()) for i in inputs}
+        return ExecutionResult(
+            response=ExecutionResponse(success=True, exit_code=0, execution_id="abc"),
+            artifacts={"plot.png": b"\x89PNG\x00", "data.parquet": b"PAR1"},
+        )
+
+    stub_executor.execute_with_artifacts = run
+
+    async with _client() as client:
+        response = await client.post(
+            "/execute/multipart",
+            data={"code": "print(1)"},
+            files=[
+                (
+                    "files",
+                    ("sheet.xlsx", b"\x00\x01binary", "application/octet-stream"),
+                )
+            ],
+        )
+
+    assert response.status_code == 200
+    assert received == {
+        "code": "print(1)",
+        "inputs": {"sheet.xlsx": (8, b"\x00\x01binary")},
+    }
+
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/mixed; boundary=")
+    boundary = content_type.split("boundary=")[1].encode()
+    parts = response.content.split(b"--" + boundary)[1:-1]
+    assert len(parts) == 3
+    assert json.loads(parts[0].split(b"\r\n\r\n", 1)[1])["execution_id"] == "abc"
+    assert b'filename="plot.png"' in parts[1]
+    assert parts[1].split(b"\r\n\r\n", 1)[1] == b"\x89PNG\x00\r\n"
+    assert parts[2].split(b"\r\n\r\n", 1)[1] == b"PAR1\r\n"
+
+
+@pytest.mark.asyncio
+async def test_execute_returns_400_for_unknown_file_reference(
+    stub_executor: MagicMock,
+) -> None:
+    async def unknown(_request: ExecutionRequest) -> ExecutionResponse:
+        raise UnknownFileReferenceError(["ab" * 32])
+
+    stub_executor.execute = unknown
+
+    async with _client() as client:
+        response = await client.post(
+            "/execute", json={"code": "x", "file_refs": {"a.csv": "ab" * 32}}
+        )
+
+    assert response.status_code == 400
+    assert "ab" * 32 in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_execute_multipart_rejects_malformed_file_refs(
+    stub_executor: MagicMock,
+) -> None:
+    async with _client() as client:
+        response = await client.post(
+            "/execute/multipart", data={"code": "x", "file_refs": "[1, 2]"}
+        )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_session_errors_map_to_404_and_429(stub_executor: MagicMock) -> None:
+    async def missing(session_id: str, _request: object) -> ExecutionResponse:
+        raise SessionNotFoundError(session_id)
+
+    async def full(_request: object) -> object:
+        raise SessionLimitError(2)
+
+    stub_executor.execute_in_session = missing
+    stub_executor.create_session = full
+
+    async with _client() as client:
+        step = await client.post("/sessions/nope/execute", json={"code": "x"})
+        opened = await client.post("/sessions", json={})
+
+    assert step.status_code == 404
+    assert opened.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_cors_preflight_allows_delete(stub_executor: MagicMock) -> None:
+    async with _client() as client:
+        response = await client.options(
+            "/sessions/abc",
+            headers={
+                "Origin": "http://app.test",
+                "Access-Control-Request-Method": "DELETE",
+            },
+        )
+
+    assert response.status_code == 200
+    assert "DELETE" in response.headers["access-control-allow-methods"]
+
+
+@pytest.mark.asyncio
+async def test_execute_sets_server_timing_header(stub_executor: MagicMock) -> None:
+    async def run(_request: ExecutionRequest) -> ExecutionResponse:
+        return ExecutionResponse(
+            success=True,
+            exit_code=0,
+            execution_id="abc",
+            metrics=ExecutionMetrics(
+                phases_ms={"queue": 0.5, "run": 120.25}, total_ms=130.0
+            ),
+        )
+
+    stub_executor.execute = run
+
+    async with _client() as client:
+        response = await client.post("/execute", json={"code": "x"})
+
+    assert response.status_code == 200
+    assert response.headers["server-timing"] == (
+        "queue;dur=0.5, run;dur=120.2, total;dur=130.0"
+    )
+    assert response.json()["metrics"]["phases_ms"]["run"] == 120.25
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_histograms_and_queue_state(
+    stub_executor: MagicMock,
+) -> None:
+    stub_executor.stats.return_value = ExecutorStats(
+        queue=QueueStats(
+            max_concurrent=4, max_queued=16, running=2, queued=1, rejected=5
+        )
+    )
+
+    async with _client() as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE code_execution_phase_seconds histogram" in body
+    assert "code_execution_running 2.0" in body
+    assert "code_execution_rejected_total 5.0" in body
+
+
+@pytest.mark.asyncio
+async def test_executions_endpoints_submit_poll_and_cancel(
+    stub_executor: MagicMock,
+) -> None:
+    queued = ExecutionStatus(execution_id="abc", status="queued", created_at=1.0)
+
+    async def submit(_request: ExecutionRequest) -> ExecutionStatus:
+        return queued
+
+    async def get_job(execution_id: str, wait: float = 0) -> ExecutionStatus:
+        raise JobNotFoundError(execution_id)
+
+    stub_executor.submit = submit
+    stub_executor.get_job = get_job
+    stub_executor.cancel_job.return_value = queued.model_copy(
+        update={"status": "cancelled"}
+    )
+
+    async with _client() as client:
+        submitted = await client.post("/executions", json={"code": "print(1)"})
+        missing = await client.get("/executions/nope", params={"wait": 1})
+        too_long = await client.get("/executions/abc", params={"wait": 3600})
+        cancelled = await client.delete("/executions/abc")
+
+    assert submitted.status_code == 202
+    assert submitted.json()["execution_id"] == "abc"
+    assert missing.status_code == 404
+    assert too_long.status_code == 422
+    assert cancelled.json()["status"] == "cancelled"
+    stub_executor.cancel_job.assert_called_once_with("abc")
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_returns_results_in_order_and_maps_errors(
+    stub_executor: MagicMock,
+) -> None:
+    async def run_batch(requests: List[ExecutionRequest]) -> List[ExecutionResponse]:
+        if len(requests) > 2:
+            raise BatchTooLargeError(len(requests), 2)
+        return [
+            ExecutionResponse(
+                success=True, output=r.code, exit_code=0, execution_id=str(i)
+            )
+            for i, r in enumerate(requests)
+        ]
+
+    stub_executor.execute_batch = run_batch
+
+    async with _client() as client:
+        ok = await client.post(
+            "/execute/batch",
+            json={"executions": [{"code": "a"}, {"code": "b"}]},
+        )
+        too_many = await client.post(
+            "/execute/batch",
+            json={"executions": [{"code": "a"}, {"code": "b"}, {"code": "c"}]},
+        )
+        empty = await client.post("/execute/batch", json={"executions": []})
+
+    assert [r["output"] for r in ok.json()["results"]] == ["a", "b"]
+    assert too_many.status_code == 400
+    assert empty.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_execute_decompresses_gzip_requests_and_compresses_large_responses(
+    stub_executor: MagicMock,
+) -> None:
+    received: List[ExecutionRequest] = []
+
+    async def run(request: ExecutionRequest) -> ExecutionResponse:
+        received.append(request)
+        return ExecutionResponse(
+            success=True, exit_code=0, execution_id="abc", output=request.code
+        )
+
+    stub_executor.execute = run
+    code = "print('x')\n" * 500
+    body = gzip.compress(json.dumps({"code": code}).encode())
+
+    async with _client() as client:
+        large = await client.post(
+            "/execute",
+            content=body,
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+                "Accept-Encoding": "gzip",
+            },
+        )
+        small = await client.post(
+            "/execute", json={"code": "1"}, headers={"Accept-Encoding": "gzip"}
+        )
+
+    assert received[0].code == code
+    assert large.status_code == 200
+    assert large.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in large.headers["vary"].lower()
+    assert large.json()["output"] == code
+    assert small.status_code == 200
+    assert "content-encoding" not in small.headers
+
+
+@pytest.mark.asyncio
+async def test_compressed_request_bodies_are_bounded_and_validated(
+    stub_executor: MagicMock,
+) -> None:
+    stub_executor.config = ExecutorConfig(max_decompressed_body_bytes=1024)
+    bomb = gzip.compress(json.dumps({"code": "#" * 100_000}).encode())
+    small = gzip.compress(json.dumps({"code": "print(1)"}).encode())
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+    async with _client() as client:
+        too_large = await client.post("/execute", content=bomb, headers=headers)
+        corrupt = await client.post(
+            "/execute", content=b"not gzip at all", headers=headers
+        )
+        truncated = await client.post(
+            "/execute", content=small[:-4], headers=headers
+        )
+        unknown = await client.post(
+            "/execute",
+            content=b"{}",
+            headers={"Content-Type": "application/json", "Content-Encoding": "br"},
+        )
+
+    assert len(bomb) < 1024
+    assert too_large.status_code == 413
+    assert corrupt.status_code == 400
+    assert truncated.status_code == 400
+    assert unknown.status_code == 415
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_is_compressed_chunk_by_chunk(
+    stub_executor: MagicMock,
+) -> None:
+    async def events(_request: ExecutionRequest) -> AsyncIterator[ExecutionEvent]:
+        yield ExecutionEvent(type="started", execution_id="abc")
+        yield ExecutionEvent(type="stdout", data="y" * 4096)
+
+    stub_executor.execute_stream = events
+
+    async with _client() as client:
+        response = await client.post(
+            "/execute/stream",
+            json={"code": "print(1)"},
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+    assert response.headers["content-encoding"] == "gzip"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["started", "stdout"]
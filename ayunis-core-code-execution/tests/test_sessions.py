@@ -0,0 +1,188 @@
+"""Tests for persistent sessions: the manager, the in-sandbox driver, and the
+executor's step path against a mocked docker client."""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from executor import PythonExecutor
+from models import ExecutorConfig, SessionCreateRequest, SessionExecuteRequest
+from pool import Sandbox
+from reaper import IDLE_TTL_LABEL
+from sessions import SessionLimitError, SessionManager, SessionNotFoundError
+
+DRIVER = Path(__file__).resolve().parent.parent / "session_driver.py"
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+def _sandbox(session_id: str) -> Sandbox:
+    return Sandbox(
+        sandbox_id=session_id,
+        volume_name=f"exec-vol-{session_id}",
+        volume=MagicMock(),
+        container=MagicMock(),
+    )
+
+
+def test_open_enforces_max_sessions_and_close_frees_a_slot() -> None:
+    destroyed: List[Sandbox] = []
+    manager = SessionManager(destroyed.append, max_sessions=1, idle_timeout=60)
+    first = manager.open(_sandbox)
+
+    with pytest.raises(SessionLimitError):
+        manager.open(_sandbox)
+
+    manager.close(first.session_id)
+    assert destroyed == [first.sandbox]
+    with pytest.raises(SessionNotFoundError):
+        manager.get(first.session_id)
+    manager.open(_sandbox)
+
+
+def test_idle_sessions_expire_but_busy_ones_are_kept() -> None:
+    destroyed: List[Sandbox] = []
+    manager = SessionManager(destroyed.append, max_sessions=2, idle_timeout=0.1)
+    idle = manager.open(_sandbox)
+    busy = manager.open(_sandbox)
+    manager.start()
+    try:
+        with manager.use(busy.session_id):
+            _wait_for(lambda: manager.stats().expired == 1)
+            assert destroyed == [idle.sandbox]
+        with pytest.raises(SessionNotFoundError):
+            with manager.use(idle.session_id):
+                pass
+    finally:
+        manager.close_all()
+    assert busy.sandbox in destroyed
+
+
+@pytest.fixture
+def driver(tmp_path: Path) -> Iterator[Callable[[str], subprocess.CompletedProcess]]:
+    env = {**os.environ, "SESSION_SOCKET": str(tmp_path / "session.sock")}
+    server = subprocess.Popen([sys.executable, str(DRIVER)], env=env)
+    counter = {"n": 0}
+
+    def step(code: str) -> subprocess.CompletedProcess:
+        counter["n"] += 1
+        path = tmp_path / f"{counter['n']}.py"
+        path.write_text(code)
+        return subprocess.run(
+            [sys.executable, str(DRIVER), "run", str(path)],
+            env=env,
+            capture_output=True,
+            timeout=20,
+        )
+
+    try:
+        yield step
+    finally:
+        server.kill()
+        server.wait()
+
+
+def test_driver_keeps_globals_between_steps(driver) -> None:
+    first = driver("import json\ndata = {'rows': 3}\nprint('loaded')")
+    second = driver(
+        "import sys\nprint(json.dumps(data))\nprint('warn', file=sys.stderr)"
+    )
+
+    assert (first.returncode, first.stdout) == (0, b"loaded\n")
+    assert second.returncode == 0
+    assert second.stdout == b'{"rows": 3}\n'
+    assert second.stderr == b"warn\n"
+
+
+def test_driver_reports_errors_and_survives_them(driver) -> None:
+    failed = driver("x = 1\nraise ValueError('bad input')")
+    exited = driver("import sys\nsys.exit(3)")
+    after = driver("print(x)")
+
+    assert failed.returncode == 1
+    assert b"ValueError: bad input" in failed.stderr
+    assert exited.returncode == 3
+    assert (after.returncode, after.stdout) == (0, b"1\n")
+
+
+def _session_executor(client: MagicMock) -> PythonExecutor:
+    client.images.get.return_value = object()
+    with patch("docker.from_env", return_value=client):
+        return PythonExecutor(ExecutorConfig(max_sessions=1, session_idle_timeout=60))
+
+
+@pytest.mark.asyncio
+async def test_session_steps_run_through_docker_exec_in_one_sandbox() -> None:
+    client = MagicMock()
+    sandbox = MagicMock()
+    sandbox.id = "c1"
+    sandbox.get_archive.side_effect = Exception("no output dir")
+    client.containers.create.return_value = sandbox
+    client.api.exec_create.return_value = {"Id": "e1"}
+    client.api.exec_start.side_effect = lambda *_a, **_k: iter([(b"42\n", None)])
+    client.api.exec_inspect.return_value = {"ExitCode": 0}
+    executor = _session_executor(client)
+    try:
+        info = await executor.create_session(SessionCreateRequest())
+        await executor.execute_in_session(
+            info.session_id, SessionExecuteRequest(code="x = 42")
+        )
+        result = await executor.execute_in_session(
+            info.session_id, SessionExecuteRequest(code="print(x)")
+        )
+
+        assert result.success is True and result.output == "42\n"
+        client.containers.create.assert_called_once()
+        labels = client.containers.create.call_args.kwargs["labels"]
+        assert labels[IDLE_TTL_LABEL] == "60"
+        sandbox.start.assert_called_once()
+        _, cmd = client.api.exec_create.call_args[0]
+        assert cmd == ["python", "/execution/main.py", "run", "/execution/.steps/2.py"]
+        assert executor.get_session(info.session_id).steps == 2
+
+        await executor.close_session(info.session_id)
+        sandbox.remove.assert_called_once_with(force=True)
+        with pytest.raises(SessionNotFoundError):
+            executor.get_session(info.session_id)
+    finally:
+        executor.close()
+
+
+@pytest.mark.asyncio
+async def test_session_is_closed_when_a_step_times_out() -> None:
+    client = MagicMock()
+    sandbox = MagicMock()
+    client.containers.create.return_value = sandbox
+    client.api.exec_create.return_value = {"Id": "e1"}
+    client.api.exec_start.side_effect = lambda *_a, **_k: iter([])
+    client.api.exec_inspect.return_value = {"ExitCode": 137}
+    executor = _session_executor(client)
+    try:
+        info = await executor.create_session(SessionCreateRequest())
+
+        # The timeout fires as soon as the step starts.
+        with patch("threading.Timer") as timer_cls:
+            timer_cls.side_effect = lambda _t, fn: MagicMock(start=fn)
+            result = await executor.execute_in_session(
+                info.session_id, SessionExecuteRequest(code="while True: pass")
+            )
+
+        assert result.exit_code == -1
+        assert "the session was closed" in result.error
+        sandbox.kill.assert_called_once()
+        with pytest.raises(SessionNotFoundError):
+            executor.get_session(info.session_id)
+    finally:
+        executor.close()